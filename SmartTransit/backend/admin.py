@@ -8,6 +8,8 @@ import os, re
 from datetime import datetime
 from auth import get_db_connection, EMAIL_REGEX, PASSWORD_REGEX
 from custom_decorator import admin_only
+from pagination import get_page_args, build_page
+from hashing import hash_password, register_busy_handler
 
 load_dotenv()
 
@@ -22,6 +24,7 @@ CONFIG = {
 }
 
 admin_bp = Blueprint('admin', __name__)
+register_busy_handler(admin_bp)
 bcrypt = Bcrypt()
 
 """
@@ -96,7 +99,7 @@ def driver_register():
             return jsonify({'error': 'Email already registered!'}), 409
 
         # Hash password and insert new user
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
         cursor.execute(
             """
             INSERT INTO Drivers (
@@ -194,8 +197,13 @@ def add_vehicle():
     ---
     List all the drivers that have been registered
     
+    Query parameters (optional, enables keyset pagination on driver_id):
+    - limit (int): page size, capped at MAX_PAGE_LIMIT
+    - after (str): opaque cursor from the previous page's next_cursor
+
     Returns:
-    - 200 OK: { 'drivers': drivers }
+    - 200 OK: { 'drivers': drivers } (plus 'next_cursor' when paginated)
+    - 400 Bad Request: { 'error': 'Invalid cursor' } or an invalid limit
     - 401 Unauthorized: Invalid credentials
     - 403 Forbidden: { 'error': 'User does not have access' }
     - 500 Internal Server Error: { 'error': 'Database error', 'details': str(err) }
@@ -208,6 +216,11 @@ def list_drivers():
     if user_id != 1:
         return jsonify({'error': 'User does not have access'}), 403
 
+    try:
+        page_args = get_page_args()
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
     conn = None
     cursor = None
     try:
@@ -215,9 +228,17 @@ def list_drivers():
         cursor = conn.cursor(dictionary=True) 
 
         # Get all the drivers
-        cursor.execute("SELECT driver_id, name, email, age, employee_type, driver_salary, hire_date FROM Drivers")
-        drivers = cursor.fetchall()
-        return jsonify({'drivers': drivers}), 200
+        query = "SELECT driver_id, name, email, age, employee_type, driver_salary, hire_date FROM Drivers"
+        if not page_args:
+            cursor.execute(query)
+            drivers = cursor.fetchall()
+            return jsonify({'drivers': drivers}), 200
+
+        # Keyset page on the primary key, fetching one extra row to detect the next page
+        limit, after_id = page_args
+        cursor.execute(query + " WHERE driver_id > %s ORDER BY driver_id LIMIT %s", (after_id or 0, limit + 1))
+        drivers, next_cursor = build_page(cursor.fetchall(), limit, 'driver_id')
+        return jsonify({'drivers': drivers, 'next_cursor': next_cursor}), 200
     except mysql.connector.Error as err:
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
     finally:
@@ -229,8 +250,13 @@ def list_drivers():
     ---
     List all the vehicles that have been added
     
+    Query parameters (optional, enables keyset pagination on vehicle_id):
+    - limit (int): page size, capped at MAX_PAGE_LIMIT
+    - after (str): opaque cursor from the previous page's next_cursor
+
     Returns:
-    - 200 OK: { 'vehicles': vehicles }
+    - 200 OK: { 'vehicles': vehicles } (plus 'next_cursor' when paginated)
+    - 400 Bad Request: { 'error': 'Invalid cursor' } or an invalid limit
     - 401 Unauthorized: Invalid credentials
     - 403 Forbidden: { 'error': 'User does not have access' }
     - 500 Internal Server Error: { 'error': 'Database error', 'details': str(err) }
@@ -243,6 +269,11 @@ def list_routes():
     if user_id != 1:
         return jsonify({'error': 'User does not have access'}), 403
 
+    try:
+        page_args = get_page_args()
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
     conn = None
     cursor = None
     try:
@@ -250,9 +281,16 @@ def list_routes():
         cursor = conn.cursor(dictionary=True)
 
         # Get all the vehicles
-        cursor.execute("SELECT * FROM Vehicles")
-        vehicles = cursor.fetchall()
-        return jsonify({'vehicles': vehicles}), 200
+        if not page_args:
+            cursor.execute("SELECT * FROM Vehicles")
+            vehicles = cursor.fetchall()
+            return jsonify({'vehicles': vehicles}), 200
+
+        # Keyset page on the primary key, fetching one extra row to detect the next page
+        limit, after_id = page_args
+        cursor.execute("SELECT * FROM Vehicles WHERE vehicle_id > %s ORDER BY vehicle_id LIMIT %s", (after_id or 0, limit + 1))
+        vehicles, next_cursor = build_page(cursor.fetchall(), limit, 'vehicle_id')
+        return jsonify({'vehicles': vehicles, 'next_cursor': next_cursor}), 200
     except mysql.connector.Error as err:
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
     finally:
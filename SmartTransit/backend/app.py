@@ -14,21 +14,31 @@ import os
 
 from auth import auth_bp, register_jwt_blocklist_loader, close_db_connection
 from location import location_bp
-from booking import booking_bp
+from booking import booking_bp, update_pending_ride_durations
 from settings import settings_bp
 from driver import driver_bp
 from payment import payment_bp
 from report_generate import route_gen_bp
 from admin import admin_bp
 from route_optimisation import route_op_bp
+from jobs import start_periodic_job
+from revocation import start_revocation_listener
+from purge import purge_expired_rows
+from ride_events import register_ride_events
+from fares import fares_bp, refresh_fare_table, FARE_REFRESH_SECONDS
+from webhook_inbox import process_webhook_inbox, WEBHOOK_INBOX_POLL_SECONDS
 
 load_dotenv()
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# With several workers, set a message queue (e.g. redis://) so pushes reach every worker's clients
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE'))
 # Secret key for JWT signing
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 15)))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES_DAYS', 30)))
+# bcrypt cost factor, shared with the hashing pool (see hashing.py)
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_ROUNDS', 12))
 
 # Q. what are these `dev only` and `prod only`?
 # A. dev only: local dev works on HTTP which is terrible in terms of security
@@ -44,6 +54,11 @@ app.config['JWT_COOKIE_SAMESITE'] = 'Lax'         # dev only
 # app.config['JWT_COOKIE_SECURE'] = True          # prod only
 # app.config['JWT_COOKIE_SAMESITE'] = "None"      # prod only
 app.config['JWT_ACCESS_COOKIE_PATH'] = '/'
+app.config['JWT_REFRESH_COOKIE_NAME'] = 'refresh_token_cookie'
+# Only sent to /auth/refresh, never with ordinary API calls or the other /auth routes.
+# The logout routes get a copy of the cookie on their own paths (see tokens.REFRESH_LOGOUT_PATHS)
+app.config['JWT_REFRESH_COOKIE_PATH'] = '/auth/refresh'
+app.config['JWT_REFRESH_CSRF_COOKIE_PATH'] = '/auth/refresh'
 app.config['JWT_COOKIE_CSRF_PROTECT'] = True
 
 
@@ -78,6 +93,31 @@ app.register_blueprint(payment_bp)
 app.register_blueprint(route_gen_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(route_op_bp)
+app.register_blueprint(fares_bp)
+
+# Ride status pushes over Socket.IO, see ride_events.py
+register_ride_events(socketio)
+
+# --- Background jobs ---
+# Each interval is in seconds, 0 disables the job
+
+start_periodic_job(socketio, 'refresh_ride_durations', update_pending_ride_durations,
+                   int(os.getenv('RIDE_DURATION_REFRESH_SECONDS', 0)))
+start_periodic_job(socketio, 'purge_expired_rows', purge_expired_rows,
+                   int(os.getenv('PURGE_SECONDS', 3600)))
+start_periodic_job(socketio, 'refresh_fare_table', refresh_fare_table, FARE_REFRESH_SECONDS)
+
+# Bookings from acknowledged Stripe webhooks, the app context lets it push them over Socket.IO
+def apply_webhook_inbox():
+    with app.app_context():
+        return process_webhook_inbox()
+
+start_periodic_job(socketio, 'apply_webhook_inbox', apply_webhook_inbox, WEBHOOK_INBOX_POLL_SECONDS,
+                   log_results=False)
+
+# Applies logouts handled by other workers to this worker's revoked token cache
+start_revocation_listener(socketio)
+
 if __name__ == '__main__':
     socketio.run(app,
                  debug=True,
@@ -11,6 +11,11 @@ import phonenumbers
 import boto3.session
 import boto3
 from custom_decorator import admin_user_only
+from revocation import revoked_tokens, publish_revocation
+from hashing import hash_password, check_password, register_busy_handler
+from rate_limit import rate_limited
+from tokens import token_response, refresh_token_to_revoke, clear_refresh_cookies
+from profile_cache import get_profile, etag_response, invalidate_profile
 import random
 
 load_dotenv()
@@ -36,6 +41,7 @@ EMAIL_REGEX = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
 PASSWORD_REGEX = r'^(?=.*[A-Za-z])(?=.*\d)[A-Za-z\d@$!%*?&]{8,}$'  # At least 8 characters, 1 letter, 1 number
 
 auth_bp = Blueprint('auth', __name__)
+register_busy_handler(auth_bp)
 bcrypt = Bcrypt()
 
 def get_db_connection():
@@ -61,23 +67,11 @@ def close_db_connection(e=None):
 """
     --- JWT Blocklist Check ---
     Callback function for Flask-JWT-Extended to check if a JWT has been revoked.
+    Served from the in-memory revoked token cache, MySQL is only hit to confirm
+    Bloom filter false positives (see revocation.py).
 """
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT jti FROM RevokedTokens WHERE jti = %s", (jti,))
-        revoked_token = cursor.fetchone()
-        is_revoked = revoked_token is not None
-        return is_revoked # Return True if token is found in the blocklist (revoked)
-    except mysql.connector.Error as err:
-        return True # Fail-safe for if DB check fails, assume token is revoked
-    finally:
-        if cursor: cursor.close()
+    return revoked_tokens.is_revoked(jwt_payload["jti"], get_db_connection)
 
 """ 
     --- Register blocklist loader ---
@@ -149,7 +143,7 @@ def register():
         except ValueError:
             return jsonify({'error': 'Location must be a decimal number'}), 400
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = hash_password(password)
 
     conn = None
     cursor = None
@@ -190,12 +184,13 @@ def register():
     - password (str): account password
     
     Returns:
-    - 200 OK: { access_token: JWT }
+    - 200 OK: { access_token: JWT, refresh_token: JWT }, refresh token also set as a cookie
     - 400 Bad Request: Missing credentials
     - 401 Unauthorized: Invalid credentials
     - 500 Internal Server Error: Database error
 """
 @auth_bp.route('/auth/login', methods=['POST'])
+@rate_limited('login')
 def login():
     data = request.get_json()
     email = (data.get('email') or '').strip()
@@ -218,24 +213,12 @@ def login():
         """, (email,))
         user = cursor.fetchone()
 
-        if not user or not bcrypt.check_password_hash(user['password_hash'], password):
+        if not user or not check_password(user['password_hash'], password):
             return jsonify({'error': 'Invalid credentials'}), 401
 
-        # Credentials are valid, create JWT
-        access_token = None
-        if user["user_id"] == 1:
-            access_token = create_access_token(
-                identity=str(user['user_id']),
-                expires_delta=jwt_access_expires,
-                additional_claims={"is_admin": True, "is_driver": False}
-            )
-        else:
-            access_token = create_access_token(
-                identity=str(user['user_id']),
-                expires_delta=jwt_access_expires,
-                additional_claims={"is_admin": False, "is_driver": False}
-            )
-        return jsonify(access_token=access_token), 200
+        # Credentials are valid, re-read the profile on the next request and create JWTs
+        invalidate_profile(user['user_id'])
+        return token_response(user['user_id'], user['user_id'] == 1, False), 200
     
     except mysql.connector.Error as err:
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
@@ -247,6 +230,8 @@ def login():
     ---
     Invalidates the current JWT token, preventing future use.
     Requires valid JWT in Authorization header.
+    The refresh token, if sent as a cookie or as refresh_token in the JSON body,
+    is revoked as well.
     
     Returns:
     - 200 OK: Successfully logged out
@@ -256,6 +241,49 @@ def login():
 @auth_bp.route('/auth/logout', methods=['POST'])
 @jwt_required()
 def logout():
+    conn = None
+    cursor = None
+    try:
+        jwt_data = get_jwt()
+        revoked = [(jwt_data['jti'], datetime.fromtimestamp(jwt_data['exp']))]
+        refresh = refresh_token_to_revoke()
+        if refresh:
+            revoked.append(refresh)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Insert into revoked tokens, ensures logging out
+        cursor.executemany(
+            "INSERT IGNORE INTO RevokedTokens (jti, expires_at) VALUES (%s, %s)",
+            revoked
+        )
+        conn.commit()
+        for jti, expires_at in revoked:
+            publish_revocation(jti, expires_at)
+        return clear_refresh_cookies(jsonify({'message': 'Successfully logged out'})), 200
+
+    except mysql.connector.Error as err:
+        if conn: conn.rollback()
+        return jsonify({'error': 'Database error', 'details': str(err)}), 500
+    finally:
+        if cursor: cursor.close()
+
+"""
+    Rotate the refresh token
+    ---
+    Exchanges a refresh token (cookie with X-CSRF-TOKEN header, or Bearer) for a new
+    access token and refresh token with the same role claims, without a password check.
+    The presented refresh token is revoked, so each one can be used once.
+
+    Returns:
+    - 200 OK: { access_token: JWT, refresh_token: JWT }, refresh token also set as a cookie
+    - 401 Unauthorized: Missing, invalid, expired or already used refresh token
+    - 500 Internal Server Error: Database error
+"""
+@auth_bp.route('/auth/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
     conn = None
     cursor = None
     try:
@@ -266,14 +294,18 @@ def logout():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Insert into revoked tokens, ensures logging out
+        # jti is the primary key, so of two concurrent refreshes with the same token only one succeeds
         cursor.execute(
             "INSERT INTO RevokedTokens (jti, expires_at) VALUES (%s, %s)",
             (jti, expires_at)
         )
         conn.commit()
-        return jsonify({'message': 'Successfully logged out'}), 200
+        publish_revocation(jti, expires_at)
+        return token_response(get_jwt_identity(), jwt_data['is_admin'], jwt_data['is_driver']), 200
 
+    except mysql.connector.IntegrityError:
+        if conn: conn.rollback()
+        return jsonify({'msg': 'Token has been revoked'}), 401
     except mysql.connector.Error as err:
         if conn: conn.rollback()
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
@@ -287,7 +319,8 @@ def logout():
     Requires a valid JWT in the Authorization header or cookie.
     
     Returns:
-    - 200 OK: { "name": <user's name>, "email": <user's email> }
+    - 200 OK: { "name": <user's name>, "email": <user's email> }, with an ETag
+    - 304 Not Modified: If-None-Match matches the current ETag
     - 401 Unauthorized: Missing or invalid token
     - 404 Not Found: User does not exist
     - 500 Internal Server Error: Database error
@@ -298,24 +331,16 @@ def status():
     try:
         # Get the user ID from the JWT token
         user_id = get_jwt_identity()
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Query the database for the user's name and email using the user ID
-        cursor.execute("SELECT user_id, name, email FROM Users WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
-        
+
+        # Served from the profile cache (see profile_cache.py)
+        user = get_profile(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
-        
-        return jsonify({'user_id': user['user_id'], 'name': user['name'], 'email': user['email']}), 200
+
+        return etag_response({'user_id': user['user_id'], 'name': user['name'], 'email': user['email']})
 
     except mysql.connector.Error as err:
-        if conn: conn.rollback()
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
-    finally:
-        if cursor: cursor.close()
 
 """
     Get information about the current user
@@ -324,7 +349,8 @@ def status():
     Requires a valid JWT in the Authorization header or cookie.
     
     Returns:
-    - 200 OK: User information
+    - 200 OK: User information, with an ETag
+    - 304 Not Modified: If-None-Match matches the current ETag
     - 404 Not Found: User does not exist
     - 500 Internal Server Error: Database error
 """
@@ -334,23 +360,14 @@ def profile():
     try:
         # Get the user ID from the JWT token
         user_id = get_jwt_identity()
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Query for profile fields (matching /auth/register schema)
-        cursor.execute("SELECT name, email, age, phone_number, disability FROM Users WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
 
+        # Profile fields (matching /auth/register schema), served from the profile cache
+        user = get_profile(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
-        return jsonify(user), 200
+        return etag_response({field: user[field] for field in ('name', 'email', 'age', 'phone_number', 'disability')})
     except mysql.connector.Error as err:
-        if conn:
-            conn.rollback()
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
-    finally:
-        if cursor: 
-            cursor.close()
 
 """
     Verifies the password for the current user.
@@ -363,6 +380,7 @@ def profile():
 """
 @auth_bp.route('/auth/verify_password', methods=['POST'])
 @jwt_required()
+@rate_limited('login', account='jwt')
 def verify_password():
     data = request.get_json()
     password = (data.get('password') or '').strip()
@@ -379,7 +397,7 @@ def verify_password():
 
         if not user:
             return jsonify({'error': 'User not found'}), 404
-        if bcrypt.check_password_hash(user['password_hash'], password):
+        if check_password(user['password_hash'], password):
             return jsonify({'message': 'Password verified'}), 200
         else:
             return jsonify({'error': 'Incorrect password'}), 401
@@ -401,6 +419,7 @@ def verify_password():
     - 500 Internal Server Error: Database error
 """
 @auth_bp.route('/auth/forget_password', methods=['POST'])
+@rate_limited('sms')
 def forget_password():
     data = request.get_json()
     email = (data.get('email') or '').strip()
@@ -490,7 +509,7 @@ def reset_password():
         expired_at = selected_token_row['expires_at']
         if expired_at < current_datetime:
             return jsonify({'error': 'This token has expired!'}), 401
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
 
 
         cursor.execute(
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+    Benchmark: bcrypt login throughput vs pool size
+    ---
+    Simulates a login burst: CONCURRENCY request threads each verify a password
+    against the same hash. Runs once inline (the old behaviour, every request
+    thread doing bcrypt itself) and once per pool size from 1 to the core count.
+
+    Usage (from /backend):
+        python benchmarks/bench_bcrypt.py [logins] [rounds]
+"""
+import os, sys, time, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DB_PORT', '3306') # hashing.py does not touch the DB
+import hashing
+
+CONCURRENCY = 32
+
+def run(logins, pw_hash, check):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as threads:
+        results = list(threads.map(lambda _: check(pw_hash, 'Password123'), range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return logins / elapsed
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else hashing.BCRYPT_ROUNDS
+    cores = os.cpu_count() or 1
+    pw_hash = hashing._hash('Password123', rounds)
+    print(f"{logins} logins, bcrypt rounds={rounds}, {cores} cores, {CONCURRENCY} request threads")
+
+    print(f"inline            {run(logins, pw_hash, hashing._check):8.1f} logins/s")
+
+    for size in sorted({1, 2, 4, cores // 2, cores} - {0}):
+        if size > cores:
+            continue
+        hashing._pool = ProcessPoolExecutor(max_workers=size)
+        hashing._slots = threading.BoundedSemaphore(CONCURRENCY)
+        hashing.HASH_POOL_SIZE = size
+        # Warm the worker processes before timing
+        list(hashing._pool.map(hashing._check, [pw_hash] * size, ['Password123'] * size))
+        rate = run(logins, pw_hash, hashing.check_password)
+        hashing._pool.shutdown()
+        print(f"pool size {size:<7} {rate:8.1f} logins/s")
+
+if __name__ == '__main__':
+    main()
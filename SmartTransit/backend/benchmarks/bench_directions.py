@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+    Benchmark: /directions compact mode vs passthrough
+    ---
+    Compares the bytes sent to the phone (plain and gzipped) and the server CPU
+    time per response for
+    1. passthrough: Google's body served as-is (no parsing, ~0 CPU)
+    2. compact mode at several zoom levels (parse, join step polylines,
+       Douglas-Peucker, re-encode, serialise)
+
+    Uses a saved Directions response if one is given, otherwise a synthetic one
+    shaped like Google's (a ~25 km drive, 40 steps of dense GPS-like polylines).
+
+    Usage (from /backend):
+        python benchmarks/bench_directions.py [saved_response.json]
+"""
+import os, sys, json, gzip, math, random, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import directions, polylines
+
+REPEATS = 50
+ZOOMS = [10, 14, 17]
+
+def synthetic_response(steps=40, points_per_step=150):
+    random.seed(7)
+    lat, lng, heading = -33.8688, 151.2093, 0.6
+    route_steps = []
+    for i in range(steps):
+        heading += random.uniform(-1.2, 1.2)
+        points = [(lat, lng)]
+        for _ in range(points_per_step):
+            heading += random.uniform(-0.05, 0.05)
+            lat += 0.00004 * math.cos(heading) + random.uniform(-0.000003, 0.000003)
+            lng += 0.00004 * math.sin(heading) + random.uniform(-0.000003, 0.000003)
+            points.append((lat, lng))
+        route_steps.append({
+            "distance": {"text": "0.6 km", "value": 620},
+            "duration": {"text": "1 min", "value": 75},
+            "start_location": {"lat": points[0][0], "lng": points[0][1]},
+            "end_location": {"lat": points[-1][0], "lng": points[-1][1]},
+            "html_instructions": f"Turn <b>left</b> onto <b>Example Street {i}</b><div style=\"font-size:0.9em\">Pass by the shops (on the right)</div>",
+            "maneuver": "turn-left",
+            "polyline": {"points": polylines.encode(points)},
+            "travel_mode": "DRIVING",
+        })
+    all_points = [p for step in route_steps for p in polylines.decode(step["polyline"]["points"])]
+    return json.dumps({
+        "geocoded_waypoints": [{"geocoder_status": "OK", "place_id": "ChIJ" + "x" * 23, "types": ["street_address"]}] * 2,
+        "routes": [{
+            "bounds": {"northeast": {"lat": max(p[0] for p in all_points), "lng": max(p[1] for p in all_points)},
+                       "southwest": {"lat": min(p[0] for p in all_points), "lng": min(p[1] for p in all_points)}},
+            "copyrights": "Map data ©2025",
+            "legs": [{
+                "distance": {"text": "24.8 km", "value": 24800},
+                "duration": {"text": "31 mins", "value": 1860},
+                "duration_in_traffic": {"text": "38 mins", "value": 2280},
+                "start_address": "1 Example St, Sydney NSW 2000, Australia",
+                "end_address": "99 Example Rd, Parramatta NSW 2150, Australia",
+                "start_location": route_steps[0]["start_location"],
+                "end_location": route_steps[-1]["end_location"],
+                "steps": route_steps,
+                "traffic_speed_entry": [],
+                "via_waypoint": [],
+            }],
+            "overview_polyline": {"points": polylines.encode(all_points[::8])},
+            "summary": "M4",
+            "warnings": [],
+            "waypoint_order": [],
+        }],
+        "status": "OK",
+    }, indent=3).encode('utf-8')
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as saved:
+            body = saved.read()
+        source = sys.argv[1]
+    else:
+        body = synthetic_response()
+        source = "synthetic route"
+
+    print(f"{source}: {len(polylines.decode(json.loads(body)['routes'][0]['overview_polyline']['points']))} overview points")
+    print(f"{'mode':<18}{'bytes':>10}{'gzip':>10}{'points':>9}{'cpu ms':>9}")
+    print(f"{'passthrough':<18}{len(body):>10}{len(gzip.compress(body)):>10}{'':>9}{0:>9.2f}")
+
+    for zoom in ZOOMS:
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            compact = directions.compact_directions(body, zoom)
+        cpu_ms = (time.perf_counter() - start) / REPEATS * 1000
+        points = len(polylines.decode(json.loads(compact)['routes'][0]['overview_polyline']['points']))
+        print(f"{f'compact zoom {zoom}':<18}{len(compact):>10}{len(gzip.compress(compact)):>10}{points:>9}{cpu_ms:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+    Benchmark: the /booking/initiate lookup when an open ride exists
+    ---
+    Compares, on the path that needs no Google call and no insert,
+    1. three queries: the ongoing booking check, the open ride lookup and the "already
+       booked this ride" check, one after another (the flow before booking.find_open_ride)
+    2. find_open_ride: the same answer in one query
+    Riders each hold a completed booking, so the ongoing booking check has rows to read.
+    Reports p50/p99 latency and requests per second for each thread count, every thread
+    on its own connection.
+
+    Usage (from /backend, against a test database):
+        python benchmarks/bench_initiate.py [pairs] [requests per thread]
+"""
+from dotenv import load_dotenv
+import os, sys, random, threading, time
+import mysql.connector
+
+env_path = os.path.join(os.path.dirname(__file__), '..', '.env.test')
+load_dotenv(dotenv_path=env_path, override=True)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import booking
+
+CONFIG = booking.CONFIG
+THREAD_COUNTS = [1, 8, 32]
+RIDERS = 200
+NAME_PREFIX = 'bench-initiate-'
+
+def three_queries(cursor, user_id, start, end):
+    cursor.execute(
+        """
+        SELECT *
+        FROM Bookings b
+        JOIN Rides r ON b.ride_id = r.ride_id
+        WHERE b.user_id = %s
+        AND r.ride_status IN ('I', 'A')
+        """,
+        (user_id,)
+    )
+    if cursor.fetchall():
+        return None
+    cursor.execute(
+        "SELECT ride_id, ride_duration FROM Rides WHERE start_location = %s AND end_location = %s AND ride_status = 'I'",
+        (start, end)
+    )
+    ride = cursor.fetchone()
+    cursor.execute("SELECT ride_id FROM Bookings WHERE ride_id = %s AND user_id = %s", (ride['ride_id'], user_id))
+    cursor.fetchall()
+    return ride['ride_id']
+
+def one_query(cursor, user_id, start, end):
+    return booking.find_open_ride(cursor, user_id, start, end)['ride_id']
+
+def seed(conn, cursor, pairs):
+    stops = []
+    for i in range(pairs * 2):
+        cursor.execute("INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES (%s, %s, %s)",
+                       (f"{NAME_PREFIX}{i}", -33.8 - i * 0.001, 151.2))
+        stops.append(cursor.lastrowid)
+    pair_list = [(stops[i], stops[i + 1]) for i in range(0, len(stops), 2)]
+    # A completed ride every rider was on, then one open ride per pair
+    cursor.execute(
+        "INSERT INTO Rides (start_location, end_location, ride_duration, ride_status) VALUES (%s, %s, 15, 'C')",
+        pair_list[0]
+    )
+    done_ride = cursor.lastrowid
+    cursor.executemany("INSERT INTO Users (name, email) VALUES (%s, %s)",
+                       [(f"{NAME_PREFIX}{i}", f"{NAME_PREFIX}{i}@example.com") for i in range(RIDERS)])
+    cursor.execute(f"SELECT user_id FROM Users WHERE name LIKE '{NAME_PREFIX}%'")
+    users = [row[0] for row in cursor.fetchall()]
+    cursor.executemany("INSERT INTO Bookings (ride_id, user_id, ride_date) VALUES (%s, %s, NOW())",
+                       [(done_ride, user_id) for user_id in users])
+    conn.commit()
+    for start, end in pair_list:
+        booking.open_ride(conn, start, end, 15.0)
+    return pair_list, users
+
+def cleanup(cursor):
+    cursor.execute(f"SELECT user_id FROM Users WHERE name LIKE '{NAME_PREFIX}%'")
+    users = [row[0] for row in cursor.fetchall()]
+    if users:
+        placeholders = ', '.join(['%s'] * len(users))
+        cursor.execute(f"DELETE FROM Bookings WHERE user_id IN ({placeholders})", users)
+        cursor.execute(f"DELETE FROM Users WHERE user_id IN ({placeholders})", users)
+    cursor.execute(f"SELECT location_id FROM Locations WHERE location_name LIKE '{NAME_PREFIX}%'")
+    stops = [row[0] for row in cursor.fetchall()]
+    if stops:
+        placeholders = ', '.join(['%s'] * len(stops))
+        cursor.execute(f"DELETE FROM Rides WHERE start_location IN ({placeholders})", stops)
+        cursor.execute(f"DELETE FROM Locations WHERE location_id IN ({placeholders})", stops)
+
+def run(lookup, pair_list, users, threads, requests):
+    barrier = threading.Barrier(threads)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        conn = mysql.connector.connect(**CONFIG)
+        cursor = conn.cursor(dictionary=True)
+        timings = []
+        try:
+            barrier.wait()
+            for _ in range(requests):
+                start, end = random.choice(pair_list)
+                began = time.perf_counter()
+                lookup(cursor, random.choice(users), start, end)
+                conn.commit() # Each request is its own transaction, as in the route
+                timings.append(time.perf_counter() - began)
+        finally:
+            cursor.close()
+            conn.close()
+        with lock:
+            latencies.extend(timings)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    random.seed(11)
+
+    conn = mysql.connector.connect(**CONFIG)
+    cursor = conn.cursor()
+    try:
+        cleanup(cursor)
+        pair_list, users = seed(conn, cursor, pairs)
+
+        print(f"{pairs} open rides, {len(users)} riders, {requests} requests per thread")
+        print(f"{'lookup':<16}{'threads':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+        for name, lookup in (('three queries', three_queries), ('find_open_ride', one_query)):
+            for threads in THREAD_COUNTS:
+                latencies, seconds = run(lookup, pair_list, users, threads, requests)
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] * 1000
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+                print(f"{name:<16}{threads:>8}{len(latencies) / seconds:>10.0f}{p50:>9.2f}{p99:>9.2f}")
+    finally:
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+    Benchmark: /location/nearest KD-tree vs a linear scan
+    ---
+    Builds the stop index over synthetic stops spread across a metro area and compares
+    k-nearest query time against computing the haversine distance to every stop,
+    checking that both return the same stops.
+
+    Usage (from /backend):
+        python benchmarks/bench_nearest.py [stops] [k]
+"""
+import os, sys, heapq, random, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from stop_index import StopIndex, haversine_metres
+
+QUERIES = 1000
+LINEAR_QUERIES = 20
+
+def main():
+    stops_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    random.seed(11)
+    # Roughly Greater Sydney
+    stops = [(i, random.uniform(-34.2, -33.4), random.uniform(150.6, 151.4)) for i in range(stops_count)]
+    queries = [(random.uniform(-34.2, -33.4), random.uniform(150.6, 151.4)) for _ in range(QUERIES)]
+
+    start = time.perf_counter()
+    index = StopIndex(stops)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    results = [index.nearest(lat, lng, k) for lat, lng in queries]
+    tree_ms = (time.perf_counter() - start) / QUERIES * 1000
+
+    start = time.perf_counter()
+    for (lat, lng), found in zip(queries[:LINEAR_QUERIES], results):
+        linear = heapq.nsmallest(k, stops, key=lambda stop: haversine_metres(lat, lng, stop[1], stop[2]))
+        assert [stop[0] for stop in linear] == [stop_id for stop_id, _ in found]
+    linear_ms = (time.perf_counter() - start) / LINEAR_QUERIES * 1000
+
+    print(f"{stops_count} stops, k={k}")
+    print(f"{'build':<14}{build_ms:>10.1f} ms")
+    print(f"{'kd-tree query':<14}{tree_ms:>10.3f} ms")
+    print(f"{'linear scan':<14}{linear_ms:>10.3f} ms  ({linear_ms / tree_ms:.0f}x slower)")
+
+if __name__ == '__main__':
+    main()
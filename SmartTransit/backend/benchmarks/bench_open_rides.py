@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+    Benchmark: opening shared rides under concurrent /booking/initiate load
+    ---
+    Many threads, each on its own connection, open rides for a handful of location
+    pairs at the same moment, the way riders leaving one event do. Compares
+    1. check-then-insert: SELECT the open ride, INSERT one if none was found (the old flow)
+    2. open_ride: INSERT ... ON DUPLICATE KEY UPDATE on the rides_open_slot unique key
+    and reports, per thread count, how many open rides each pair ended up with (should
+    be exactly 1), failed requests and request latency.
+
+    With the unique key in place, check-then-insert no longer creates duplicates, its
+    losers fail with a duplicate entry error instead. Run it before the key exists to
+    see the duplicates.
+
+    Usage (from /backend, against a test database):
+        python benchmarks/bench_open_rides.py [pairs] [rounds]
+"""
+from dotenv import load_dotenv
+import os, sys, random, threading, time
+import mysql.connector
+
+env_path = os.path.join(os.path.dirname(__file__), '..', '.env.test')
+load_dotenv(dotenv_path=env_path, override=True)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import booking
+
+CONFIG = booking.CONFIG
+THREAD_COUNTS = [1, 8, 32, 64]
+NAME_PREFIX = 'bench-open-ride-'
+
+def check_then_insert(conn, start, end, duration):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT ride_id FROM Rides WHERE start_location = %s AND end_location = %s AND ride_status = 'I'",
+            (start, end)
+        )
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        cursor.execute(
+            "INSERT INTO Rides (start_location, end_location, ride_duration, ride_status) VALUES (%s, %s, %s, 'I')",
+            (start, end, duration)
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+def open_ride(conn, start, end, duration):
+    return booking.open_ride(conn, start, end, duration)[0]
+
+def seed(cursor, pairs):
+    stops = []
+    for i in range(pairs * 2):
+        cursor.execute("INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES (%s, %s, %s)",
+                       (f"{NAME_PREFIX}{i}", -33.8 - i * 0.001, 151.2))
+        stops.append(cursor.lastrowid)
+    return [(stops[i], stops[i + 1]) for i in range(0, len(stops), 2)]
+
+def cleanup(cursor):
+    cursor.execute(f"SELECT location_id FROM Locations WHERE location_name LIKE '{NAME_PREFIX}%'")
+    stops = [row[0] for row in cursor.fetchall()]
+    if stops:
+        placeholders = ', '.join(['%s'] * len(stops))
+        cursor.execute(f"DELETE FROM Rides WHERE start_location IN ({placeholders})", stops)
+        cursor.execute(f"DELETE FROM Locations WHERE location_id IN ({placeholders})", stops)
+
+def run_round(strategy, pair_list, threads):
+    barrier = threading.Barrier(threads)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(pair):
+        conn = mysql.connector.connect(**CONFIG)
+        try:
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                strategy(conn, pair[0], pair[1], 15.0)
+            except mysql.connector.Error as err:
+                conn.rollback()
+                with lock:
+                    errors.append(err.errno)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        finally:
+            conn.close()
+
+    workers = [threading.Thread(target=worker, args=(random.choice(pair_list),)) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, errors
+
+def open_rides_per_pair(cursor, pair_list):
+    counts = []
+    for start, end in pair_list:
+        cursor.execute(
+            "SELECT COUNT(*) FROM Rides WHERE start_location = %s AND end_location = %s AND ride_status = 'I'",
+            (start, end)
+        )
+        counts.append(cursor.fetchone()[0])
+    return counts
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    random.seed(5)
+
+    conn = mysql.connector.connect(**CONFIG)
+    cursor = conn.cursor()
+    try:
+        cleanup(cursor)
+        pair_list = seed(cursor, pairs)
+        conn.commit()
+
+        print(f"{pairs} pairs, {rounds} rounds per row")
+        print(f"{'strategy':<20}{'threads':>8}{'max open':>10}{'dup pairs':>11}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}")
+        for name, strategy in (('check-then-insert', check_then_insert), ('open_ride', open_ride)):
+            for threads in THREAD_COUNTS:
+                max_open = duplicated = 0
+                latencies = []
+                errors = []
+                for _ in range(rounds):
+                    round_latencies, round_errors = run_round(strategy, pair_list, threads)
+                    latencies.extend(round_latencies)
+                    errors.extend(round_errors)
+                    counts = open_rides_per_pair(cursor, pair_list)
+                    conn.commit()
+                    max_open = max(max_open, *counts)
+                    duplicated += sum(1 for count in counts if count > 1)
+                    # Start every round with no open rides
+                    placeholders = ', '.join(['%s'] * len(pair_list))
+                    cursor.execute(
+                        f"UPDATE Rides SET ride_status = 'C' WHERE ride_status = 'I' AND start_location IN ({placeholders})",
+                        [start for start, _ in pair_list]
+                    )
+                    conn.commit()
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] * 1000
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+                print(f"{name:<20}{threads:>8}{max_open:>10}{duplicated:>11}{len(errors):>8}{p50:>9.2f}{p99:>9.2f}")
+    finally:
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
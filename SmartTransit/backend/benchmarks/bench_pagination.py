@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+    Benchmark: keyset pagination vs full table scan
+    ---
+    Fills a scratch table shaped like Drivers with N rows, then compares
+    1. the old list endpoints' query (SELECT every row and serialise it)
+    2. fetching one deep page with `WHERE id > cursor ORDER BY id LIMIT n`
+
+    Usage (from /backend, against a test database):
+        python benchmarks/bench_pagination.py [rows] [page_size]
+"""
+from dotenv import load_dotenv
+import os, sys, json, time
+import mysql.connector
+
+env_path = os.path.join(os.path.dirname(__file__), '..', '.env.test')
+load_dotenv(dotenv_path=env_path, override=True)
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+REPEATS = 20
+
+def seed(cursor, rows):
+    cursor.execute("DROP TABLE IF EXISTS BenchPages")
+    cursor.execute("""
+        CREATE TABLE BenchPages (
+            row_id      bigint not null auto_increment,
+            name        varchar(80),
+            email       varchar(250),
+            age         integer,
+            primary key (row_id)
+        )
+    """)
+    batch = []
+    for i in range(rows):
+        batch.append((f"Driver {i}", f"driver{i}@example.com", 20 + i % 40))
+        if len(batch) == 5000:
+            cursor.executemany("INSERT INTO BenchPages (name, email, age) VALUES (%s, %s, %s)", batch)
+            batch = []
+    if batch:
+        cursor.executemany("INSERT INTO BenchPages (name, email, age) VALUES (%s, %s, %s)", batch)
+
+def time_query(cursor, query, params=()):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        body = json.dumps(cursor.fetchall(), default=str)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, len(body)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    conn = mysql.connector.connect(**CONFIG)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        seed(cursor, rows)
+        conn.commit()
+
+        full_ms, full_bytes = time_query(cursor, "SELECT * FROM BenchPages")
+        print(f"full scan        rows={rows:<8} median={full_ms:8.2f} ms  body={full_bytes} bytes")
+
+        for depth in (0, rows // 2, rows - page_size):
+            page_ms, page_bytes = time_query(
+                cursor,
+                "SELECT * FROM BenchPages WHERE row_id > %s ORDER BY row_id LIMIT %s",
+                (depth, page_size + 1)
+            )
+            print(f"keyset page      after={depth:<7} median={page_ms:8.2f} ms  body={page_bytes} bytes")
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS BenchPages")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+    Load test: Stripe webhook ingestion through WebhookInbox
+    ---
+    A local replayer for Stripe's webhook deliveries. It seeds rides and riders, signs
+    `events` payment_intent.succeeded events with the server's STRIPE_WEBHOOK_SECRET the
+    way Stripe does, and posts them to a running backend from `concurrency` threads,
+    resending a share of them the way Stripe retries. It then reports
+    1. ingestion: acknowledged events per second and acknowledgement latency
+    2. application: events per second until the inbox worker has drained WebhookInbox
+    and checks that every event booked its seats exactly once.
+
+    Usage (from /backend, with the server running against the test database):
+        python benchmarks/bench_webhook.py [events] [concurrency] [url]
+    url defaults to http://localhost:8000/payment/webhook
+"""
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import os, sys, hashlib, hmac, json, random, time
+import urllib.error, urllib.request
+import mysql.connector
+
+env_path = os.path.join(os.path.dirname(__file__), '..', '.env.test')
+load_dotenv(dotenv_path=env_path, override=True)
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+NAME_PREFIX = 'bench-webhook-'
+RIDES = 20
+# Share of events delivered twice, like Stripe retrying a slow acknowledgement
+REDELIVERY_SHARE = 0.1
+# Share of events paying for two seats through /payment/create-group-intent
+GROUP_SHARE = 0.2
+DRAIN_TIMEOUT = 300
+
+def seed(cursor, events):
+    stops = []
+    for i in range(RIDES * 2):
+        cursor.execute("INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES (%s, %s, %s)",
+                       (f"{NAME_PREFIX}{i}", -33.8 - i * 0.001, 151.2))
+        stops.append(cursor.lastrowid)
+    rides = []
+    for i in range(0, len(stops), 2):
+        cursor.execute(
+            "INSERT INTO Rides (start_location, end_location, ride_duration, ride_status) VALUES (%s, %s, 15, 'I')",
+            (stops[i], stops[i + 1])
+        )
+        rides.append(cursor.lastrowid)
+    # One rider per event, so no event is skipped as a second booking of the same ride
+    cursor.executemany("INSERT INTO Users (name, email) VALUES (%s, %s)",
+                       [(f"{NAME_PREFIX}{i}", f"{NAME_PREFIX}{i}@example.com") for i in range(events)])
+    cursor.execute(f"SELECT user_id FROM Users WHERE name LIKE '{NAME_PREFIX}%' ORDER BY user_id")
+    users = [row[0] for row in cursor.fetchall()]
+    return rides, users
+
+def cleanup(cursor):
+    cursor.execute(f"SELECT user_id FROM Users WHERE name LIKE '{NAME_PREFIX}%'")
+    users = [row[0] for row in cursor.fetchall()]
+    if users:
+        placeholders = ', '.join(['%s'] * len(users))
+        cursor.execute(f"DELETE FROM Bookings WHERE user_id IN ({placeholders})", users)
+        cursor.execute(f"DELETE FROM Users WHERE user_id IN ({placeholders})", users)
+    cursor.execute(f"DELETE FROM WebhookInbox WHERE event_id LIKE 'evt_{NAME_PREFIX}%'")
+    cursor.execute(f"DELETE FROM ProcessedEvents WHERE event_id LIKE 'evt_{NAME_PREFIX}%'")
+    cursor.execute(f"SELECT location_id FROM Locations WHERE location_name LIKE '{NAME_PREFIX}%'")
+    stops = [row[0] for row in cursor.fetchall()]
+    if stops:
+        placeholders = ', '.join(['%s'] * len(stops))
+        cursor.execute(f"DELETE FROM Rides WHERE start_location IN ({placeholders})", stops)
+        cursor.execute(f"DELETE FROM Locations WHERE location_id IN ({placeholders})", stops)
+
+def make_event(number, ride_id, user_id, seats):
+    metadata = {'ride_id': str(ride_id), 'user_id': str(user_id)}
+    if seats > 1:
+        metadata['seats'] = str(seats)
+    return json.dumps({
+        'id': f"evt_{NAME_PREFIX}{number}", 'object': 'event', 'type': 'payment_intent.succeeded',
+        'data': {'object': {'id': f"pi_{NAME_PREFIX}{number}", 'object': 'payment_intent', 'metadata': metadata}},
+    })
+
+# Posts one event with a Stripe-Signature header, returns (status, seconds)
+def deliver(url, payload):
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    request = urllib.request.Request(url, data=payload.encode(), method='POST', headers={
+        'Content-Type': 'application/json',
+        'Stripe-Signature': f"t={timestamp},v1={signature}",
+    })
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status = response.status
+    except urllib.error.HTTPError as err:
+        status = err.code
+    except urllib.error.URLError:
+        status = None
+    return status, time.perf_counter() - start
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    url = sys.argv[3] if len(sys.argv) > 3 else 'http://localhost:8000/payment/webhook'
+    if not WEBHOOK_SECRET:
+        sys.exit("STRIPE_WEBHOOK_SECRET must match the server's")
+    random.seed(7)
+
+    conn = mysql.connector.connect(**CONFIG)
+    cursor = conn.cursor()
+    try:
+        cleanup(cursor)
+        rides, users = seed(cursor, events)
+        conn.commit()
+
+        expected = {}
+        payloads = []
+        for number, user_id in enumerate(users):
+            ride_id = random.choice(rides)
+            seats = 2 if random.random() < GROUP_SHARE else 1
+            expected[ride_id] = expected.get(ride_id, 0) + seats
+            payloads.append(make_event(number, ride_id, user_id, seats))
+        deliveries = payloads + random.sample(payloads, int(len(payloads) * REDELIVERY_SHARE))
+        random.shuffle(deliveries)
+
+        print(f"{events} events, {len(deliveries)} deliveries, {concurrency} concurrent, {url}")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda payload: deliver(url, payload), deliveries))
+        ingest_seconds = time.perf_counter() - started
+
+        failed = sum(1 for status, _ in results if status != 200)
+        latencies = sorted(seconds for _, seconds in results)
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        print(f"{'ingest':<10}{len(deliveries) / ingest_seconds:>10.0f} events/s"
+              f"   ack p50 {p50:.2f} ms   p99 {p99:.2f} ms   failed {failed}")
+
+        # The server's inbox worker applies the events in the background
+        while True:
+            cursor.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(status = 'D'), 0) FROM WebhookInbox WHERE event_id LIKE 'evt_{NAME_PREFIX}%'"
+            )
+            pending, dead = cursor.fetchone()
+            pending -= dead
+            conn.commit()
+            if pending == 0 or time.perf_counter() - started > DRAIN_TIMEOUT:
+                break
+            time.sleep(0.05)
+        apply_seconds = time.perf_counter() - started
+        print(f"{'applied':<10}{events / apply_seconds:>10.0f} events/s"
+              f"   drained in {apply_seconds:.2f} s   still pending {pending}   dead-lettered {dead}")
+
+        placeholders = ', '.join(['%s'] * len(rides))
+        cursor.execute(
+            f"SELECT ride_id, passenger_count, (SELECT COUNT(*) FROM Bookings b WHERE b.ride_id = r.ride_id) "
+            f"FROM Rides r WHERE ride_id IN ({placeholders})", rides
+        )
+        wrong = [row for row in cursor.fetchall() if not row[1] == row[2] == expected.get(row[0], 0)]
+        print(f"rides with wrong bookings or passenger_count: {len(wrong)}")
+    finally:
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
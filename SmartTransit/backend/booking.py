@@ -4,9 +4,17 @@ from flask_bcrypt import Bcrypt
 import mysql.connector
 from dotenv import load_dotenv
 import os, requests
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from payment import calculate_ride_price
 from custom_decorator import user_only
+from pagination import get_page_args, build_page
+from location_catalogue import catalogue
+from directions import normalise_point
+from singleflight import SingleFlight
+from rate_limit import MemoryBucketStore
+import logging
 
 load_dotenv()
 
@@ -22,8 +30,20 @@ CONFIG = {
 
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 
+# Pending ride duration refresh (see update_pending_ride_durations)
+DURATION_REFRESH_QPS = float(os.getenv('DURATION_REFRESH_QPS', 10))
+DURATION_REFRESH_QUOTA = int(os.getenv('DURATION_REFRESH_QUOTA', 500))
+DURATION_REFRESH_WORKERS = int(os.getenv('DURATION_REFRESH_WORKERS', 8))
+DURATION_REFRESH_BATCH = int(os.getenv('DURATION_REFRESH_BATCH', 500))
+
+DEADLOCK = 1213
+OPEN_RIDE_RETRIES = 3
+
 booking_bp = Blueprint('booking', __name__)
+logger = logging.getLogger(__name__)
 bcrypt = Bcrypt()
+# Concurrent travel time estimates for the same pair of stops, see get_estimated_time
+estimate_flights = SingleFlight()
 
 def get_db_connection():
     return mysql.connector.connect(**CONFIG)
@@ -37,10 +57,12 @@ def get_db_connection():
     - end_location (int): the location id in the DB
     
     Logic:
-    1. Add a new entry into Rides with the start location and the end location.
-       ride_duration is calculated with current time, and ride_status = 'I'.
-    2. If a ride exists with the same start and end location where ride_status = 'I'
-       don't add a new enty in Rides.
+    1. One query on one connection checks for an ongoing booking of the user and finds
+       the open ride (ride_status = 'I') for the start and end location, if any.
+    2. If there is no open ride, ride_duration is estimated with the stops' coordinates
+       from the location catalogue and the ride is opened with open_ride, which reuses
+       a ride another request opened for the pair in the meantime.
+    With an open ride for the pair this is one query and no calls to Google.
 
     Returns:
     - 200 OK: {
@@ -50,8 +72,8 @@ def get_db_connection():
     }
     - 400 Bad Request: Missing start_location and/or end_location
     - 401 Unauthorized: Not logged in
-    - 409 Conflict: User tries to create another incomplete booking (ride_status = 'I') from startLocation to endLocation
-                    from startLocation to endLocation
+    - 409 Conflict: User already has an incomplete or active booking (ride_status 'I' or 'A'),
+                    which includes having booked this ride
     - 500 Internal Server Error
 """
 @booking_bp.route('/booking/initiate', methods=['POST'])
@@ -71,69 +93,27 @@ def initiate_booking():
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True) # Access through column names
-        
-        # Check if the user already has an incomplete booking for the same ride
-        cursor.execute(
-            """
-            SELECT *
-            FROM Bookings b
-            JOIN Rides r ON b.ride_id = r.ride_id
-            WHERE b.user_id = %s
-            AND r.ride_status IN ('I', 'A')
-            """,
-            (user_id,)
-        )
-        duplicate_booking = cursor.fetchone()
-        if duplicate_booking:
+
+        # Step 1: The user's ongoing booking and the open ride for the pair, in one round trip
+        row = find_open_ride(cursor, user_id, start_location, end_location)
+        if row['has_ongoing_booking']:
             return jsonify({
                 'error': 'User already has an ongoing booking.'
             }), 409
 
-        # Step 1: Check if a matching ride already exists where the ride hasn't started or finished
-        cursor.execute(
-            """
-            SELECT ride_id, ride_duration FROM Rides
-            WHERE start_location = %s AND end_location = %s
-            AND ride_status = 'I'
-            """,
-            (start_location, end_location)
-        )
-        ride = cursor.fetchone()
-        ride_id = None
-        ride_duration = None
-
-        if ride:
-            ride_id = ride['ride_id']
-            ride_duration = ride['ride_duration']
-        else:
+        ride_id = row['ride_id']
+        ride_duration = row['ride_duration']
+
+        if ride_id is None:
             # Calculate duration
             ride_duration = get_estimated_time(start_location, end_location)
             if ride_duration is None:
                 return jsonify({'error': 'Could not estimate ride duration'}), 500
 
-            # Step 2: Create a ride entry
-            cursor.execute(
-                """
-                INSERT INTO Rides (start_location, end_location, ride_duration, ride_status)
-                VALUES (%s, %s, %s, 'I')
-                """,
-                (start_location, end_location, ride_duration)
-            )
-            conn.commit()
+            # Step 2: Create the ride, or join the one another request opened for the pair meanwhile
+            ride_id, ride_duration = open_ride(conn, start_location, end_location, ride_duration)
 
-            # Get the new ride_id
-            ride_id = cursor.lastrowid
-            
-        # Step 3: Check if user already has a PAID booking for this specific ride_id
-        cursor.execute(
-            "SELECT ride_id FROM Bookings WHERE ride_id = %s AND user_id = %s",
-            (ride_id, user_id)
-        )
-        existing_booking = cursor.fetchone()
-        if existing_booking:
-            return jsonify({'error': 'You have already booked this ride.'}), 409
-        
-        # Step 4: Return Ride Info and price for Payment
+        # Step 3: Return Ride Info and price for Payment
         ride_price = calculate_ride_price(ride_duration)
         
         ride_price = round(ride_price, 2)
@@ -159,11 +139,86 @@ def initiate_booking():
         if conn:
             conn.close()
 
+"""
+    Whether the user has an ongoing booking, and the open ride for the pair, in one query.
+    ---
+    A booking on the open ride is itself an ongoing booking, so it needs no separate check.
+    Measured against the previous three sequential queries in benchmarks/bench_initiate.py.
+
+    Parameters:
+        cursor: a dictionary cursor
+    Returns:
+        dict: has_ongoing_booking, ride_id and ride_duration (None without an open ride)
+"""
+def find_open_ride(cursor, user_id, start_location, end_location):
+    cursor.execute(
+        """
+        SELECT
+            EXISTS (
+                SELECT 1
+                FROM Bookings b
+                JOIN Rides br ON b.ride_id = br.ride_id
+                WHERE b.user_id = %s
+                AND br.ride_status IN ('I', 'A')
+            ) AS has_ongoing_booking,
+            r.ride_id, r.ride_duration
+        FROM (SELECT 1) AS request
+        LEFT JOIN Rides r
+            ON r.start_location = %s AND r.end_location = %s AND r.ride_status = 'I'
+        ORDER BY r.ride_id
+        LIMIT 1
+        """,
+        (user_id, start_location, end_location)
+    )
+    return cursor.fetchone()
+
+"""
+    Opens a ride for the pair, or returns the one already open.
+    ---
+    The unique rides_open_slot key allows one ride_status = 'I' ride per (start, end),
+    so concurrent callers all end up with the same ride: the first insert wins and the
+    others hit the key and read the winner's id back through LAST_INSERT_ID. Commits.
+
+    Returns:
+        (int, float): ride_id and the ride's stored ride_duration
+    Raises:
+        mysql.connector.Error: on database errors
+"""
+def open_ride(conn, start_location, end_location, ride_duration):
+    cursor = conn.cursor()
+    try:
+        for attempt in range(OPEN_RIDE_RETRIES):
+            try:
+                cursor.execute(
+                    """
+                    INSERT INTO Rides (start_location, end_location, ride_duration, ride_status)
+                    VALUES (%s, %s, %s, 'I')
+                    ON DUPLICATE KEY UPDATE ride_id = LAST_INSERT_ID(ride_id)
+                    """,
+                    (start_location, end_location, ride_duration)
+                )
+                ride_id = cursor.lastrowid
+                cursor.execute("SELECT ride_duration FROM Rides WHERE ride_id = %s", (ride_id,))
+                ride_duration = cursor.fetchone()[0]
+                conn.commit()
+                return ride_id, ride_duration
+            except mysql.connector.Error as err:
+                # Inserts racing on the same key can still deadlock, the retry finds the winner's row
+                if err.errno != DEADLOCK or attempt == OPEN_RIDE_RETRIES - 1:
+                    raise
+                conn.rollback()
+    finally:
+        cursor.close()
+
 """
     View Bookings
     ---
     Retrieve all bookings for the authenticated user.
     
+    Query parameters (optional, enables keyset pagination on booking_id):
+    - limit (int): page size, capped at MAX_PAGE_LIMIT
+    - after (str): opaque cursor from the previous page's next_cursor
+
     Logic:
     1. Join the Bookings and Rides tables to obtain ride details along with the booking date.
     2. Return ride information such as ride_id, start_location, end_location, ride_date,
@@ -172,14 +227,17 @@ def initiate_booking():
     Returns:
     - 200 OK: {
         "bookings": [{
+            "booking_id": <booking_id>,  one per seat, group bookings repeat the ride
             "ride_id": <ride_id>,
             "start_location": <start_location>,
             "end_location": <end_location>,
             "ride_date": <ride_date>,
             "ride_duration": <ride_duration>,
             "ride_status": <ride_status>,
-        }, ...]
+        }, ...],
+        "next_cursor": <cursor or null> (paginated requests only)
     }
+    - 400 Bad Request: Invalid limit or cursor.
     - 401 Unauthorized: Invalid credentials.
     - 500 Internal Server Error: Database error.
 """
@@ -187,13 +245,20 @@ def initiate_booking():
 @user_only()
 def viewBookings():
     userId = get_jwt_identity()
+    try:
+        page_args = get_page_args()
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         # Get all the necessary information
         query = """
-            SELECT r.ride_id, l1.location_name AS start_location, 
+            SELECT b.booking_id, r.ride_id, l1.location_name AS start_location, 
                    l2.location_name AS end_location, 
                    r.ride_duration, r.ride_status
             FROM Bookings b
@@ -202,22 +267,43 @@ def viewBookings():
             JOIN Locations l2 ON r.end_location = l2.location_id
             WHERE b.user_id = %s
         """
-        cursor.execute(query, (userId,))
+        params = [userId]
+        next_cursor = None
+        if page_args:
+            # Keyset page: seek past the cursor on booking_id and fetch one extra row
+            # to know whether another page exists. A group booking has one row per
+            # seat on the same ride, so ride_id is not unique enough to page on
+            limit, after_id = page_args
+            if after_id is not None:
+                query += " AND b.booking_id > %s"
+                params.append(after_id)
+            query += " ORDER BY b.booking_id LIMIT %s"
+            params.append(limit + 1)
+
+        cursor.execute(query, tuple(params))
         results = cursor.fetchall()
+        if page_args:
+            results, next_cursor = build_page(results, page_args[0], "booking_id")
         
         if not results:
-            return jsonify({"message": "User has no bookings", "bookings": []}), 200
+            response = {"message": "User has no bookings", "bookings": []}
+            if page_args:
+                response["next_cursor"] = None
+            return jsonify(response), 200
 
         # Append the results in bookings
         bookings = []
         for row in results:
             bookings.append({
+                "booking_id": row["booking_id"],
                 "ride_id": row["ride_id"],
                 "start_location": row["start_location"],
                 "end_location": row["end_location"],
                 "ride_duration": row["ride_duration"],
                 "ride_status": row["ride_status"],
             })
+        if page_args:
+            return jsonify({"bookings": bookings, "next_cursor": next_cursor}), 200
         return jsonify({"bookings": bookings}), 200
 
     except mysql.connector.Error as err:
@@ -231,58 +317,133 @@ def viewBookings():
 """
     Update Pending Ride Durations
     ---
-    For every ride in the Rides table where ride_status = 'I',
-    this function retrieves the estimated travel time using the get_estimated_time function,
-    and updates the ride_duration column accordingly. (This will be used sometime)
+    For every ride in the Rides table where ride_status = 'I', refreshes ride_duration
+    with the current estimated travel time.
     
     Logic:
-    1. Query all rides from the Rides table where ride_status = 'I'
-    2. For each ride, call get_estimated_time(start_location, end_location) to get the estimated travel time.
-    3. Update the ride_duration field with the retrieved estimated time.
+    1. Query all 'I' rides together with both stops' coordinates in one query.
+    2. Deduplicate (start_location, end_location) pairs, many rides can share a pair.
+    3. Fetch durations for the pairs concurrently, spaced by DURATION_REFRESH_QPS and capped at
+       DURATION_REFRESH_QUOTA API calls per run. If Google reports OVER_QUERY_LIMIT, the
+       remaining pairs are skipped until the next run.
+    4. Write the new durations with one executemany per DURATION_REFRESH_BATCH rides.
+
+    Returns:
+        dict: counts of rides, pairs, api_calls, updated and failed, plus elapsed seconds
 """
 def update_pending_ride_durations():
+    started = time.perf_counter()
+    stats = {'rides': 0, 'pairs': 0, 'api_calls': 0, 'updated': 0, 'failed': 0}
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # Retrieve rides that haven't started or finished.
+        # Retrieve rides that haven't started or finished, with coordinates for both stops
         cursor.execute("""
-            SELECT ride_id, start_location, end_location 
-            FROM Rides 
-            WHERE ride_status = 'I'
+            SELECT r.ride_id, r.start_location, r.end_location,
+                   ls.x_coordinate AS start_x, ls.y_coordinate AS start_y,
+                   le.x_coordinate AS end_x, le.y_coordinate AS end_y
+            FROM Rides r
+            JOIN Locations ls ON r.start_location = ls.location_id
+            JOIN Locations le ON r.end_location = le.location_id
+            WHERE r.ride_status = 'I'
+            ORDER BY r.ride_id
         """)
         rides = cursor.fetchall()
-        
+        stats['rides'] = len(rides)
+
+        # Group rides by location pair so each pair costs one API call
+        pairs = {}
         for ride in rides:
-            ride_id = ride["ride_id"]
-            start_location_id = ride["start_location"]
-            end_location_id = ride["end_location"]
+            key = (ride["start_location"], ride["end_location"])
+            if key not in pairs:
+                pairs[key] = {
+                    "origin": {"lat": ride["start_x"], "lng": ride["start_y"]},
+                    "destination": {"lat": ride["end_x"], "lng": ride["end_y"]},
+                    "ride_ids": []
+                }
+            pairs[key]["ride_ids"].append(ride["ride_id"])
+        stats['pairs'] = len(pairs)
 
-            # Use the existing get_estimated_time function to compute travel time (in minutes)
-            estimated_time = get_estimated_time(start_location_id, end_location_id)
-            if estimated_time is not None:
-                cursor.execute(
-                    "UPDATE Rides SET ride_duration = %s WHERE ride_id = %s",
-                    (estimated_time, ride_id)
-                )
-            else:
-                print(f"Could not retrieve estimated time for ride_id {ride_id} (from {start_location_id} to {end_location_id}).")
-        
-        conn.commit()
+        durations = fetch_pair_durations(pairs, stats)
+
+        # Write back in batches, one round trip per batch
+        updates = []
+        for key, pair in pairs.items():
+            duration = durations.get(key)
+            if duration is None:
+                stats['failed'] += len(pair["ride_ids"])
+                continue
+            updates.extend((duration, ride_id) for ride_id in pair["ride_ids"])
+
+        for i in range(0, len(updates), DURATION_REFRESH_BATCH):
+            batch = updates[i:i + DURATION_REFRESH_BATCH]
+            # Guard on status so a ride that started meanwhile keeps its real duration
+            cursor.executemany(
+                "UPDATE Rides SET ride_duration = %s WHERE ride_id = %s AND ride_status = 'I'",
+                batch
+            )
+            conn.commit()
+            stats['updated'] += len(batch)
     except mysql.connector.Error as err:
-        print("Database error:", err)
+        if conn: conn.rollback()
+        logger.error("Ride duration refresh failed: %s", err)
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
+    stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+"""
+    Fetches durations for deduplicated location pairs on a small thread pool.
+
+    Parameters:
+        pairs (dict): (start_id, end_id) -> {"origin", "destination", "ride_ids"}
+        stats (dict): api_calls is incremented for every request sent
+    Returns:
+        dict: (start_id, end_id) -> duration in minutes for the pairs that succeeded
+"""
+def fetch_pair_durations(pairs, stats):
+    # A one-token bucket spaces the calls evenly at DURATION_REFRESH_QPS
+    limiter = MemoryBucketStore()
+    over_quota = threading.Event()
+    session = requests.Session()
+    keys = list(pairs.keys())[:DURATION_REFRESH_QUOTA]
+    if len(pairs) > len(keys):
+        logger.warning("Duration refresh quota reached, %s location pairs deferred to the next run",
+                       len(pairs) - len(keys))
+
+    def fetch(key):
+        if over_quota.is_set():
+            return key, None, False
+        limiter.wait('directions', 1, DURATION_REFRESH_QPS)
+        duration, status = fetch_travel_minutes(pairs[key]["origin"], pairs[key]["destination"], session)
+        if status == "OVER_QUERY_LIMIT":
+            over_quota.set()
+        return key, duration, True
+
+    durations = {}
+    try:
+        with ThreadPoolExecutor(max_workers=DURATION_REFRESH_WORKERS) as pool:
+            for key, duration, sent in pool.map(fetch, keys):
+                if sent:
+                    stats['api_calls'] += 1
+                if duration is not None:
+                    durations[key] = duration
+    finally:
+        session.close()
+    return durations
+
 """
     Helper function to retrieve the estimated travel time (in minutes) between 
     two locations specified by their location IDs in the Locations table using 
     the Google Maps Directions API.
+    Concurrent calls for the same pair wait for one API call instead of making their own.
 
     Parameters:
         start_location_id (int): The ID of the starting location in the database.
@@ -291,40 +452,38 @@ def update_pending_ride_durations():
     Returns:
         float: Estimated travel time in minutes, or None if the API call fails
                or one of the locations cannot be found.
+    Raises:
+        mysql.connector.Error: if the location catalogue cannot be refreshed
 """
 def get_estimated_time(start_location_id, end_location_id):
-    # Retrieve coordinates for start and end locations from the database
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get start location coordinates
-        cursor.execute(
-            "SELECT x_coordinate, y_coordinate FROM Locations WHERE location_id = %s",
-            (start_location_id,)
-        )
-        start_loc = cursor.fetchone()
-        if not start_loc:
-            return None
-
-        # Get end location coordinates
-        cursor.execute(
-            "SELECT x_coordinate, y_coordinate from Locations WHERE location_id = %s",
-            (end_location_id,)
-        )
-        end_loc = cursor.fetchone()
-        if not end_loc:
-            print(f"End location with ID {end_location_id} not found.")
-            return None
-        
-        # Map database coordinates to API parameters.
-        # Here we assume x_coordinate represents latitude and y_coordinate longitude
-        origin = {"lat": start_loc["x_coordinate"], "lng": start_loc["y_coordinate"]}
-        destination = {"lat": end_loc["x_coordinate"], "lng": end_loc["y_coordinate"]}
-    finally:
-        cursor.close()
-        conn.close()
+    # Coordinates come from the in-memory location catalogue, not the database
+    start_loc = catalogue.get_location(start_location_id)
+    end_loc = catalogue.get_location(end_location_id)
+    if start_loc is None or end_loc is None:
+        return None
+
+    # Map database coordinates to API parameters.
+    # Here we assume x_coordinate represents latitude and y_coordinate longitude
+    origin = {"lat": start_loc["x_coordinate"], "lng": start_loc["y_coordinate"]}
+    destination = {"lat": end_loc["x_coordinate"], "lng": end_loc["y_coordinate"]}
 
+    # Riders booking the same pair at once share one call to Google
+    key = (normalise_point(f"{origin['lat']},{origin['lng']}"), normalise_point(f"{destination['lat']},{destination['lng']}"))
+    return estimate_flights.do(key, fetch_travel_minutes, origin, destination)[0]
+
+"""
+    Calls the Google Maps Directions API for a pair of coordinates.
+
+    Parameters:
+        origin (dict): {"lat", "lng"} of the start
+        destination (dict): {"lat", "lng"} of the end
+        session (requests.Session, optional): reuse a pooled connection across calls
+        
+    Returns:
+        (float | None, str): travel time in minutes (None on failure) and the API status,
+                             so callers can react to OVER_QUERY_LIMIT
+"""
+def fetch_travel_minutes(origin, destination, session=None):
     # Prepare the API request to Google Maps Directions API
     base_url = "https://maps.googleapis.com/maps/api/directions/json"
     params = {
@@ -334,17 +493,22 @@ def get_estimated_time(start_location_id, end_location_id):
     }
     
     try:
-        response = requests.get(base_url, params=params, timeout=5)
+        response = (session or requests).get(base_url, params=params, timeout=5)
         data = response.json()
-        if data.get("status") == "OK" and data.get("routes"):
+        status = data.get("status")
+        if status == "OK" and data.get("routes"):
             # Use the first route and its first leg
             leg = data["routes"][0]["legs"][0]
             duration_sec = leg["duration"]["value"]
             duration_min = duration_sec / 60.0
-            return duration_min
+            return duration_min, status
         else:
-            print("Error retrieving directions from Google Maps API. Status:", data.get("status"))
-            return None
+            logger.warning("Google Maps Directions API returned status %s", status)
+            return None, status
     except Exception as e:
-        print("Exception during API call:", e)
-        return None
+        logger.warning("Google Maps Directions API call failed: %s", e)
+        return None, "EXCEPTION"
+
+# CLI: python booking.py refreshes pending ride durations once and prints the run stats
+if __name__ == '__main__':
+    print(update_pending_ride_durations())
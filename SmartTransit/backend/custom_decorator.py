@@ -1,6 +1,16 @@
 from functools import wraps
 from flask import jsonify
-from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from principal import load_principal
+import mysql.connector
+
+# Loads the request's principal (see principal.py) before running the route
+def _with_principal(fn, claims, *args, **kwargs):
+    try:
+        load_principal(get_jwt_identity(), claims)
+    except mysql.connector.Error as err:
+        return jsonify({'error': 'Database error', 'details': str(err)}), 500
+    return fn(*args, **kwargs)
 
 # Allows routes to be only accessible for admins
 def admin_only():
@@ -10,7 +20,7 @@ def admin_only():
             verify_jwt_in_request()
             claims = get_jwt()
             if claims["is_admin"] and not claims["is_driver"]:
-                return fn(*args, **kwargs)
+                return _with_principal(fn, claims, *args, **kwargs)
             else:
                 return jsonify(msg="Admins only!"), 403
         return decorator
@@ -24,7 +34,7 @@ def admin_user_only():
             verify_jwt_in_request()
             claims = get_jwt()
             if not claims["is_driver"]:
-                return fn(*args, **kwargs)
+                return _with_principal(fn, claims, *args, **kwargs)
             else:
                 return jsonify(msg="Admins and Users only!"), 403
         return decorator
@@ -38,7 +48,7 @@ def user_only():
             verify_jwt_in_request()
             claims = get_jwt()
             if not claims["is_admin"] and not claims["is_driver"]:
-                return fn(*args, **kwargs)
+                return _with_principal(fn, claims, *args, **kwargs)
             else:
                 return jsonify(msg="Users only!"), 403
         return decorator
@@ -52,7 +62,7 @@ def driver_only():
             verify_jwt_in_request()
             claims = get_jwt()
             if not claims["is_admin"] and claims["is_driver"]:
-                return fn(*args, **kwargs)
+                return _with_principal(fn, claims, *args, **kwargs)
             else:
                 return jsonify(msg="Drivers only!"), 403
         return decorator
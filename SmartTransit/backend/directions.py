@@ -0,0 +1,207 @@
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from singleflight import SingleFlight
+import polylines
+import json
+import os
+import requests
+import threading
+import time
+
+load_dotenv()
+
+# Constants & Setups
+
+DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+# Responses are reused for this long (seconds), departure_time=now changes little within it
+DIRECTIONS_CACHE_TTL = float(os.getenv('DIRECTIONS_CACHE_TTL', 60))
+# Requests in the same window of this many seconds share a cache entry
+DIRECTIONS_DEPARTURE_BUCKET = float(os.getenv('DIRECTIONS_DEPARTURE_BUCKET', 60))
+DIRECTIONS_CACHE_MAX_ENTRIES = int(os.getenv('DIRECTIONS_CACHE_MAX_ENTRIES', 2000))
+# Keep-alive connections kept open to Google
+DIRECTIONS_POOL_SIZE = int(os.getenv('DIRECTIONS_POOL_SIZE', 16))
+DIRECTIONS_TIMEOUT = 15
+# Coordinates are rounded to 5 decimal places (about 1 m) before keying
+COORDINATE_PLACES = 5
+# Statuses worth caching, errors and quota failures are always refetched
+CACHEABLE_STATUSES = {'OK', 'ZERO_RESULTS', 'NOT_FOUND'}
+# Compact mode: map zoom used when the client does not send one (street level)
+DEFAULT_ZOOM = 14
+# Compact mode: the per-leg fields the app renders
+COMPACT_LEG_FIELDS = ('distance', 'duration', 'duration_in_traffic', 'start_address', 'end_address',
+                      'start_location', 'end_location')
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=DIRECTIONS_POOL_SIZE)
+    session.mount('https://', adapter)
+    return session
+
+# Shared by every request thread, requests.Session is safe to use concurrently for GETs
+session = _new_session()
+
+"""
+    Normalises an origin or destination so equivalent inputs share a cache entry:
+    "lat,lng" pairs are rounded, place names are trimmed, lowercased and single spaced.
+"""
+def normalise_point(value):
+    value = ' '.join(str(value).split()).lower()
+    parts = value.split(',')
+    if len(parts) == 2:
+        try:
+            return ','.join(f"{round(float(part), COORDINATE_PLACES):.{COORDINATE_PLACES}f}" for part in parts)
+        except ValueError:
+            pass
+    return value
+
+"""
+    Small LRU of raw Directions responses.
+    Each entry is (status code, body bytes, expiry), bodies are served as stored.
+"""
+class DirectionsCache:
+    def __init__(self, max_entries=DIRECTIONS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, status_code, body):
+        with self.lock:
+            self.entries[key] = (status_code, body, time.monotonic() + DIRECTIONS_CACHE_TTL)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+cache = DirectionsCache()
+# Compact bodies, keyed by the raw key plus zoom
+compact_cache = DirectionsCache()
+flights = SingleFlight()
+
+def _cache_key(origin, destination):
+    bucket = int(time.time() // DIRECTIONS_DEPARTURE_BUCKET)
+    return normalise_point(origin), normalise_point(destination), bucket
+
+def _cacheable(status_code, body):
+    if status_code != 200:
+        return False
+    try:
+        return json.loads(body).get('status') in CACHEABLE_STATUSES
+    except ValueError:
+        return False
+
+def _fetch(key, origin, destination):
+    response = session.get(DIRECTIONS_URL, params={
+        'origin': origin,
+        'destination': destination,
+        'departure_time': 'now',
+        'key': os.getenv('GOOGLE_MAPS_API_KEY'),
+    }, timeout=DIRECTIONS_TIMEOUT)
+    body = response.content
+    # Checked once here, cache hits are returned without parsing
+    if DIRECTIONS_CACHE_TTL > 0 and _cacheable(response.status_code, body):
+        cache.set(key, response.status_code, body)
+    return response.status_code, body
+
+"""
+    Directions from Google for origin -> destination leaving now, as raw JSON bytes.
+    ---
+    Served from the cache when the same normalised pair was fetched in the current
+    departure bucket, concurrent misses for the same pair share one upstream request.
+
+    Returns:
+        (int, bytes): upstream status code and response body
+    Raises:
+        requests.RequestException: if Google cannot be reached
+"""
+def get_directions(origin, destination):
+    key = _cache_key(origin, destination)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    return flights.do(key, _fetch, key, origin, destination)
+
+"""
+    Full-resolution line of a route: its steps' polylines joined end to end, or the
+    overview polyline when the route has no steps.
+"""
+def _route_points(route):
+    points = []
+    for leg in route.get('legs', []):
+        for step in leg.get('steps', []):
+            step_points = polylines.decode(step.get('polyline', {}).get('points', ''))
+            # Each step starts where the previous one ended
+            if points and step_points and step_points[0] == points[-1]:
+                step_points = step_points[1:]
+            points.extend(step_points)
+    if not points:
+        points = polylines.decode(route.get('overview_polyline', {}).get('points', ''))
+    return points
+
+"""
+    Shrinks a Directions response to what the app renders.
+    ---
+    Keeps status, and per route the summary, bounds, per-leg distance/duration/addresses
+    and an overview_polyline simplified with Douglas-Peucker to one pixel at `zoom`.
+    Steps, HTML instructions and warnings are dropped. The shape matches Google's, so
+    routes[0].overview_polyline.points works for both modes.
+
+    Returns:
+        bytes: compact JSON
+"""
+def compact_directions(body, zoom):
+    data = json.loads(body)
+    routes = []
+    for route in data.get('routes', []):
+        points = _route_points(route)
+        if points:
+            tolerance = polylines.zoom_tolerance(zoom, points[0][0])
+            encoded = polylines.encode(polylines.simplify(points, tolerance))
+        else:
+            encoded = ''
+        routes.append({
+            'summary': route.get('summary'),
+            'bounds': route.get('bounds'),
+            'overview_polyline': {'points': encoded},
+            'legs': [
+                {field: leg[field] for field in COMPACT_LEG_FIELDS if field in leg}
+                for leg in route.get('legs', [])
+            ],
+        })
+    compact = {'status': data.get('status'), 'routes': routes}
+    if 'error_message' in data:
+        compact['error_message'] = data['error_message']
+    return json.dumps(compact, separators=(',', ':')).encode('utf-8')
+
+"""
+    Compact directions (see compact_directions) for origin -> destination at a map zoom.
+    Built from the cached raw response and cached per zoom level.
+
+    Returns:
+        (int, bytes): upstream status code and compact body
+    Raises:
+        requests.RequestException: if Google cannot be reached
+"""
+def get_compact_directions(origin, destination, zoom=DEFAULT_ZOOM):
+    key = _cache_key(origin, destination) + (zoom,)
+    cached = compact_cache.get(key)
+    if cached is not None:
+        return cached
+    status_code, body = get_directions(origin, destination)
+    try:
+        compact = compact_directions(body, zoom)
+    except ValueError:
+        return status_code, body # Not JSON, pass it through untouched
+    if DIRECTIONS_CACHE_TTL > 0 and _cacheable(status_code, body):
+        compact_cache.set(key, status_code, compact)
+    return status_code, compact
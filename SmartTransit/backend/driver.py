@@ -8,6 +8,11 @@ import os
 from datetime import timedelta
 import logging
 from custom_decorator import driver_only
+from revocation import revoked_tokens, publish_revocation
+from hashing import hash_password, check_password, register_busy_handler
+from rate_limit import rate_limited
+from principal import current_principal, invalidate_driver
+from tokens import token_response, refresh_token_to_revoke, clear_refresh_cookies
 
 load_dotenv()
 
@@ -28,6 +33,7 @@ jwt_secret_key = os.getenv('JWT_SECRET_KEY')
 jwt_access_expires = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 15)))
 
 driver_bp = Blueprint('driver', __name__)
+register_busy_handler(driver_bp)
 bcrypt = Bcrypt()
 
 def get_db_connection():
@@ -53,23 +59,11 @@ def close_db_connection(e=None):
 """
     --- JWT Blocklist Check ---
     Callback function for Flask-JWT-Extended to check if a JWT has been revoked.
+    Served from the in-memory revoked token cache, MySQL is only hit to confirm
+    Bloom filter false positives (see revocation.py).
 """
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT jti FROM RevokedTokens WHERE jti = %s", (jti,))
-        revoked_token = cursor.fetchone()
-        is_revoked = revoked_token is not None
-        return is_revoked # Return True if token is found in the blocklist (revoked)
-    except mysql.connector.Error as err:
-        return True # Fail-safe for if DB check fails, assume token is revoked
-    finally:
-        if cursor: cursor.close()
+    return revoked_tokens.is_revoked(jwt_payload["jti"], get_db_connection)
 
 """ 
     --- Register blocklist loader ---
@@ -95,7 +89,7 @@ def driver_register(email, password, name):
             return jsonify({'error': 'Email already registered!'}), 409
 
         # Hash password and insert new user
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
         cursor.execute(
             "INSERT INTO Drivers (name, email, password_hash) VALUES (%s, %s, %s)",
             (name, email, hashed_password)
@@ -141,12 +135,13 @@ def add_vehicle(capacity, licence_number):
     - password (str): account password
     
     Returns:
-    - 200 OK: { access_token: JWT }
+    - 200 OK: { access_token: JWT, refresh_token: JWT }, refresh token also set as a cookie
     - 400 Bad Request: { 'error': 'Missing email or password' }
     - 401 Unauthorized: Invalid credentials
     - 500 Internal Server Error: { 'error': 'Database error', 'details': str(err) }
 """
 @driver_bp.route('/auth/driver/login', methods=['POST'])
+@rate_limited('login')
 def driver_login():
     data = request.get_json()
     email = (data.get('email') or '').strip()
@@ -169,16 +164,12 @@ def driver_login():
         """, (email,))
         driver = cursor.fetchone()
 
-        if not driver or not bcrypt.check_password_hash(driver['password_hash'], password):
+        if not driver or not check_password(driver['password_hash'], password):
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        # Credentials are valid, create JWT
-        access_token = create_access_token(
-            identity=str(driver['driver_id']),
-            expires_delta=jwt_access_expires,
-            additional_claims={"is_admin": False, "is_driver": True}
-        )
-        return jsonify(access_token=access_token), 200
+        # Credentials are valid, re-read the driver's details on their next request
+        invalidate_driver(driver['driver_id'])
+        return token_response(driver['driver_id'], False, True), 200
     
     except mysql.connector.Error as err:
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
@@ -190,6 +181,8 @@ def driver_login():
     ---
     Invalidates the current JWT token, preventing future use.
     Requires valid JWT in Authorization header.
+    The refresh token, if sent as a cookie or as refresh_token in the JSON body,
+    is revoked as well.
     
     Returns:
     - 200 OK: { 'message': 'Successfully logged out' }
@@ -203,18 +196,22 @@ def logout():
     cursor = None
     try:
         jwt_data = get_jwt()
-        jti = jwt_data['jti']
-        expires_at = datetime.fromtimestamp(jwt_data['exp'])
+        revoked = [(jwt_data['jti'], datetime.fromtimestamp(jwt_data['exp']))]
+        refresh = refresh_token_to_revoke()
+        if refresh:
+            revoked.append(refresh)
 
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute(
-            "INSERT INTO RevokedTokens (jti, expires_at) VALUES (%s, %s)",
-            (jti, expires_at)
+        cursor.executemany(
+            "INSERT IGNORE INTO RevokedTokens (jti, expires_at) VALUES (%s, %s)",
+            revoked
         )
         conn.commit()
-        return jsonify({'message': 'Successfully logged out'}), 200
+        for jti, expires_at in revoked:
+            publish_revocation(jti, expires_at)
+        return clear_refresh_cookies(jsonify({'message': 'Successfully logged out'})), 200
 
     except mysql.connector.Error as err:
         if conn: conn.rollback()
@@ -269,6 +266,7 @@ def assign_vehicle():
             (vehicle_id, driver_id)
         )
         conn.commit()
+        invalidate_driver(driver_id)
         return jsonify({'message': 'Vehicle assigned successfully'}), 200
 
     except mysql.connector.Error as err:
@@ -331,6 +329,7 @@ def unassign_vehicle():
             (driver_id,)
         )
         conn.commit()
+        invalidate_driver(driver_id)
         return jsonify({'message': 'Vehicle unassigned successfully'}), 200
 
     except mysql.connector.Error as err:
@@ -350,29 +349,36 @@ def unassign_vehicle():
     Returns:
     - 200 OK: Updated loacations
     - 400 Bad Request: Missing latitude or longitude
+    - 404 Not Found: Driver no longer exists
     - 500 Internal Server Error: Database error
 """
 @driver_bp.route('/driver/updateLocation', methods=['PATCH'])
 @driver_only()
 def updateLocation():
     data = request.get_json()
-    driverId = get_jwt_identity()
+    principal = current_principal()
     latitude = float(data.get('latitude'))
     longitude = float(data.get('longitude'))
 
 
     if latitude == '' or longitude == '':
         return jsonify({"message": "Missing longitude or latitude"}), 400
+    if principal is None:
+        return jsonify({'error': 'Invalid or unauthorized driver'}), 404
+
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT assigned_vehicle FROM Drivers WHERE driver_id=%s", (driverId, ))
-        vehicleId = cursor.fetchall()[0]['assigned_vehicle']
+        cursor = conn.cursor()
+        # The vehicle is read from Drivers in the same statement rather than from the
+        # cached principal, which can be stale after a reassignment on another worker
         cursor.execute(
         """
-        UPDATE Vehicles SET x_coordinate=%s, y_coordinate=%s
-        WHERE vehicle_id=%s
-        """, (latitude, longitude, vehicleId))
+        UPDATE Vehicles v JOIN Drivers d ON d.assigned_vehicle = v.vehicle_id
+        SET v.x_coordinate=%s, v.y_coordinate=%s
+        WHERE d.driver_id=%s
+        """, (latitude, longitude, principal.identity))
         conn.commit()
         return jsonify({'message': f'Location updated to ({latitude}, {longitude})'}), 200
     except mysql.connector.Error as err:
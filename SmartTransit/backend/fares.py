@@ -0,0 +1,262 @@
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import jwt_required
+from dotenv import load_dotenv
+from collections import OrderedDict
+import mysql.connector
+import hashlib
+import json
+import os
+import threading
+import time
+from location_catalogue import catalogue
+from payment import calculate_ride_price
+from booking import get_estimated_time
+from singleflight import SingleFlight
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+# How often every memoized quote is dropped (seconds), see app.py. Off by default,
+# quotes also expire on their own after FARE_QUOTE_TTL
+FARE_REFRESH_SECONDS = int(os.getenv('FARE_REFRESH_SECONDS', 0))
+# How long the quotes from one start location are reused before Rides is read again (seconds)
+FARE_QUOTE_TTL = float(os.getenv('FARE_QUOTE_TTL', 3600))
+# Start locations whose quotes are kept in memory, least recently used dropped first
+FARE_ROW_CACHE_SIZE = int(os.getenv('FARE_ROW_CACHE_SIZE', 256))
+# Time of day buckets: (name, first hour, hour after the last), in server local time
+FARE_BUCKETS = [
+    ('night', 0, 6),
+    ('morning_peak', 6, 10),
+    ('midday', 10, 15),
+    ('evening_peak', 15, 19),
+    ('evening', 19, 24),
+]
+
+fares_bp = Blueprint('fares', __name__)
+
+def get_db_connection():
+    return mysql.connector.connect(**CONFIG)
+
+def bucket_for_hour(hour):
+    for index, (_, first, last) in enumerate(FARE_BUCKETS):
+        if first <= hour < last:
+            return index
+    return len(FARE_BUCKETS) - 1
+
+"""
+    Average Rides.ride_duration from one start location, per end location and time bucket.
+    ---
+    A ride's time is its first booking. Rides without bookings yet (open rides, whose
+    ride_duration comes from fetch_travel_minutes) count towards the pair's average but
+    no bucket. Served by the start_location index and the Bookings ride_id index.
+
+    Returns:
+        dict: end_id -> (minutes over all rides, {bucket: minutes})
+"""
+def load_durations_from(cursor, start_location):
+    cursor.execute(
+        """
+        SELECT end_location, HOUR(booked_at), AVG(ride_duration), COUNT(*)
+        FROM (
+            SELECT r.end_location, r.ride_duration,
+                   (SELECT MIN(b.ride_date) FROM Bookings b WHERE b.ride_id = r.ride_id) AS booked_at
+            FROM Rides r
+            WHERE r.start_location = %s AND r.ride_duration > 0
+        ) rides
+        GROUP BY end_location, HOUR(booked_at)
+        """, (start_location,)
+    )
+    # Hours fold into buckets weighted by their ride counts
+    totals = {}
+    for end, hour, minutes, rides in cursor.fetchall():
+        pair, buckets = totals.setdefault(end, ([0.0, 0], {}))
+        pair[0] += float(minutes) * rides
+        pair[1] += rides
+        if hour is not None:
+            total, count = buckets.get(bucket_for_hour(hour), (0.0, 0))
+            buckets[bucket_for_hour(hour)] = (total + float(minutes) * rides, count + rides)
+    return {
+        end: (total / count, {bucket: t / c for bucket, (t, c) in buckets.items()})
+        for end, ((total, count), buckets) in totals.items()
+    }
+
+"""
+    Quotes in cents per bucket for every end location with ride history, the pair's
+    average filling buckets it has no rides in.
+
+    Returns:
+        dict: end_id -> [cents per bucket]
+"""
+def build_quotes(durations):
+    return {
+        end: [calculate_ride_price(buckets.get(bucket, minutes)) for bucket in range(len(FARE_BUCKETS))]
+        for end, (minutes, buckets) in durations.items()
+    }
+
+"""
+    Memoized quotes, one row per start location.
+    ---
+    A row is computed from that start's rides when first asked for, so memory and work
+    grow with the starts riders actually look at rather than with len(stops)^2. Rows
+    expire after FARE_QUOTE_TTL and at most FARE_ROW_CACHE_SIZE are kept. Concurrent
+    requests for the same missing row share one query, and no lock is held while it runs.
+"""
+class FareQuotes:
+    def __init__(self, ttl=FARE_QUOTE_TTL, size=FARE_ROW_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        self.rows = OrderedDict()
+        self.flights = SingleFlight()
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.rows.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self.rows[key]
+                return None
+            self.rows.move_to_end(key)
+            return entry[0]
+
+    def _set(self, key, value):
+        if self.ttl <= 0 or self.size <= 0:
+            return
+        with self.lock:
+            self.rows[key] = (value, time.monotonic() + self.ttl)
+            self.rows.move_to_end(key)
+            while len(self.rows) > self.size:
+                self.rows.popitem(last=False)
+
+    def _load_row(self, start_location):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            row = build_quotes(load_durations_from(cursor, start_location))
+        finally:
+            cursor.close()
+            conn.close()
+        self._set(start_location, row)
+        return row
+
+    """
+        Quotes from one start location: { end_location_id: [cents per bucket] }.
+        Raises mysql.connector.Error on database errors.
+    """
+    def quotes_from(self, start_location):
+        row = self._get(start_location)
+        if row is None:
+            row = self.flights.do(start_location, self._load_row, start_location)
+        return row
+
+    """
+        Quotes for one pair, [cents per bucket], or None if no duration can be found.
+        ---
+        Without ride history for the pair the duration comes from fetch_travel_minutes
+        (through booking.get_estimated_time) and is kept like a row.
+    """
+    def quote(self, start_location, end_location):
+        quotes = self.quotes_from(start_location).get(end_location)
+        if quotes is not None:
+            return quotes
+        key = (start_location, end_location)
+        quotes = self._get(key)
+        if quotes is None:
+            minutes = get_estimated_time(start_location, end_location)
+            if minutes is None:
+                return None
+            quotes = [calculate_ride_price(minutes)] * len(FARE_BUCKETS)
+            self._set(key, quotes)
+        return quotes
+
+    def clear(self):
+        with self.lock:
+            self.rows.clear()
+
+fare_quotes = FareQuotes()
+
+"""
+    Drops every memoized quote, so the next request per start reads Rides again.
+    Scheduled from app.py when FARE_REFRESH_SECONDS is set.
+    Returns:
+        dict: rows dropped
+"""
+def refresh_fare_table():
+    with fare_quotes.lock:
+        dropped = len(fare_quotes.rows)
+    fare_quotes.clear()
+    return {'rows_dropped': dropped}
+
+"""
+    Fare quotes
+    ---
+    Quotes from one pickup location, for each time of day bucket, computed from the
+    Rides.ride_duration of past and open rides for each pair and memoized per start
+    (see FareQuotes). Responses carry an ETag of their content, so the app can keep
+    them and revalidate with If-None-Match for a 304.
+    Quotes are indicative only: they price the average duration for the pair and
+    bucket, while /booking/initiate and /payment/create-intent charge the booked ride's
+    own ride_duration, so the amount paid can differ from the quote.
+    Query parameters:
+    - start (int): the start location id
+    - end (int, optional): only this end location. A pair without ride history is then
+      estimated through the Google Maps Directions API. Without `end`, pairs without
+      ride history are left out
+
+    Returns:
+    - 200 OK: {
+        buckets: [{ name, start_hour, end_hour }],  hours in server local time
+        start_location: int,
+        fares: { "<end_location>": [price_cents per bucket] }
+    }
+    - 304 Not Modified: If-None-Match matches the current quotes
+    - 400 Bad Request: Missing or invalid start or end
+    - 401 Unauthorized: Not logged in as anything
+    - 404 Not Found: Unknown start or end location, or no duration for the pair
+    - 500 Internal Server Error: Database error
+"""
+@fares_bp.route('/fares', methods=['GET'])
+@jwt_required() # As admins, users and drivers
+def get_fares():
+    start = request.args.get('start', '')
+    end = request.args.get('end')
+    if not start.isdigit():
+        return jsonify({'error': 'start must be a location id'}), 400
+    if end is not None and not end.isdigit():
+        return jsonify({'error': 'end must be a location id'}), 400
+
+    try:
+        if catalogue.get_location(start) is None:
+            return jsonify({'error': 'Location not found'}), 404
+        if end is None:
+            quotes = fare_quotes.quotes_from(int(start))
+        else:
+            if catalogue.get_location(end) is None:
+                return jsonify({'error': 'Location not found'}), 404
+            pair = fare_quotes.quote(int(start), int(end))
+            if pair is None:
+                return jsonify({'error': 'Could not estimate ride duration'}), 404
+            quotes = {int(end): pair}
+    except mysql.connector.Error as err:
+        return jsonify({'error': 'Database error', 'details': str(err)}), 500
+
+    body = json.dumps({
+        "message": "Fares listed",
+        "buckets": [{"name": name, "start_hour": first, "end_hour": last} for name, first, last in FARE_BUCKETS],
+        "start_location": int(start),
+        "fares": quotes,
+    }).encode('utf-8')
+    response = Response(body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(hashlib.sha1(body).hexdigest())
+    return response.make_conditional(request)
@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from flask import jsonify
+from dotenv import load_dotenv
+import bcrypt as bcrypt_lib
+import logging
+import os
+import threading
+
+load_dotenv()
+
+# Constants & Setups
+
+# bcrypt cost factor for new hashes, existing hashes keep the cost they were made with
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+# Worker processes dedicated to bcrypt, 0 hashes inline on the request thread (dev/tests)
+HASH_POOL_SIZE = int(os.getenv('HASH_POOL_SIZE', os.cpu_count() or 1))
+# Hash jobs allowed to run or wait at once before requests are turned away with 503
+HASH_QUEUE_LIMIT = int(os.getenv('HASH_QUEUE_LIMIT', max(HASH_POOL_SIZE, 1) * 4))
+# Longest a request waits for its hash job (seconds)
+HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 10))
+HASH_RETRY_AFTER = 1
+
+logger = logging.getLogger(__name__)
+
+"""
+    Raised when the bcrypt pool is saturated, turned into a 503 by the blueprints'
+    error handler so the client backs off instead of queueing behind the burst.
+"""
+class HashPoolBusy(Exception):
+    pass
+
+# --- Worker functions, run inside the pool processes ---
+
+def _hash(password, rounds):
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds)).decode('utf-8')
+
+def _check(pw_hash, password):
+    try:
+        return bcrypt_lib.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+    except ValueError:
+        return False # Malformed stored hash
+
+# --- Pool management ---
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_QUEUE_LIMIT)
+
+def _get_pool():
+    global _pool
+    # Created lazily so every gunicorn worker forks its own pool after it starts
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=HASH_POOL_SIZE)
+    return _pool
+
+def _run(fn, *args):
+    if HASH_POOL_SIZE <= 0:
+        return fn(*args)
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise HashPoolBusy()
+    try:
+        future = _get_pool().submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the job finishes, not until the request stops waiting, so
+    # timed out jobs still count against HASH_QUEUE_LIMIT while they occupy the pool
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel() # Frees the slot now if the job has not started
+        logger.warning("bcrypt job timed out after %ss", HASH_TIMEOUT)
+        raise HashPoolBusy()
+
+"""
+    Hashes a password on the bcrypt pool.
+
+    Parameters:
+        password (str): plain text password
+        rounds (int, optional): cost factor, defaults to BCRYPT_ROUNDS
+    Returns:
+        str: bcrypt hash, compatible with Flask-Bcrypt's check_password_hash
+    Raises:
+        HashPoolBusy: if the pool queue is full or the job times out
+"""
+def hash_password(password, rounds=None):
+    return _run(_hash, password, rounds or BCRYPT_ROUNDS)
+
+"""
+    Checks a password against a stored bcrypt hash on the bcrypt pool.
+
+    Returns:
+        bool: True if the password matches
+    Raises:
+        HashPoolBusy: if the pool queue is full or the job times out
+"""
+def check_password(pw_hash, password):
+    return _run(_check, pw_hash, password)
+
+def _busy_response(err):
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = str(HASH_RETRY_AFTER)
+    return response, 503
+
+"""
+    Registers the 503 handler for HashPoolBusy on a blueprint that hashes passwords.
+"""
+def register_busy_handler(blueprint):
+    blueprint.register_error_handler(HashPoolBusy, _busy_response)
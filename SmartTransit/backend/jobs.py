@@ -0,0 +1,35 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+"""
+    Runs `job` every `interval_seconds` on a SocketIO background task, so periodic
+    maintenance shares the server's async mode (threads, eventlet or gevent).
+    An interval of 0 or less leaves the job disabled.
+
+    Parameters:
+        socketio (SocketIO): the app's SocketIO instance
+        name (str): label used in logs
+        job (callable): takes no arguments, its return value is logged
+        interval_seconds (float): delay between runs
+        log_results (bool): set False for high-frequency jobs to keep logs quiet
+    Returns:
+        the background task, or None if the job is disabled
+"""
+def start_periodic_job(socketio, name, job, interval_seconds, log_results=True):
+    if not interval_seconds or interval_seconds <= 0:
+        return None
+
+    def run():
+        while True:
+            socketio.sleep(interval_seconds)
+            try:
+                result = job()
+                if log_results:
+                    logger.info("Job %s finished: %s", name, result)
+            except Exception:
+                # Keep the loop alive, the next run may succeed
+                logger.exception("Job %s failed", name)
+
+    logger.info("Scheduling job %s every %ss", name, interval_seconds)
+    return socketio.start_background_task(run)
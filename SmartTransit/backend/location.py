@@ -1,4 +1,4 @@
-from flask import Response, stream_with_context, Blueprint, jsonify, request
+from flask import Response, Blueprint, jsonify, request
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import jwt_required
 from datetime import timedelta
@@ -7,7 +7,12 @@ from dotenv import load_dotenv
 import os
 from datetime import timedelta
 import requests
+import csv, io, time
 from custom_decorator import admin_only
+from pagination import get_page_args, build_page
+from location_catalogue import catalogue, catalogue_changes
+from stop_index import VersionedStopIndex
+import directions
 
 load_dotenv()
 
@@ -25,8 +30,26 @@ CONFIG = {
 jwt_secret_key = os.getenv('JWT_SECRET_KEY')
 jwt_access_expires = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 15)))
 
+# Bulk import: rows inserted per transaction, and the most rows accepted in one request
+LOCATION_IMPORT_BATCH = int(os.getenv('LOCATION_IMPORT_BATCH', 500))
+LOCATION_IMPORT_MAX_ROWS = int(os.getenv('LOCATION_IMPORT_MAX_ROWS', 50000))
+# decimal(15,12) holds values below 1000 in magnitude
+MAX_COORDINATE = 1000
+DUPLICATE_ENTRY = 1062
+# Location delete: rides removed per transaction, pause between batches, and retries
+# when a new ride for the stop blocks the final delete
+LOCATION_DELETE_BATCH = int(os.getenv('LOCATION_DELETE_BATCH', 500))
+LOCATION_DELETE_PAUSE = float(os.getenv('LOCATION_DELETE_PAUSE', 0.02))
+LOCATION_DELETE_RETRIES = 3
+ROW_IS_REFERENCED = 1451
+# Nearest locations: default and largest k
+NEAREST_DEFAULT_K = 5
+NEAREST_MAX_K = 50
+
 location_bp = Blueprint('location', __name__)
 bcrypt = Bcrypt()
+# KD-tree over the catalogue, keyed by when the catalogue was last built
+nearest_index = VersionedStopIndex()
 
 def get_db_connection():
     return mysql.connector.connect(**CONFIG)
@@ -53,27 +76,27 @@ def addLocation():
     locationName = str(data.get('location_name'))
     xCoordinate = float(data.get('x_coordinate'))
     yCoordinate = float(data.get('y_coordinate'))
+    conn = None
+    cursor = None
     # Start DB connection
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute("SELECT location_name from Locations")
-        allLocation = [data[0].lower() for data in cursor.fetchall()]
-        
-        if (locationName.lower() in allLocation):
-            return jsonify({'error': 'Duplicated Location Name'}), 400
-        
-        # If no error has been found, insert into locations
+        # Duplicates (ignoring case and surrounding spaces) are rejected by the unique name_key index
         cursor.execute('INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES (%s, %s, %s)',
                        (locationName, xCoordinate, yCoordinate))
+        newLocationId = cursor.lastrowid
         conn.commit()
-
-        cursor.execute("SELECT * FROM Locations WHERE location_name = %s", (locationName,))
-        newLocationId = cursor.fetchall()[0][0]
+        catalogue.invalidate()
 
         return jsonify({'message': 'Location added', 'location_id': str(newLocationId)}), 200
 
+    except mysql.connector.IntegrityError as err:
+        conn.rollback()
+        if err.errno == DUPLICATE_ENTRY:
+            return jsonify({'error': 'Duplicated Location Name'}), 400
+        return jsonify({'error': 'Database error', 'details': str(err)}), 500
     except mysql.connector.Error as err:
         conn.rollback()
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
@@ -81,27 +104,247 @@ def addLocation():
         if cursor: cursor.close()
         if conn: conn.close()
 
+# Close to the name_key column's lower(trim()), only used to drop repeats within one
+# import before it reaches MySQL. Lookups match on name_key itself, see lookup_location_ids
+def normalise_location_name(name):
+    return name.strip().lower()
+
+"""
+    Validates one import row.
+    Returns ((name, x, y), None) for a valid row, or (None, error message).
+"""
+def parse_location_row(row):
+    if not isinstance(row, dict):
+        return None, 'Row must be an object'
+    name = str(row.get('location_name') or '').strip()
+    if not name:
+        return None, 'Missing location_name'
+    if len(name) > 80:
+        return None, 'location_name is longer than 80 characters'
+    try:
+        x = float(row.get('x_coordinate'))
+        y = float(row.get('y_coordinate'))
+    except (TypeError, ValueError):
+        return None, 'Invalid x_coordinate or y_coordinate'
+    if not (abs(x) < MAX_COORDINATE and abs(y) < MAX_COORDINATE):
+        return None, 'Coordinate out of range'
+    return (name, x, y), None
+
+"""
+    Reads the rows of an import request: a CSV upload (multipart field "file" or a
+    text/csv body) with a location_name,x_coordinate,y_coordinate header, or JSON as
+    a list of rows or { "locations": [rows] }.
+    Raises ValueError if the body is neither.
+"""
+def read_import_rows():
+    upload = request.files.get('file')
+    if upload is not None or request.mimetype == 'text/csv':
+        text = upload.read().decode('utf-8-sig') if upload is not None else request.get_data(as_text=True)
+        return list(csv.DictReader(io.StringIO(text)))
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('locations')
+    if not isinstance(data, list):
+        raise ValueError('Expected a CSV file or a JSON list of locations')
+    return data
+
+"""
+    location_id of the stored stop each name collides with, matched on name_key by
+    MySQL's own lower(trim()), so the result never depends on Python normalising a name
+    the same way. Returns { name as given: location_id } for the names that exist.
+"""
+def lookup_location_ids(cursor, names):
+    names = list(names)
+    given = ' UNION ALL '.join(['SELECT %s AS name'] * len(names))
+    cursor.execute(
+        f"SELECT given.name, l.location_id FROM ({given}) given "
+        "JOIN Locations l ON l.name_key = lower(trim(given.name))",
+        names
+    )
+    return dict(cursor.fetchall())
+
+"""
+    Inserts one batch of valid rows in a single transaction.
+    ---
+    Names already in Locations are reported as duplicates up front, the rest go in as
+    one multi-row INSERT and their ids are read back by name_key. If a concurrent
+    insert takes a name in between, the batch is rolled back and retried row by row.
+
+    Parameters:
+        batch (list): (row number, name, x, y) tuples, names unique within the batch
+        results (dict): row number -> result, filled in by this function
+"""
+def import_location_batch(conn, cursor, batch, results):
+    existing = lookup_location_ids(cursor, [name for _, name, _, _ in batch])
+
+    new_rows = []
+    for row_number, name, x, y in batch:
+        location_id = existing.get(name)
+        if location_id is not None:
+            results[row_number] = {'row': row_number, 'status': 'duplicate', 'location_id': location_id}
+        else:
+            new_rows.append((row_number, name, x, y))
+    if not new_rows:
+        return
+
+    try:
+        cursor.executemany(
+            "INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES (%s, %s, %s)",
+            [(name, x, y) for _, name, x, y in new_rows]
+        )
+        inserted = lookup_location_ids(cursor, [name for _, name, _, _ in new_rows])
+        conn.commit()
+        for row_number, name, _, _ in new_rows:
+            results[row_number] = {'row': row_number, 'status': 'created', 'location_id': inserted.get(name)}
+    except mysql.connector.IntegrityError as err:
+        conn.rollback()
+        if err.errno != DUPLICATE_ENTRY:
+            raise
+        for row_number, name, x, y in new_rows:
+            try:
+                cursor.execute(
+                    "INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES (%s, %s, %s)",
+                    (name, x, y)
+                )
+                results[row_number] = {'row': row_number, 'status': 'created', 'location_id': cursor.lastrowid}
+            except mysql.connector.IntegrityError as row_err:
+                if row_err.errno != DUPLICATE_ENTRY:
+                    raise
+                results[row_number] = {'row': row_number, 'status': 'duplicate',
+                                       'location_id': lookup_location_ids(cursor, [name]).get(name)}
+        conn.commit()
+
+"""
+    Bulk import locations
+    ---
+    Inserts many locations at once, LOCATION_IMPORT_BATCH rows per transaction.
+    Request body: a CSV file (multipart field "file" or a text/csv body) with the header
+    location_name,x_coordinate,y_coordinate, or JSON as a list of
+    { location_name, x_coordinate, y_coordinate } or { "locations": [...] }.
+
+    Returns:
+    - 200 OK: {
+        created: int, duplicates: int, invalid: int,
+        results: [{ row, status: created | duplicate | invalid, location_id?, error? }]
+    }   rows are numbered from 1 in the order given
+    - 400 Bad Request: Unreadable body, no rows or more than LOCATION_IMPORT_MAX_ROWS
+    - 403 Unauthorized: Admin only route
+    - 500 Internal Server Error: Database error, batches before the failing one stay committed
+"""
+@location_bp.route('/location/import', methods=['POST'])
+@admin_only() # As admin
+def importLocations():
+    try:
+        rows = read_import_rows()
+    except (ValueError, UnicodeDecodeError, csv.Error) as err:
+        return jsonify({'error': str(err)}), 400
+    if not rows:
+        return jsonify({'error': 'No locations given'}), 400
+    if len(rows) > LOCATION_IMPORT_MAX_ROWS:
+        return jsonify({'error': f'At most {LOCATION_IMPORT_MAX_ROWS} locations per import'}), 400
+
+    # Validate every row and drop repeats within the file before touching the DB
+    results = {}
+    valid = []
+    seen = {}
+    for row_number, row in enumerate(rows, 1):
+        parsed, error = parse_location_row(row)
+        if error:
+            results[row_number] = {'row': row_number, 'status': 'invalid', 'error': error}
+            continue
+        key = normalise_location_name(parsed[0])
+        if key in seen:
+            results[row_number] = {'row': row_number, 'status': 'duplicate', 'error': f'Same name as row {seen[key]}'}
+            continue
+        seen[key] = row_number
+        valid.append((row_number, *parsed))
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        for start in range(0, len(valid), LOCATION_IMPORT_BATCH):
+            import_location_batch(conn, cursor, valid[start:start + LOCATION_IMPORT_BATCH], results)
+    except mysql.connector.Error as err:
+        if conn: conn.rollback()
+        return jsonify({'error': 'Database error', 'details': str(err)}), 500
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+        catalogue.invalidate()
+
+    ordered = [results[row_number] for row_number in sorted(results)]
+    statuses = [result['status'] for result in ordered]
+    return jsonify({
+        'created': statuses.count('created'),
+        'duplicates': statuses.count('duplicate'),
+        'invalid': statuses.count('invalid'),
+        'results': ordered
+    }), 200
+
 """
     Show all the locations to users, operators and drivers
     ---
     Query the database for a list of all the currently available pickup locations
+    The full list is served from memory (see location_catalogue.py) with its catalogue
+    version and an ETag, gzipped if the client accepts it.
+    Query parameters (optional, enables keyset pagination on location_id):
+    - limit (int): page size, capped at MAX_PAGE_LIMIT
+    - after (str): opaque cursor from the previous page's next_cursor
+    Query parameters (optional, delta mode):
+    - since (int): catalogue version the client holds, returns only what changed after it
+      as { version, locations: added or updated, deleted: location ids }
 
     Returns:
-    - 200 OK: Successfully shown all pickup locations
+    - 200 OK: Successfully shown all pickup locations (plus next_cursor when paginated)
+    - 304 Not Modified: If-None-Match matches the current catalogue
+    - 400 Bad Request: Invalid limit, cursor or version
     - 401 Unauthorized: Not logged in as anything
     - 500 Internal Server Error: Database error
 """
 @location_bp.route('/location', methods=['GET'])
 @jwt_required() # As admins, users and drivers
 def getLocations():
+    try:
+        page_args = get_page_args()
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    since = request.args.get('since')
+    if not page_args:
+        try:
+            if since is None:
+                return catalogue.response()
+            if not since.isdigit():
+                return jsonify({'error': 'Invalid version'}), 400
+            changes = catalogue_changes(int(since))
+            # A version the change log no longer covers, start over from the full list
+            if changes is None:
+                return catalogue.response()
+            return jsonify({"message": "Location changes", **changes}), 200
+        except mysql.connector.Error as err:
+            return jsonify({'error': 'Database error', 'details': str(err)}), 500
+
+    conn = None
+    cursor = None
     try:
         # Add the location into an array
         locations = []
         # Start DB connection
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Locations")
-        
+        limit, after_id = page_args
+        cursor.execute(
+            """
+            SELECT location_id, location_name, x_coordinate, y_coordinate
+            FROM Locations
+            WHERE location_id > %s
+            ORDER BY location_id
+            LIMIT %s
+            """, (after_id or 0, limit + 1)
+        )
+
         # Append each location data in list
         for location in cursor.fetchall():
             locationObj = {
@@ -111,7 +354,9 @@ def getLocations():
                 "y_coordinate": float(location[3]),
             }
             locations.append(locationObj)
-        return jsonify({"message": "Location listed", "locations": locations}), 200
+
+        locations, next_cursor = build_page(locations, page_args[0], "location_id")
+        return jsonify({"message": "Location listed", "locations": locations, "next_cursor": next_cursor}), 200
     except mysql.connector.Error as err:
         conn.rollback()
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
@@ -119,50 +364,166 @@ def getLocations():
         if cursor: cursor.close()
         if conn: conn.close()
 
+"""
+    Nearest pickup locations
+    ---
+    Finds the k pickup locations closest to a point by great-circle distance, using a
+    KD-tree over the location catalogue (see stop_index.py). The tree is rebuilt on
+    the first request after the catalogue changes.
+    Query parameters:
+    - lat (float): latitude, -90 to 90
+    - lng (float): longitude, -180 to 180
+    - k (int, optional): how many locations, default NEAREST_DEFAULT_K, capped at NEAREST_MAX_K
+
+    Returns:
+    - 200 OK: { locations: [{ location_id, location_name, x_coordinate, y_coordinate, distance_m }] }
+      nearest first
+    - 400 Bad Request: Missing or invalid lat, lng or k
+    - 401 Unauthorized: Not logged in as anything
+    - 500 Internal Server Error: Database error
+"""
+@location_bp.route('/location/nearest', methods=['GET'])
+@jwt_required() # As admins, users and drivers
+def getNearestLocations():
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lat and lng are required numbers'}), 400
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'error': 'lat must be within [-90, 90] and lng within [-180, 180]'}), 400
+
+    k = request.args.get('k', str(NEAREST_DEFAULT_K))
+    if not k.isdigit() or int(k) < 1:
+        return jsonify({'error': 'k must be a positive integer'}), 400
+    k = min(int(k), NEAREST_MAX_K)
+
+    try:
+        catalogue.refresh()
+    except mysql.connector.Error as err:
+        return jsonify({'error': 'Database error', 'details': str(err)}), 500
+
+    # x_coordinate is the latitude and y_coordinate the longitude, as sent to Google
+    index = nearest_index.get(catalogue.built_at, lambda: [
+        (location, location["x_coordinate"], location["y_coordinate"]) for location in catalogue.locations
+    ])
+    locations = [
+        {**location, "distance_m": round(distance, 1)}
+        for location, distance in index.nearest(lat, lng, k)
+    ]
+    return jsonify({"message": "Nearest locations", "locations": locations}), 200
+
+def add_counts(totals, counts):
+    for key, count in counts.items():
+        totals[key] += count
+
 """
     Delete a location
     ---
-    Get the id of the location and delete it from database.
+    Get the id of the location and delete it from database, along with the rides that
+    start or end there and their bookings and operator assignments.
+    Rides are removed LOCATION_DELETE_BATCH at a time with set-based deletes, one short
+    transaction per batch, so bookings on other stops are never queued behind a busy stop.
+    The last batch and the location itself share one transaction, so a ride created
+    for the stop mid-delete is either removed with it or blocks the delete, which retries.
 
     Returns:
-    - 200 OK: Successfully destroyed
+    - 200 OK: Successfully destroyed, with { deleted: { locations, rides, bookings, operates } }
     - 400 Bad Request: Location is not found
     - 401 Unauthorized: Not logged in as anything
-    - 500 Internal Server Error: Database error
+    - 500 Internal Server Error: Database error, batches before the failure stay deleted
 """
 @location_bp.route('/location/<id>', methods=['DELETE'])
 @admin_only() # As admins only
 def deleteLocation(id):
+    if not id.isdigit():
+        return jsonify({'error': 'Location is not found'}), 400
+    location_id = int(id)
+
+    deleted = {'locations': 0, 'rides': 0, 'bookings': 0, 'operates': 0}
+    conn = None
+    cursor = None
     try:
         # Start DB connection
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT location_id FROM Locations WHERE location_id = %s", (location_id,))
 
-        cursor.execute("SELECT * FROM Locations WHERE location_id = %s", (id,))
-        result = cursor.fetchall()
-        
-        # Handle case where location is not found        
-        if len(result) == 0:
+        # Handle case where location is not found
+        if cursor.fetchone() is None:
             return jsonify({'error': 'Location is not found'}), 400
 
-        cursor.execute("SELECT ride_id FROM Rides WHERE start_location = %s OR end_location= %s", (id, id))
+        attempts = 0
+        while True:
+            # Each branch of the UNION uses its own foreign key index
+            cursor.execute(
+                """
+                SELECT ride_id FROM Rides WHERE start_location = %s
+                UNION
+                SELECT ride_id FROM Rides WHERE end_location = %s
+                LIMIT %s
+                """, (location_id, location_id, LOCATION_DELETE_BATCH)
+            )
+            ride_ids = [row[0] for row in cursor.fetchall()]
 
-        # Delete all the associated data as well
-        for ride in cursor.fetchall():
-            rideId = ride["ride_id"]
-            cursor.execute("DELETE FROM Bookings WHERE ride_id =" + str(rideId))
-            cursor.execute("DELETE FROM Rides WHERE ride_id=" + str(rideId))
-        
-        cursor.execute("DELETE FROM Locations WHERE location_id=" + id)
-        conn.commit()
-        return jsonify({'message': 'Successfully exterminated the location'}), 200
+            # Delete all the associated data as well, counted once the batch commits
+            batch = {}
+            if ride_ids:
+                placeholders = ', '.join(['%s'] * len(ride_ids))
+                for table in ('Bookings', 'Operates', 'Rides'):
+                    cursor.execute(f"DELETE FROM {table} WHERE ride_id IN ({placeholders})", ride_ids)
+                    batch[table.lower()] = cursor.rowcount
+
+            if len(ride_ids) == LOCATION_DELETE_BATCH:
+                conn.commit()
+                add_counts(deleted, batch)
+                time.sleep(LOCATION_DELETE_PAUSE)
+                continue
+
+            # Last batch: remove the location in the same transaction
+            try:
+                cursor.execute("DELETE FROM Locations WHERE location_id = %s", (location_id,))
+            except mysql.connector.IntegrityError as err:
+                # A booking created a ride for this stop since the SELECT above
+                attempts += 1
+                if err.errno != ROW_IS_REFERENCED or attempts > LOCATION_DELETE_RETRIES:
+                    raise
+                conn.commit()
+                add_counts(deleted, batch)
+                continue
+            batch['locations'] = cursor.rowcount
+            conn.commit()
+            add_counts(deleted, batch)
+            break
+
+        catalogue.invalidate()
+        return jsonify({'message': 'Successfully exterminated the location', 'deleted': deleted}), 200
     except mysql.connector.Error as err:
-        conn.rollback()
-        return jsonify({'error': 'Database error', 'details': str(err)}), 500
+        if conn: conn.rollback()
+        return jsonify({'error': 'Database error', 'details': str(err), 'deleted': deleted}), 500
     finally:
         if cursor: cursor.close()
         if conn: conn.close()
 
+"""
+    Directions proxy
+    ---
+    Returns Google's Directions response for origin -> destination leaving now.
+    Identical requests within a short window are served from memory and concurrent
+    identical requests share one upstream call (see directions.py).
+    Query parameters:
+    - origin (str): "lat,lng" or a place name
+    - destination (str): "lat,lng" or a place name
+    - compact (optional, "1"): return only status, summary, bounds, leg distance/duration/
+      addresses and a simplified overview_polyline instead of Google's full response
+    - zoom (optional, int 0-21): map zoom the compact polyline is simplified for, default 14
+
+    Returns:
+    - Google's status code and JSON body
+    - 400 Bad Request: Missing origin or destination, invalid zoom
+    - 500 Internal Server Error: Google could not be reached
+"""
 @location_bp.route('/directions', methods=['GET'])
 def get_directions():
     origin = request.args.get('origin')
@@ -171,31 +532,16 @@ def get_directions():
     if not origin or not destination:
         return jsonify({'error': 'Both origin and destination are required.'}), 400
 
-    google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-    directions_url = (
-        f"https://maps.googleapis.com/maps/api/directions/json"
-        f"?origin={origin}"
-        f"&destination={destination}"
-        f"&departure_time=now"
-        f"&key={google_maps_api_key}"
-    )
-    
+    compact = request.args.get('compact') in ('1', 'true')
+    zoom = request.args.get('zoom', str(directions.DEFAULT_ZOOM))
+    if compact and not (zoom.isdigit() and 0 <= int(zoom) <= 21):
+        return jsonify({'error': 'zoom must be an integer from 0 to 21.'}), 400
+
     try:
-        response = requests.get(directions_url, timeout=15, stream=True)
-
-        # Optional: log the content length if available
-        print("Fetched directions, content length:", response.headers.get('Content-Length'))
-
-        # Generator to yield the content in chunks
-        def generate():
-            for chunk in response.iter_content(chunk_size=4096):
-                if chunk:
-                    yield chunk
-
-        # Return a streaming response
-        response_headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
-        return Response(stream_with_context(generate()), 
-                        status=response.status_code, 
-                        headers=response_headers)
-    except Exception as err:
+        if compact:
+            status_code, body = directions.get_compact_directions(origin, destination, int(zoom))
+        else:
+            status_code, body = directions.get_directions(origin, destination)
+        return Response(body, status=status_code, mimetype='application/json')
+    except requests.RequestException as err:
         return jsonify({'error': 'Error fetching directions', 'details': str(err)}), 500
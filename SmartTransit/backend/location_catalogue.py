@@ -0,0 +1,210 @@
+from flask import Response, request
+from dotenv import load_dotenv
+import mysql.connector
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+# How often a worker asks MySQL for the catalogue version (seconds), writes made
+# through this worker are seen on the next request regardless
+LOCATION_VERSION_CHECK_SECONDS = float(os.getenv('LOCATION_VERSION_CHECK_SECONDS', 1))
+# Rebuild from Locations at least this often (seconds), covering a TRUNCATE, which
+# bypasses the LocationChanges triggers
+LOCATION_CATALOGUE_MAX_AGE = float(os.getenv('LOCATION_CATALOGUE_MAX_AGE', 300))
+# Change sequence numbers are taken at insert but become visible at commit, so a
+# transaction open this long (seconds) can still commit below a version already served.
+# Deltas re-send the changes made this close before `since`
+LOCATION_CHANGES_OVERLAP_SECONDS = int(os.getenv('LOCATION_CHANGES_OVERLAP_SECONDS', 60))
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+def get_db_connection():
+    return mysql.connector.connect(**CONFIG)
+
+def _location_json(row):
+    return {
+        "location_id": row[0],
+        "location_name": row[1],
+        "x_coordinate": float(row[2]),
+        "y_coordinate": float(row[3]),
+    }
+
+"""
+    The current catalogue version: the last LocationChanges sequence number, which
+    the Locations triggers advance on every insert, update and delete.
+"""
+def fetch_version(cursor):
+    cursor.execute("SELECT COALESCE(MAX(change_seq), 0) FROM LocationChanges")
+    return cursor.fetchone()[0]
+
+"""
+    In-memory copy of the full /location response.
+    ---
+    Holds the rows, the serialised JSON body, its gzip encoding and an ETag, all built
+    once per catalogue version, so a request costs at most one indexed MAX() query
+    and usually none.
+"""
+class LocationCatalogue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.locations = []
+        self.by_id = {}
+        self.body = b''
+        self.gzipped = None
+        self.etag = None
+        self.checked_at = 0
+        self.built_at = 0
+
+    def _build(self, cursor):
+        # Read the version first: a change landing in between only makes the copy look
+        # older than it is, and the next check rebuilds it
+        version = fetch_version(cursor)
+        cursor.execute("SELECT location_id, location_name, x_coordinate, y_coordinate FROM Locations ORDER BY location_id")
+        locations = [_location_json(row) for row in cursor.fetchall()]
+
+        body = json.dumps({"message": "Location listed", "locations": locations, "version": version}).encode('utf-8')
+        self.version = version
+        self.locations = locations
+        self.by_id = {location["location_id"]: location for location in locations}
+        self.body = body
+        self.gzipped = gzip.compress(body, 6) if len(body) >= GZIP_MIN_BYTES else None
+        self.etag = f"loc-{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+        self.built_at = time.monotonic()
+
+    """
+        Brings the catalogue up to date if it is due for a version check.
+        Raises mysql.connector.Error if MySQL cannot be reached.
+    """
+    def refresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < LOCATION_VERSION_CHECK_SECONDS:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if self.version is not None and now - self.checked_at < LOCATION_VERSION_CHECK_SECONDS:
+                return # Another request refreshed it while we waited
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                stale = now - self.built_at >= LOCATION_CATALOGUE_MAX_AGE
+                if self.version is None or stale or fetch_version(cursor) != self.version:
+                    self._build(cursor)
+                self.checked_at = now
+            finally:
+                cursor.close()
+                conn.close()
+
+    """
+        One location by id, or None if it does not exist.
+        A miss forces a version check first, so a stop added moments ago through
+        another worker is still found. Raises mysql.connector.Error like refresh().
+    """
+    def get_location(self, location_id):
+        try:
+            location_id = int(location_id)
+        except (TypeError, ValueError):
+            return None
+        self.refresh()
+        location = self.by_id.get(location_id)
+        if location is None:
+            self.invalidate()
+            self.refresh()
+            location = self.by_id.get(location_id)
+        return location
+
+    """
+        Makes the next request check the version, called after this worker writes Locations.
+    """
+    def invalidate(self):
+        self.checked_at = 0
+
+    """
+        The full catalogue as a conditional response: 304 when If-None-Match matches,
+        otherwise the pre-serialised body, gzipped when the client accepts it.
+    """
+    def response(self):
+        self.refresh()
+        body, gzipped, etag = self.body, self.gzipped, self.etag
+        if gzipped is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = Response(gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(body, mimetype='application/json')
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+catalogue = LocationCatalogue()
+
+"""
+    Changes to the catalogue after `since`, for clients that already hold that version.
+    ---
+    A change numbered below `since` may commit after `since` was served, so the delta
+    also re-sends every location changed within LOCATION_CHANGES_OVERLAP_SECONDS before
+    `since` was recorded. Clients upsert by location_id, a repeated row is harmless.
+
+    Returns:
+        dict: { version, locations: rows inserted or updated since, deleted: location ids },
+        or None when `since` is newer than the log or older than what purge.py kept of it,
+        and the client needs the full catalogue
+    Raises:
+        mysql.connector.Error: on database errors
+"""
+def catalogue_changes(since):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(change_seq), 0), MIN(change_seq) FROM LocationChanges")
+        version, oldest = cursor.fetchone()
+        if since > version or (oldest is not None and since < oldest - 1):
+            return None
+        cursor.execute(
+            """
+            SELECT MIN(c.change_seq)
+            FROM LocationChanges s
+            JOIN LocationChanges c
+              ON c.changed_at >= s.changed_at - INTERVAL %s SECOND AND c.change_seq <= s.change_seq
+            WHERE s.change_seq = %s
+            """, (LOCATION_CHANGES_OVERLAP_SECONDS, since)
+        )
+        first = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT DISTINCT location_id FROM LocationChanges WHERE change_seq > %s AND change_seq <= %s",
+            (since if first is None else first - 1, version)
+        )
+        changed = [row[0] for row in cursor.fetchall()]
+        locations = []
+        if changed:
+            placeholders = ', '.join(['%s'] * len(changed))
+            cursor.execute(
+                f"""
+                SELECT location_id, location_name, x_coordinate, y_coordinate
+                FROM Locations
+                WHERE location_id IN ({placeholders})
+                ORDER BY location_id
+                """, changed
+            )
+            locations = [_location_json(row) for row in cursor.fetchall()]
+        present = {location["location_id"] for location in locations}
+        deleted = [location_id for location_id in changed if location_id not in present]
+        return {"version": version, "locations": locations, "deleted": deleted}
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,90 @@
+from flask import request
+import base64
+
+# Constants & Setups
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+"""
+    Encodes the primary key of the last row on a page into an opaque cursor.
+    Clients hand this back as `after` to fetch the next page.
+
+    Parameters:
+        last_id (int): primary key of the last row returned
+    Returns:
+        str: url-safe cursor token
+"""
+def encode_cursor(last_id):
+    raw = f"k:{int(last_id)}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+"""
+    Decodes a cursor produced by encode_cursor back into a primary key.
+
+    Parameters:
+        token (str): cursor given by the client
+    Returns:
+        int: primary key to continue after
+    Raises:
+        ValueError: if the token is malformed
+"""
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not raw.startswith('k:'):
+        raise ValueError('Invalid cursor')
+    try:
+        return int(raw[2:])
+    except ValueError:
+        raise ValueError('Invalid cursor')
+
+"""
+    Reads the `limit` and `after` query parameters of the current request.
+    Pagination is opt-in so existing clients that expect the full list keep working;
+    as soon as either parameter is present the endpoint switches to keyset pages.
+
+    Returns:
+        None if the request is not paginated, otherwise (limit, after_id)
+        where after_id is None for the first page.
+    Raises:
+        ValueError: if limit or after is invalid
+"""
+def get_page_args():
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    if limit is None and after is None:
+        return None
+
+    if limit is None:
+        limit = DEFAULT_PAGE_LIMIT
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+        limit = min(limit, MAX_PAGE_LIMIT)
+
+    after_id = decode_cursor(after) if after else None
+    return limit, after_id
+
+"""
+    Trims a page that was fetched with LIMIT limit + 1 and works out the next cursor.
+
+    Parameters:
+        rows (list): rows ordered by key, at most limit + 1 long
+        limit (int): page size requested
+        key (str): name of the primary key column in each row
+    Returns:
+        (list, str | None): the page and the cursor for the next page (None on the last page)
+"""
+def build_page(rows, limit, key):
+    if len(rows) > limit:
+        page = rows[:limit]
+        return page, encode_cursor(page[-1][key])
+    return rows, None
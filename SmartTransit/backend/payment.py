@@ -7,6 +7,8 @@ import os
 import logging
 from datetime import datetime
 from custom_decorator import user_only
+from processed_events import processed_events
+from webhook_inbox import enqueue_event
 import stripe.error
 
 load_dotenv()
@@ -77,7 +79,7 @@ def get_stripe_config():
     - 400 Bad Request: Missing ride_id.
     - 401 Unauthorized: Not logged in.
     - 404 Not Found: Ride ID does not exist.
-    - 409 Conflict: User has already successfully paid for this ride.
+    - 409 Conflict: User has already successfully paid for this ride, or the ride is full.
     - 500 Internal Server Error: Database or Stripe API error.
 """
 @payment_bp.route('/payment/create-intent', methods=['POST'])
@@ -96,8 +98,19 @@ def create_payment_intent():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        # 1. Verify ride exists and retrieve its duration
-        cursor.execute("SELECT ride_id, ride_duration FROM Rides WHERE ride_id = %s", (ride_id,))
+        # 1. Ride, seats taken, the user's booking and the capacity in one round trip
+        cursor.execute(
+            """
+            SELECT r.ride_duration, r.passenger_count,
+                   (SELECT MAX(capacity) FROM Vehicles) AS capacity,
+                   EXISTS (
+                       SELECT 1 FROM Bookings b WHERE b.ride_id = r.ride_id AND b.user_id = %s
+                   ) AS already_booked
+            FROM Rides r
+            WHERE r.ride_id = %s
+            """,
+            (user_id, ride_id)
+        )
         ride = cursor.fetchone()
         if not ride:
             return jsonify({'error': 'Ride not found'}), 404
@@ -108,12 +121,15 @@ def create_payment_intent():
         currency = "aud"
 
         # 2. Check if already booked or paid
-        cursor.execute("SELECT ride_id FROM Bookings WHERE ride_id = %s AND user_id = %s", (ride_id, user_id))
-        existing_booking = cursor.fetchone()
-        if existing_booking:
+        if ride['already_booked']:
             return jsonify({'error': 'You have already booked and paid for this ride'}), 409
 
-        # 3. Create Stripe Payment Intent
+        # 3. A full ride would be refunded when the payment is applied (see webhook_inbox.py),
+        # so it is turned away before charging. Without vehicles nothing is checked there either
+        if ride['capacity'] is not None and ride['passenger_count'] >= ride['capacity']:
+            return jsonify({'error': 'Not enough seats left on this ride', 'seats_left': 0}), 409
+
+        # 4. Create Stripe Payment Intent
         try:
             payment_intent = stripe.PaymentIntent.create(
                 amount=amount_cents,
@@ -142,10 +158,119 @@ def create_payment_intent():
     finally:
         if cursor: cursor.close()
 
+"""
+    Create Group Payment Intent
+    ---
+    Reserves several seats on one ride for a group (family, tour group) with a single
+    payment: one Stripe PaymentIntent for the total and one webhook, which books every
+    seat under the paying user. Call /booking/initiate once for the ride first.
+    Request body (JSON):
+    - ride_id: The ID of the ride for the booking.
+    - seats (int): number of seats, the payer included
+    (User ID is obtained from JWT)
+
+    Logic:
+    1. One query reads the ride, its passenger count, whether the user already booked it
+       and the largest Vehicles.capacity, the most any vehicle dispatched for it can seat.
+    2. Seats already taken plus the new ones must fit in that capacity.
+    Two groups can both pass this check before either pays, so the inbox worker checks
+    the seats again with the ride locked and refunds a payment that no longer fits
+    (see webhook_inbox.py).
+
+    Returns:
+    - 200 OK: { "clientSecret": <client_secret_from_stripe>, "seats": int, "amount_cents": int }
+    - 400 Bad Request: Missing ride_id, seats not a positive integer.
+    - 401 Unauthorized: Not logged in.
+    - 404 Not Found: Ride ID does not exist.
+    - 409 Conflict: Already booked, the ride is no longer open or there are not enough seats left.
+    - 500 Internal Server Error: Database or Stripe API error.
+"""
+@payment_bp.route('/payment/create-group-intent', methods=['POST'])
+@user_only()
+def create_group_payment_intent():
+    data = request.get_json()
+    ride_id = data.get('ride_id')
+    seats = data.get('seats')
+    user_id = get_jwt_identity()
+
+    if not ride_id:
+        return jsonify({'error': 'Missing ride_id'}), 400
+    if not isinstance(seats, int) or isinstance(seats, bool) or seats < 1:
+        return jsonify({'error': 'seats must be a positive integer'}), 400
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # 1. Ride, seats taken, the user's booking and the capacity in one round trip
+        cursor.execute(
+            """
+            SELECT r.ride_duration, r.ride_status, r.passenger_count,
+                   (SELECT MAX(capacity) FROM Vehicles) AS capacity,
+                   EXISTS (
+                       SELECT 1 FROM Bookings b WHERE b.ride_id = r.ride_id AND b.user_id = %s
+                   ) AS already_booked
+            FROM Rides r
+            WHERE r.ride_id = %s
+            """,
+            (user_id, ride_id)
+        )
+        ride = cursor.fetchone()
+        if not ride:
+            return jsonify({'error': 'Ride not found'}), 404
+        if ride['already_booked']:
+            return jsonify({'error': 'You have already booked and paid for this ride'}), 409
+        if ride['ride_status'] != 'I':
+            return jsonify({'error': 'Ride is no longer open for booking'}), 409
+
+        # 2. Seats must fit in the largest vehicle
+        seats_left = max((ride['capacity'] or 0) - ride['passenger_count'], 0)
+        if seats > seats_left:
+            return jsonify({'error': 'Not enough seats left on this ride', 'seats_left': seats_left}), 409
+
+        amount_cents = calculate_ride_price(ride['ride_duration']) * seats
+        currency = "aud"
+
+        # 3. One Stripe Payment Intent for the whole group
+        try:
+            payment_intent = stripe.PaymentIntent.create(
+                amount=amount_cents,
+                currency=currency,
+                automatic_payment_methods={'enabled': True},
+                metadata={
+                    'ride_id': ride_id,
+                    'user_id': user_id,
+                    'seats': seats,
+                }
+            )
+        except stripe.error.StripeError as e:
+            logger.error(f"Stripe error creating group PaymentIntent: {e}")
+            return jsonify({'error': 'Failed to create payment intent', 'details': str(e)}), 500
+
+        return jsonify({'clientSecret': payment_intent.client_secret, 'seats': seats, 'amount_cents': amount_cents}), 200
+
+    except mysql.connector.Error as err:
+        logger.error(f"Database error in create_group_payment_intent: {err}")
+        if conn: conn.rollback()
+        return jsonify({'error': 'Database error', 'details': str(err)}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}", exc_info=True)
+        if conn: conn.rollback()
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+    finally:
+        if cursor: cursor.close()
+
 """
     Stripe Webhook Handler
     ---
-    Listens for Stripe events. Creates Booking on successful payment
+    Listens for Stripe events. A verified successful payment is stored in WebhookInbox
+    and acknowledged at once, the booking is made by the inbox worker (see
+    webhook_inbox.py), which creates one Bookings row per seat for group payments and
+    pushes "booking_confirmed" to the payer over Socket.IO (see ride_events.py)
+    Each event is stored once, by its id, and applied once through ProcessedEvents.
+    Recently stored ids are also kept in memory (see processed_events.py)
     Frontend does not need to call this route
 """
 @payment_bp.route('/payment/webhook', methods=['POST'])
@@ -166,68 +291,39 @@ def stripe_webhook():
     except Exception as e:
         return jsonify({'error': 'Webhook signature verification failed'}), 500
     
-    # Handle the event type
+    # Redeliveries this worker has already stored are answered without touching MySQL
+    if event.id in processed_events:
+        return jsonify({'received': True, 'duplicate': True}), 200
+
+    # Only successful payments create bookings, other events are acknowledged as they are
+    if event.type != 'payment_intent.succeeded':
+        return jsonify({'received': True}), 200
+
+    payment_intent = event.data.object # Extract the PaymentIntent object
+    if not payment_intent:
+        return jsonify({'error': 'Missing payment intent data'}), 400
+
+    metadata = payment_intent.metadata
+    if not metadata.get('ride_id') or not metadata.get('user_id'):
+        return jsonify({'error': 'Missing metadata'}), 400
+
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        ride_id = None
-        user_id = None
-
-        payment_intent = None
-        if event.type.startswith('payment_intent'):
-            payment_intent = event.data.object # Extract the PaymentIntent object
-        
-        if event.type == 'payment_intent.succeeded':
-            if not payment_intent: 
-                return jsonify({'error': 'Missing payment intent data'}), 400
-            
-            pi_id = payment_intent.id
-            metadata = payment_intent.metadata
-            
-            ride_id = metadata.get('ride_id')
-            user_id = metadata.get('user_id')
-        
-            if not ride_id or not user_id:
-                return jsonify({'error': 'Missing metadata'}), 400
-
-        cursor.execute(
-            "SELECT ride_id FROM Bookings WHERE ride_id = %s AND user_id = %s",
-            (ride_id, user_id)
-        )
-        existing_booking = cursor.fetchone()
-        
-        if not existing_booking:
-            # Create the booking record NOW
-            try:
-                booking_time = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
-                cursor.execute(
-                    """
-                    INSERT INTO Bookings (ride_id, user_id, ride_date)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (ride_id, user_id, booking_time)
-                )
-                conn.commit()
-                
-            except mysql.connector.IntegrityError as ie:
-                # Likely a race condition with concurrent webhook deliveries
-                conn.rollback() # This could be problematic - tmp solution
-            except mysql.connector.Error as db_err:
-                conn.rollback()
-                return jsonify({'error': 'Database error creating booking'}), 500
-        else:
-            logger.info(f"Webhook: Booking for ride {ride_id}, user {user_id} already exists.")
-            
-    except mysql.connector.Error as db_err:
+        # One indexed insert, the booking itself is made by the inbox worker
+        enqueue_event(cursor, event.id, event.type, payload.decode('utf-8'))
+        conn.commit()
+        processed_events.add(event.id)
+    except mysql.connector.Error:
         if conn: 
             conn.rollback()
-        print(f"MySQL db error for Webhook: {db_err}")
+        logger.exception("Database error storing webhook event %s", event.id)
         return jsonify({'error': 'Database error processing webhook'}), 500
-    except Exception as e:
+    except Exception:
         if conn: conn.rollback()
-        print(f"Exception 2 caught for Webhook: {e}")
+        logger.exception("Unexpected error storing webhook event %s", event.id)
         return jsonify({'error': 'Internal server error processing webhook'}), 500
     finally:
         if cursor: cursor.close()
@@ -0,0 +1,140 @@
+import math
+
+# Constants & Setups
+
+# Web Mercator ground resolution at the equator for zoom 0 (metres per pixel)
+METRES_PER_PIXEL_Z0 = 156543.03392
+METRES_PER_DEGREE = 111320
+MIN_ZOOM = 0
+MAX_ZOOM = 21
+
+"""
+    Decodes a Google encoded polyline into a list of (lat, lng) tuples.
+    Raises ValueError on a truncated polyline or a character outside the encoding.
+"""
+def decode(encoded, precision=5):
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated polyline")
+                byte = ord(encoded[index]) - 63
+                if not 0 <= byte < 64:
+                    raise ValueError(f"Invalid polyline character at {index}")
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+def _encode_value(value, chunks):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+"""
+    Encodes (lat, lng) tuples as a Google encoded polyline.
+"""
+def encode(points, precision=5):
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat, lng = int(round(lat * factor)), int(round(lng * factor))
+        _encode_value(lat - prev_lat, chunks)
+        _encode_value(lng - prev_lng, chunks)
+        prev_lat, prev_lng = lat, lng
+    return ''.join(chunks)
+
+"""
+    Tolerance for a map zoom level: the ground size of one screen pixel, so the
+    simplified line stays within about a pixel of the full one.
+"""
+def zoom_tolerance(zoom, latitude):
+    zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+    return METRES_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+"""
+    Douglas-Peucker simplification of (lat, lng) points.
+    ---
+    Points are projected to local metres (equirectangular around the first point),
+    which is accurate enough at city scale. Points closer than `tolerance` to the last
+    kept point are dropped first in one linear pass, which leaves far less work for
+    Douglas-Peucker on dense GPS traces. Iterative, so long routes cannot hit the
+    recursion limit. The first and last points are always kept.
+
+    Parameters:
+        points (list): (lat, lng) tuples
+        tolerance (float): largest allowed distance from the simplified line, in metres
+    Returns:
+        list: the kept points, in order
+"""
+def simplify(points, tolerance):
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+
+    scale_x = METRES_PER_DEGREE * math.cos(math.radians(points[0][0]))
+    tolerance_sq = tolerance * tolerance
+
+    # Radial distance pre-pass
+    kept_points = [points[0]]
+    xy = [(points[0][1] * scale_x, points[0][0] * METRES_PER_DEGREE)]
+    for lat, lng in points[1:-1]:
+        x, y = lng * scale_x, lat * METRES_PER_DEGREE
+        if (x - xy[-1][0]) ** 2 + (y - xy[-1][1]) ** 2 > tolerance_sq:
+            kept_points.append((lat, lng))
+            xy.append((x, y))
+    kept_points.append(points[-1])
+    xy.append((points[-1][1] * scale_x, points[-1][0] * METRES_PER_DEGREE))
+    points = kept_points
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xy[first]
+        bx, by = xy[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+
+        max_dist_sq = -1
+        index = first
+        if length_sq == 0:
+            for i in range(first + 1, last):
+                px, py = xy[i]
+                dist_sq = (px - ax) ** 2 + (py - ay) ** 2
+                if dist_sq > max_dist_sq:
+                    max_dist_sq, index = dist_sq, i
+        else:
+            # Perpendicular distance to the line through a and b, squared and scaled by
+            # length_sq so the division happens once per segment
+            max_cross_sq = -1
+            for i in range(first + 1, last):
+                px, py = xy[i]
+                cross = (px - ax) * dy - (py - ay) * dx
+                cross_sq = cross * cross
+                if cross_sq > max_cross_sq:
+                    max_cross_sq, index = cross_sq, i
+            max_dist_sq = max_cross_sq / length_sq
+
+        if max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
@@ -0,0 +1,100 @@
+from flask import g
+from dotenv import load_dotenv
+import mysql.connector
+import os
+from ttl_cache import TTLCache
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+# How long a driver's principal is reused before Drivers is read again (seconds).
+# Changes made through this worker invalidate it at once, other workers can see the
+# previous assigned_vehicle for up to this long. Writes that must reach the current
+# vehicle read it from Drivers themselves (see driver.updateLocation). 0 disables the cache.
+PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', 30))
+
+"""
+    Who is making the request, loaded once by the role decorators.
+    ---
+    identity (int): user_id or driver_id from the JWT
+    is_admin, is_driver (bool): the role claims
+    assigned_vehicle (int | None): the driver's vehicle, None for users and admins
+"""
+class Principal:
+    __slots__ = ('identity', 'is_admin', 'is_driver', 'assigned_vehicle')
+
+    def __init__(self, identity, is_admin, is_driver, assigned_vehicle=None):
+        self.identity = identity
+        self.is_admin = is_admin
+        self.is_driver = is_driver
+        self.assigned_vehicle = assigned_vehicle
+
+# Driver principals keyed by driver_id as a string (the JWT identity). Missing drivers
+# are not cached, so a newly registered driver is seen immediately
+driver_principals = TTLCache(PRINCIPAL_CACHE_TTL)
+
+# The request's connection on g.db, shared with the route and closed at teardown
+# (see auth.close_db_connection), so a cache miss costs no extra connect. Also used by
+# profile_cache.py
+def request_connection():
+    if 'db' not in g:
+        g.db = mysql.connector.connect(**CONFIG)
+    return g.db
+
+def _load_driver(driver_id):
+    cursor = request_connection().cursor()
+    try:
+        cursor.execute("SELECT assigned_vehicle FROM Drivers WHERE driver_id = %s", (driver_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        return None
+    return Principal(driver_id, False, True, row[0])
+
+"""
+    Builds the principal for the current request from the JWT claims and stores it on g.
+    ---
+    Users and admins are described fully by their claims. Drivers also need
+    assigned_vehicle, which comes from driver_principals or a single Drivers lookup on
+    the request's connection. A cached assigned_vehicle can be up to
+    PRINCIPAL_CACHE_TTL seconds old when the vehicle was changed through another worker.
+
+    Returns:
+        Principal, or None if the driver no longer exists
+    Raises:
+        mysql.connector.Error: if a driver lookup fails
+"""
+def load_principal(identity, claims):
+    if not claims["is_driver"]:
+        principal = Principal(identity, claims["is_admin"], False)
+    else:
+        principal = driver_principals.get(str(identity))
+        if principal is None:
+            principal = _load_driver(identity)
+            if principal is not None:
+                driver_principals.set(str(identity), principal)
+    g.principal = principal
+    return principal
+
+"""
+    The principal loaded by the role decorator for this request, None if the route
+    is not behind one or the driver no longer exists.
+"""
+def current_principal():
+    return g.get('principal')
+
+"""
+    Drops a driver's cached principal, called whenever their Drivers row changes.
+"""
+def invalidate_driver(driver_id):
+    driver_principals.invalidate(str(driver_id))
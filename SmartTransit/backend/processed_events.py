@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+import os
+import threading
+
+load_dotenv()
+
+# Constants & Setups
+
+# Stripe event ids remembered per worker, enough to cover Stripe's retries of recent events
+PROCESSED_EVENTS_CACHE_SIZE = int(os.getenv('PROCESSED_EVENTS_CACHE_SIZE', 10000))
+
+"""
+    LRU of webhook event ids this worker has stored in WebhookInbox or applied.
+    ---
+    Only a fast path: a hit answers a redelivery without touching MySQL, a miss falls
+    through to the WebhookInbox and ProcessedEvents tables, the source of truth across
+    workers (see webhook_inbox.py).
+"""
+class ProcessedEventCache:
+    def __init__(self, max_entries=PROCESSED_EVENTS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def __contains__(self, event_id):
+        with self.lock:
+            if event_id not in self.entries:
+                return False
+            self.entries.move_to_end(event_id)
+            return True
+
+    def add(self, event_id):
+        with self.lock:
+            self.entries[event_id] = True
+            self.entries.move_to_end(event_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+processed_events = ProcessedEventCache()
+
+"""
+    Claims a webhook event inside the caller's transaction.
+    ---
+    INSERT IGNORE on the ProcessedEvents primary key, so the event's effects and its
+    record commit or roll back together. A concurrent claim of the same event waits
+    on the key until the first one commits (and then sees a duplicate) or rolls back
+    (and then claims it), so an event is applied exactly once.
+
+    Returns:
+        bool: True if this transaction claimed the event, False if it was already applied
+"""
+def claim_event(cursor, event_id, event_type):
+    cursor.execute(
+        "INSERT IGNORE INTO ProcessedEvents (event_id, event_type) VALUES (%s, %s)",
+        (event_id, event_type)
+    )
+    return cursor.rowcount == 1
+
+"""
+    Claims a batch of webhook events inside the caller's transaction, see claim_event.
+    ---
+    The caller must hold the events' WebhookInbox rows locked, so no other transaction
+    claims them meanwhile: the ids already recorded are read with one query and the
+    rest recorded with one multi-row INSERT.
+
+    Parameters:
+        events (list): (event_id, event_type)
+    Returns:
+        set: ids of the events this transaction claimed
+"""
+def claim_events(cursor, events):
+    if len(events) == 1:
+        event_id, event_type = events[0]
+        return {event_id} if claim_event(cursor, event_id, event_type) else set()
+    placeholders = ', '.join(['%s'] * len(events))
+    cursor.execute(
+        f"SELECT event_id FROM ProcessedEvents WHERE event_id IN ({placeholders})",
+        [event_id for event_id, _ in events]
+    )
+    applied = {row[0] for row in cursor.fetchall()}
+    new_events = [(event_id, event_type) for event_id, event_type in events if event_id not in applied]
+    if new_events:
+        cursor.executemany("INSERT INTO ProcessedEvents (event_id, event_type) VALUES (%s, %s)", new_events)
+    return {event_id for event_id, _ in new_events}
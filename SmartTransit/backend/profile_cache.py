@@ -0,0 +1,69 @@
+from flask import jsonify, request
+from dotenv import load_dotenv
+import hashlib
+import json
+import os
+from ttl_cache import TTLCache
+from principal import request_connection
+
+load_dotenv()
+
+# Constants & Setups
+
+# How long a Users row is served from memory (seconds). Edits made through this worker
+# invalidate it at once, this bounds how long other workers can serve the old row.
+# 0 disables the cache.
+PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', 30))
+
+PROFILE_FIELDS = "user_id, name, email, age, phone_number, disability"
+
+# Users fields read by /auth/status, /auth/profile and /settings/profile, keyed by
+# user_id as a string (the JWT identity)
+profiles = TTLCache(PROFILE_CACHE_TTL)
+
+# A miss reads through the request's connection on g.db, like the driver lookup in
+# principal.py, so it costs no extra connect
+def _load_profile(user_id):
+    cursor = request_connection().cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT {PROFILE_FIELDS} FROM Users WHERE user_id = %s", (user_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+"""
+    Returns the current user's profile row, from the cache or a single Users lookup.
+
+    Returns:
+        dict: user_id, name, email, age, phone_number, disability, or None if not found
+    Raises:
+        mysql.connector.Error: if the lookup fails
+"""
+def get_profile(user_id):
+    profile = profiles.get(str(user_id))
+    if profile is None:
+        profile = _load_profile(user_id)
+        if profile is not None:
+            profiles.set(str(user_id), profile)
+    return profile
+
+"""
+    Builds a 200 response for `body` with an ETag over its content.
+    ---
+    A client that sends the ETag back in If-None-Match gets a 304 with no body.
+    Cache-Control: no-cache makes clients revalidate every time, so unchanged profiles
+    cost no body. The body comes from `profiles`, so an edit made through another
+    worker can take up to PROFILE_CACHE_TTL seconds to show.
+"""
+def etag_response(body):
+    response = jsonify(body)
+    encoded = json.dumps(body, sort_keys=True, default=str).encode('utf-8')
+    response.set_etag(hashlib.sha1(encoded).hexdigest())
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+"""
+    Drops a user's cached profile, called after every write to their Users row.
+"""
+def invalidate_profile(user_id):
+    profiles.invalidate(str(user_id))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import mysql.connector
+from dotenv import load_dotenv
+import logging
+import os, time
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+# Rows deleted per statement, small enough that each DELETE holds its locks only briefly
+PURGE_BATCH = int(os.getenv('PURGE_BATCH', 1000))
+# Pause between batches so logouts, password resets and bookings are never queued behind the purge
+PURGE_PAUSE = float(os.getenv('PURGE_PAUSE', 0.05))
+
+# Both tables are indexed on expires_at, so each batch is a range scan from the oldest row
+PURGE_TABLES = ['RevokedTokens', 'SmsTokens']
+# Shared rate limit buckets idle this long have refilled completely and carry no state
+RATE_LIMIT_IDLE_HOURS = 24
+# Stripe retries an event for up to 3 days, ids older than this will not come back
+PROCESSED_EVENT_RETENTION_DAYS = int(os.getenv('PROCESSED_EVENT_RETENTION_DAYS', 30))
+# Clients holding a catalogue version older than this get the full /location list again
+LOCATION_CHANGE_RETENTION_DAYS = int(os.getenv('LOCATION_CHANGE_RETENTION_DAYS', 7))
+
+logger = logging.getLogger(__name__)
+
+def get_db_connection():
+    return mysql.connector.connect(**CONFIG)
+
+"""
+    Retention purge
+    ---
+    Deletes rows that are no longer needed, table by table, in batches of PURGE_BATCH,
+    committing after each batch:
+    - RevokedTokens and SmsTokens past expires_at: an expired JWT is rejected on its exp
+      claim alone and an expired SMS token fails reset_password
+    - RateLimitBuckets idle for RATE_LIMIT_IDLE_HOURS, which have refilled completely
+    - ProcessedEvents older than PROCESSED_EVENT_RETENTION_DAYS
+    - LocationChanges older than LOCATION_CHANGE_RETENTION_DAYS, keeping the newest row,
+      which is the catalogue version
+    A database error on one table is logged and rolled back, and the purge moves on to
+    the next table.
+
+    Returns:
+        dict: rows removed per table, the tables that failed and elapsed seconds
+"""
+def purge_expired_rows():
+    started = time.perf_counter()
+    batches = [
+        (table, f"DELETE FROM {table} WHERE expires_at < NOW() ORDER BY expires_at LIMIT %s")
+        for table in PURGE_TABLES
+    ]
+    batches.append((
+        'RateLimitBuckets',
+        f"DELETE FROM RateLimitBuckets WHERE updated_at < NOW() - INTERVAL {RATE_LIMIT_IDLE_HOURS} HOUR "
+        "ORDER BY updated_at LIMIT %s"
+    ))
+    batches.append((
+        'ProcessedEvents',
+        f"DELETE FROM ProcessedEvents WHERE processed_at < NOW() - INTERVAL {PROCESSED_EVENT_RETENTION_DAYS} DAY "
+        "ORDER BY processed_at LIMIT %s"
+    ))
+    batches.append((
+        'LocationChanges',
+        f"DELETE FROM LocationChanges WHERE changed_at < NOW() - INTERVAL {LOCATION_CHANGE_RETENTION_DAYS} DAY "
+        "AND change_seq < (SELECT latest FROM (SELECT MAX(change_seq) AS latest FROM LocationChanges) newest) "
+        "ORDER BY change_seq LIMIT %s"
+    ))
+    # None until the table is purged, and left None if it fails
+    stats = {table: None for table, _ in batches}
+    conn = None
+    try:
+        conn = get_db_connection()
+        for table, query in batches:
+            stats[table] = purge_table(conn, table, query)
+    except mysql.connector.Error as err:
+        logger.error("Retention purge could not connect: %s", err)
+    finally:
+        if conn: conn.close()
+
+    stats['failed'] = [table for table, _ in batches if stats[table] is None]
+    for table in stats['failed']:
+        stats[table] = 0
+    stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+"""
+    Runs one table's DELETE ... LIMIT until a batch comes back short.
+    Returns the rows removed, or None if the table failed (rows from earlier batches
+    stay deleted).
+"""
+def purge_table(conn, table, query):
+    deleted = 0
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute(query, (PURGE_BATCH,))
+            batch = cursor.rowcount
+            conn.commit()
+            deleted += batch
+            if batch < PURGE_BATCH:
+                return deleted
+            time.sleep(PURGE_PAUSE)
+    except mysql.connector.Error as err:
+        conn.rollback()
+        logger.error("Purge of %s failed after %s rows: %s", table, deleted, err)
+        return None
+    finally:
+        cursor.close()
+
+# CLI: python purge.py runs one purge and prints the stats
+if __name__ == '__main__':
+    print(purge_expired_rows())
@@ -0,0 +1,221 @@
+from functools import wraps
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from dotenv import load_dotenv
+import mysql.connector
+import logging
+import math
+import os
+import threading
+import time
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+"""
+    Parses a limit written as "<burst>/<seconds>", e.g. "5/60" allows a burst of 5
+    attempts and refills at 5 per minute.
+    Returns (capacity, refill per second).
+"""
+def parse_limit(value):
+    burst, seconds = value.split('/')
+    return float(burst), float(burst) / float(seconds)
+
+# Per-scope limits, keyed by who is being limited: the client IP and the account
+RATE_LIMITS = {
+    # bcrypt on every attempt
+    'login': {
+        'ip': parse_limit(os.getenv('RATE_LIMIT_LOGIN_IP', '30/60')),
+        'account': parse_limit(os.getenv('RATE_LIMIT_LOGIN_ACCOUNT', '10/300')),
+    },
+    # An SNS message on every attempt
+    'sms': {
+        'ip': parse_limit(os.getenv('RATE_LIMIT_SMS_IP', '5/600')),
+        'account': parse_limit(os.getenv('RATE_LIMIT_SMS_ACCOUNT', '3/600')),
+    },
+}
+
+# 'memory' keeps buckets per worker, 'mysql' shares them across workers at the cost of DB round trips
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')
+# Memory store: full buckets are dropped once this many keys are tracked
+RATE_LIMIT_MAX_KEYS = 100000
+
+logger = logging.getLogger(__name__)
+
+"""
+    In-process token buckets.
+    ---
+    A bucket starts full at `capacity` tokens, refills at `rate` tokens per second and
+    every attempt takes one token. Buckets that have refilled completely carry no state,
+    so they are dropped when the map grows past RATE_LIMIT_MAX_KEYS.
+"""
+class MemoryBucketStore:
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    """
+        Takes one token from the bucket at `key`.
+        Returns (allowed, retry_after_seconds).
+    """
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))[:2]
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now, capacity, rate)
+                allowed, retry_after = True, 0
+            else:
+                self.buckets[key] = (tokens, now, capacity, rate)
+                allowed, retry_after = False, (1 - tokens) / rate
+            if len(self.buckets) > self.max_keys:
+                self._drop_full(now)
+        return allowed, retry_after
+
+    """
+        Blocks until a token can be taken from the bucket at `key`, for outbound calls
+        that should be spaced out rather than rejected. A rate of 0 or less never waits.
+    """
+    def wait(self, key, capacity, rate):
+        if rate <= 0:
+            return
+        while True:
+            allowed, retry_after = self.take(key, capacity, rate)
+            if allowed:
+                return
+            time.sleep(retry_after)
+
+    def _drop_full(self, now):
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[3] < bucket[2]
+        }
+
+"""
+    Token buckets shared by every worker through the RateLimitBuckets table.
+    ---
+    Each take is one short transaction that locks the bucket's row, then refills and
+    takes in Python: the upsert creates a full bucket or locks the existing row, and
+    concurrent attempts on the same key queue behind that lock, so two workers can
+    never both spend the last token. A rejected attempt takes nothing.
+    Rows idle for a day are removed by purge.py.
+"""
+class MySQLBucketStore:
+    def __init__(self):
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or not conn.is_connected():
+            conn = mysql.connector.connect(**CONFIG, autocommit=True)
+            self.local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate):
+        conn = self._connection()
+        cursor = conn.cursor()
+        try:
+            conn.start_transaction()
+            # Locks the row in both cases, the no-op update keeps an existing bucket as is
+            cursor.execute(
+                """
+                INSERT INTO RateLimitBuckets (bucket_key, tokens, updated_at)
+                VALUES (%s, %s, NOW(6))
+                ON DUPLICATE KEY UPDATE bucket_key = bucket_key
+                """, (key, capacity)
+            )
+            cursor.execute(
+                """
+                SELECT tokens, TIMESTAMPDIFF(MICROSECOND, updated_at, NOW(6))
+                FROM RateLimitBuckets
+                WHERE bucket_key = %s
+                FOR UPDATE
+                """, (key,)
+            )
+            tokens, elapsed = cursor.fetchone()
+            tokens = min(capacity, float(tokens) + elapsed / 1000000 * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            cursor.execute(
+                "UPDATE RateLimitBuckets SET tokens = %s, updated_at = NOW(6) WHERE bucket_key = %s",
+                (tokens, key)
+            )
+            conn.commit()
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        if allowed:
+            return True, 0
+        return False, (1 - tokens) / rate
+
+bucket_store = MySQLBucketStore() if RATE_LIMIT_STORE == 'mysql' else MemoryBucketStore()
+
+def set_bucket_store(store):
+    global bucket_store
+    bucket_store = store
+
+def _too_many(retry_after):
+    response = jsonify({'error': 'Too many attempts, please try again later'})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
+"""
+    Token-bucket limiting for credential endpoints.
+    ---
+    Checks the client IP bucket and the account bucket for `scope` before the route runs,
+    so over-quota attempts never reach the DB, bcrypt or SNS.
+
+    Parameters:
+        scope (str): key into RATE_LIMITS
+        account (str): 'email' to key the account bucket on the JSON body's email,
+                       'jwt' to key it on the authenticated identity
+    Returns:
+    - 429 Too Many Requests with Retry-After when either bucket is empty
+
+    Enabled unless the app sets RATE_LIMIT_ENABLED = False; apps with TESTING = True
+    default to disabled so test suites can log in freely.
+"""
+def rate_limited(scope, account='email'):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            if not current_app.config.get('RATE_LIMIT_ENABLED', not current_app.testing):
+                return fn(*args, **kwargs)
+
+            limits = RATE_LIMITS[scope]
+            keys = [('ip', f"{scope}:ip:{request.remote_addr}")]
+            if account == 'jwt':
+                keys.append(('account', f"{scope}:user:{get_jwt_identity()}"))
+            else:
+                data = request.get_json(silent=True) or {}
+                email = str(data.get('email') or '').strip().lower()
+                if email:
+                    keys.append(('account', f"{scope}:email:{email}"))
+
+            for kind, key in keys:
+                capacity, rate = limits[kind]
+                try:
+                    allowed, retry_after = bucket_store.take(key, capacity, rate)
+                except mysql.connector.Error as err:
+                    # A broken shared store should not lock everyone out
+                    logger.error("Rate limit store failed: %s", err)
+                    continue
+                if not allowed:
+                    return _too_many(retry_after)
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
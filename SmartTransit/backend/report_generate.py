@@ -39,9 +39,9 @@ def get_db_connection():
     - 200 OK: report: [{
             "ride_id": rideid,
             "number_passengers":  number of passengers,
-            "passengers": array of passenger userids [user_id],
-            "start_location": start location name,
-            "end_location": end location name,
+            "passengers": array of userids that booked the ride within the range [user_id],
+            "start_location": [start location name],
+            "end_location": [end location name],
             "ride_duration": time of journey from start to end location,
             "profit": profit from ride journey
             "ride_date": date of ride
@@ -87,8 +87,10 @@ def generate():
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        # The only Bookings read: rides have no date of their own. Passengers are collected
+        # from the same rows rather than looked up per ride
         query = """
-            SELECT DISTINCT ride_id, ride_date
+            SELECT ride_id, ride_date, user_id
             FROM Bookings
             WHERE ride_date BETWEEN %s AND %s
             ORDER BY ride_date ASC
@@ -98,76 +100,57 @@ def generate():
         end_datetime = f"{date_range[1]} 23:59:59.999999"
         
         cursor.execute(query, (start_datetime, end_datetime))
-        all_rides = cursor.fetchall()
+        all_rides = {} # (ride_id, ride_date) in date order, as SELECT DISTINCT gave them
+        passengers = {}
+        for rideid, ridedate, user_id in cursor.fetchall():
+            all_rides[(rideid, ridedate)] = None
+            passengers.setdefault(rideid, []).append(user_id)
 
         ride_details = []
-        
-        # Add necessary fields to each ride_details
-        for rideid, ridedate in all_rides:
-            cursor.execute(
-                """
-                SELECT count(*)
-                FROM Bookings
-                WHERE ride_id = %s
-                """, (rideid,)
-            )
-            headcount = cursor.fetchone()
-
-            cursor.execute(
-                """
-                SELECT user_id
-                FROM Bookings
-                WHERE ride_id = %s
-                """, (rideid,)
-            )
-            all_users = cursor.fetchall()
+        if not all_rides:
+            return jsonify({
+                "report": ride_details
+            }), 200
 
-            cursor.execute(
-                """
-                SELECT start_location, end_location, ride_duration, profit, environmental
-                FROM Rides
-                WHERE ride_id = %s
-                """, (rideid,)
-            )
-            ride_deets = cursor.fetchone()
+        # Every ride in the report with both stop names in one query, the passenger count
+        # is the Rides.passenger_count counter
+        ride_ids = list(passengers)
+        placeholders = ', '.join(['%s'] * len(ride_ids))
+        cursor.execute(
+            f"""
+            SELECT r.ride_id, s.location_name, e.location_name, r.ride_duration, r.profit,
+                   r.environmental, r.passenger_count
+            FROM Rides r
+            JOIN Locations s ON s.location_id = r.start_location
+            JOIN Locations e ON e.location_id = r.end_location
+            WHERE r.ride_id IN ({placeholders})
+            """, ride_ids
+        )
+        rides = {row[0]: row[1:] for row in cursor.fetchall()}
 
+        # Add necessary fields to each ride_details
+        for rideid, ridedate in all_rides:
+            ride_deets = rides.get(rideid)
             if not ride_deets:
                 continue
 
-            cursor.execute(
-                """
-                SELECT location_name
-                FROM Locations
-                WHERE location_id  = %s
-                """, (ride_deets[0],)
-            )
-            start_location = cursor.fetchone()
-
-            cursor.execute(
-                """
-                SELECT location_name
-                FROM Locations
-                WHERE location_id  = %s
-                """, (ride_deets[1],)
-            )
-            end_location = cursor.fetchone()
-
-            # Add into one JSON, then append to ride_details
+            # Add into one JSON, then append to ride_details. Stop names stay one-element
+            # arrays, the shape the report has always had
             ride_details.append({
                 "ride_id": rideid,
                 "ride_date": ridedate,
-                "number_passengers": headcount[0],
-                "passengers": [user[0] for user in all_users],
-                "start_location": start_location,
-                "end_location": end_location,
+                "number_passengers": ride_deets[5],
+                "passengers": passengers[rideid],
+                "start_location": [ride_deets[0]],
+                "end_location": [ride_deets[1]],
                 "ride_duration": ride_deets[2],
                 "profit": ride_deets[3],
                 "environmental": ride_deets[4]
             })
-            
-            return jsonify({
-                "report": ride_details 
-            }), 200
+
+        return jsonify({
+            "report": ride_details
+        }), 200
     except Exception as err:
         return jsonify({'error': 'Internal Error', 'details': str(err)}), 500
     finally:
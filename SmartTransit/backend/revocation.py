@@ -0,0 +1,355 @@
+import mysql.connector
+from dotenv import load_dotenv
+from abc import ABC, abstractmethod
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from jobs import start_periodic_job
+
+load_dotenv()
+
+# Constants & Setups
+
+# Sized so the filter stays under ~1% false positives up to this many live revocations
+REVOKED_BLOOM_CAPACITY = int(os.getenv('REVOKED_BLOOM_CAPACITY', 100000))
+REVOKED_BLOOM_ERROR_RATE = float(os.getenv('REVOKED_BLOOM_ERROR_RATE', 0.01))
+# How often expired JTIs are dropped and the filter rebuilt (seconds)
+REVOKED_PRUNE_INTERVAL = int(os.getenv('REVOKED_PRUNE_INTERVAL', 300))
+# How revocations reach other workers: 'mysql' (poll RevokedTokens.revoked_seq) or 'local'
+REVOCATION_BROADCASTER = os.getenv('REVOCATION_BROADCASTER', 'mysql')
+# Upper bound on how long another worker keeps accepting a revoked token (seconds)
+REVOCATION_POLL_SECONDS = float(os.getenv('REVOCATION_POLL_SECONDS', 2))
+REVOCATION_POLL_BATCH = 1000
+# revoked_seq is handed out at insert time, so a logout can commit after a later one was
+# already polled. Skipped seqs are looked up again until they show up, or for this long
+# (seconds) if they never do (rolled back inserts, auto_increment values burned by errors)
+REVOCATION_GAP_SECONDS = float(os.getenv('REVOCATION_GAP_SECONDS', 60))
+# Most skipped seqs remembered at once, more than this is logged and the oldest dropped
+REVOCATION_MAX_GAPS = 1000
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+logger = logging.getLogger(__name__)
+
+"""
+    Fixed-size Bloom filter over strings.
+    Uses double hashing on a single blake2b digest to derive the k bit positions.
+"""
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+"""
+    In-memory view of RevokedTokens for the JWT blocklist callback.
+    ---
+    Holds every unexpired revoked JTI with its expiry (epoch seconds) behind a Bloom filter.
+    - Filter says no: the token is not revoked, no DB round trip.
+    - Filter says maybe and the JTI is cached: revoked.
+    - Filter says maybe but the JTI is not cached (a false positive): confirmed against MySQL.
+    Expired JTIs are pruned every REVOKED_PRUNE_INTERVAL seconds and the filter is rebuilt,
+    since a Bloom filter cannot forget entries on its own.
+"""
+class RevokedTokenCache:
+    def __init__(self, capacity=REVOKED_BLOOM_CAPACITY, error_rate=REVOKED_BLOOM_ERROR_RATE,
+                 prune_interval=REVOKED_PRUNE_INTERVAL):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.prune_interval = prune_interval
+        self.lock = threading.Lock()
+        self.expiries = {}
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.loaded = False
+        self.last_prune = time.time()
+        # Highest RevokedTokens.revoked_seq applied so far
+        self.high_water = 0
+        # Seqs below high_water not seen yet: seq -> when they were first missed
+        self.gaps = {}
+        # Set after loading an empty table: high_water is then 0 while AUTO_INCREMENT
+        # has kept counting past purged rows, so the first seqs seen start the tracking
+        self.seq_floor_unknown = False
+
+    """
+        Loads every unexpired row of RevokedTokens. Called lazily on the first check.
+        The high-water mark is read first, so rows committed during the load are
+        simply applied again by the next poll. Seqs missing between the oldest loaded
+        row and the high-water mark are tracked as gaps, they may still commit.
+        An empty table says nothing about where revoked_seq stands (purge.py empties it
+        while AUTO_INCREMENT keeps counting), so gaps then start at the first seq polled.
+    """
+    def load(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COALESCE(MAX(revoked_seq), 0) FROM RevokedTokens")
+            high_water = cursor.fetchone()[0]
+            cursor.execute("SELECT jti, expires_at, revoked_seq FROM RevokedTokens WHERE expires_at > NOW()")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        with self.lock:
+            seqs = set()
+            for jti, expires_at, seq in rows:
+                self._add_locked(jti, expires_at.timestamp())
+                seqs.add(seq)
+            if seqs:
+                self._track_gaps_locked(seqs, min(seqs) - 1, high_water)
+            self.high_water = max(self.high_water, high_water)
+            self.seq_floor_unknown = self.high_water == 0
+            self.loaded = True
+        logger.info("Loaded %s revoked tokens into memory", len(rows))
+
+    """
+        Applies revocations committed by any worker since the last poll.
+        One indexed range scan on revoked_seq above the high-water mark, plus a lookup
+        of the seqs skipped so far, never a reload of the table.
+
+        Returns:
+            int: number of revocations applied
+    """
+    def poll(self, conn):
+        if not self.loaded:
+            self.load(conn)
+            return 0
+        applied = 0
+        cursor = conn.cursor()
+        try:
+            with self.lock:
+                gaps = sorted(self.gaps)
+            if gaps:
+                placeholders = ', '.join(['%s'] * len(gaps))
+                cursor.execute(
+                    f"SELECT jti, expires_at, revoked_seq FROM RevokedTokens WHERE revoked_seq IN ({placeholders})",
+                    gaps
+                )
+                rows = cursor.fetchall()
+                with self.lock:
+                    for jti, expires_at, seq in rows:
+                        self._add_locked(jti, expires_at.timestamp())
+                        self.gaps.pop(seq, None)
+                applied += len(rows)
+
+            while True:
+                cursor.execute(
+                    """
+                    SELECT jti, expires_at, revoked_seq
+                    FROM RevokedTokens
+                    WHERE revoked_seq > %s
+                    ORDER BY revoked_seq
+                    LIMIT %s
+                    """, (self.high_water, REVOCATION_POLL_BATCH)
+                )
+                rows = cursor.fetchall()
+                with self.lock:
+                    seqs = set()
+                    for jti, expires_at, seq in rows:
+                        self._add_locked(jti, expires_at.timestamp())
+                        seqs.add(seq)
+                    if seqs:
+                        after = min(seqs) - 1 if self.seq_floor_unknown else self.high_water
+                        self._track_gaps_locked(seqs, after, max(seqs))
+                        self.high_water = max(self.high_water, *seqs)
+                        self.seq_floor_unknown = False
+                applied += len(rows)
+                if len(rows) < REVOCATION_POLL_BATCH:
+                    break
+        finally:
+            cursor.close()
+        self._expire_gaps()
+        return applied
+
+    # Remembers the seqs in (after, up_to] that were not among the rows read, at most
+    # the REVOCATION_MAX_GAPS newest, so a jump in revoked_seq costs no long loop
+    def _track_gaps_locked(self, seqs, after, up_to):
+        now = time.time()
+        for seq in range(max(after, up_to - REVOCATION_MAX_GAPS) + 1, up_to + 1):
+            if seq not in seqs:
+                self.gaps.setdefault(seq, now)
+        if len(self.gaps) > REVOCATION_MAX_GAPS:
+            logger.warning("Tracking %s revoked_seq gaps, dropping the oldest", len(self.gaps))
+            for seq in sorted(self.gaps)[:len(self.gaps) - REVOCATION_MAX_GAPS]:
+                del self.gaps[seq]
+
+    def _expire_gaps(self):
+        cutoff = time.time() - REVOCATION_GAP_SECONDS
+        with self.lock:
+            self.gaps = {seq: missed_at for seq, missed_at in self.gaps.items() if missed_at > cutoff}
+
+    """
+        Records a revocation, e.g. straight after logout commits its RevokedTokens row.
+
+        Parameters:
+            jti (str): token id
+            expires_at (datetime | float): when the token expires anyway
+    """
+    def add(self, jti, expires_at):
+        if not isinstance(expires_at, (int, float)):
+            expires_at = expires_at.timestamp()
+        with self.lock:
+            self._add_locked(jti, expires_at)
+
+    def _add_locked(self, jti, expires_at):
+        if expires_at <= time.time():
+            return
+        self.expiries[jti] = expires_at
+        self.bloom.add(jti)
+
+    def prune(self):
+        now = time.time()
+        with self.lock:
+            self.expiries = {jti: exp for jti, exp in self.expiries.items() if exp > now}
+            bloom = BloomFilter(max(self.capacity, len(self.expiries) * 2), self.error_rate)
+            for jti in self.expiries:
+                bloom.add(jti)
+            self.bloom = bloom
+            self.last_prune = now
+
+    """
+        Checks whether a JTI is revoked.
+
+        Parameters:
+            jti (str): token id from the JWT payload
+            get_db_connection (callable): returns a MySQL connection, only used on first load
+                                          and to confirm Bloom filter false positives
+        Returns:
+            bool: True if revoked, True as well if the DB cannot be reached when it is needed
+    """
+    def is_revoked(self, jti, get_db_connection):
+        try:
+            if not self.loaded:
+                self.load(get_db_connection())
+            if time.time() - self.last_prune > self.prune_interval:
+                self.prune()
+
+            if jti not in self.bloom:
+                return False
+            expires_at = self.expiries.get(jti)
+            if expires_at is not None:
+                return expires_at > time.time()
+
+            # Possible false positive, ask MySQL
+            return self._confirm(jti, get_db_connection())
+        except (mysql.connector.Error, ConnectionError) as err:
+            logger.error("Revocation check failed: %s", err)
+            return True # Fail-safe for if DB check fails, assume token is revoked
+
+    def _confirm(self, jti, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT expires_at FROM RevokedTokens WHERE jti = %s", (jti,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        if row is None:
+            return False
+        self.add(jti, row[0])
+        return True
+
+"""
+    --- Revocation broadcast ---
+    Logout handlers call publish_revocation once their RevokedTokens row is committed.
+    A broadcaster decides how the other workers hear about it:
+    - MySQLPollBroadcaster (default): the committed row is the message, every worker
+      polls revoked_seq every REVOCATION_POLL_SECONDS.
+    - LocalBroadcaster: in-process fan-out to subscribers, for single-process servers and tests.
+    Other transports (e.g. Redis pub/sub) can subclass RevocationBroadcaster and be
+    installed with set_broadcaster.
+"""
+class RevocationBroadcaster(ABC):
+    @abstractmethod
+    def publish(self, jti, expires_at):
+        pass
+
+    @abstractmethod
+    def start(self, cache, socketio):
+        pass
+
+class MySQLPollBroadcaster(RevocationBroadcaster):
+    def __init__(self, interval=REVOCATION_POLL_SECONDS):
+        self.interval = interval
+        self.conn = None
+
+    def publish(self, jti, expires_at):
+        pass # The RevokedTokens insert already carries the next revoked_seq
+
+    def _connection(self):
+        if self.conn is None or not self.conn.is_connected():
+            # autocommit so every poll sees rows committed since the last one
+            self.conn = mysql.connector.connect(**CONFIG, autocommit=True)
+        return self.conn
+
+    def poll_once(self, cache):
+        try:
+            return cache.poll(self._connection())
+        except mysql.connector.Error as err:
+            logger.error("Revocation poll failed: %s", err)
+            self.conn = None
+            return 0
+
+    def start(self, cache, socketio):
+        return start_periodic_job(socketio, 'revocation_poll', lambda: self.poll_once(cache),
+                                  self.interval, log_results=False)
+
+class LocalBroadcaster(RevocationBroadcaster):
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def publish(self, jti, expires_at):
+        for callback in self.subscribers:
+            callback(jti, expires_at)
+
+    def start(self, cache, socketio):
+        self.subscribe(cache.add)
+        return None
+
+# Shared by the auth and driver blueprints
+revoked_tokens = RevokedTokenCache()
+broadcaster = LocalBroadcaster() if REVOCATION_BROADCASTER == 'local' else MySQLPollBroadcaster()
+
+def set_broadcaster(new_broadcaster):
+    global broadcaster
+    broadcaster = new_broadcaster
+
+"""
+    Starts delivering other workers' revocations into this worker's cache.
+    Called once from app.py.
+"""
+def start_revocation_listener(socketio):
+    return broadcaster.start(revoked_tokens, socketio)
+
+"""
+    Records a committed revocation locally and announces it to the other workers.
+
+    Parameters:
+        jti (str): token id
+        expires_at (datetime): expiry of the revoked token
+"""
+def publish_revocation(jti, expires_at):
+    revoked_tokens.add(jti, expires_at)
+    broadcaster.publish(jti, expires_at)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import mysql.connector
+from dotenv import load_dotenv
+import os, time
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+def get_db_connection():
+    return mysql.connector.connect(**CONFIG)
+
+"""
+    Rides.passenger_count is a denormalised copy of the number of Bookings rows for a ride.
+    It must be changed in the same transaction as the Bookings insert it mirrors, so this
+    takes the caller's cursor and never commits. Bookings are only ever removed together
+    with their ride (see location.deleteLocation), so there is no decrement.
+"""
+def increment_passenger_count(cursor, ride_id, amount=1):
+    cursor.execute(
+        "UPDATE Rides SET passenger_count = passenger_count + %s WHERE ride_id = %s",
+        (amount, ride_id)
+    )
+
+"""
+    Repair job for Rides.passenger_count
+    ---
+    Recomputes every ride's counter from Bookings in one set-based UPDATE and only
+    touches rows that have drifted.
+
+    Parameters:
+        conn (mysql connection): open connection, committed on success
+    Returns:
+        int: number of rides whose counter was corrected
+"""
+def repair_passenger_counts(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            UPDATE Rides r
+            LEFT JOIN (
+                SELECT ride_id, COUNT(*) AS booked
+                FROM Bookings
+                GROUP BY ride_id
+            ) b ON b.ride_id = r.ride_id
+            SET r.passenger_count = COALESCE(b.booked, 0)
+            WHERE r.passenger_count <> COALESCE(b.booked, 0)
+            """
+        )
+        repaired = cursor.rowcount
+        conn.commit()
+        return repaired
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+"""
+    CLI: python ride_counts.py
+    (databases created before the column existed get it from database/database_setup.py)
+"""
+def main():
+    conn = get_db_connection()
+    try:
+        start = time.perf_counter()
+        repaired = repair_passenger_counts(conn)
+        print(f"Repaired passenger_count on {repaired} rides in {time.perf_counter() - start:.3f}s")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+from flask import current_app, request
+from flask_jwt_extended import decode_token, get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_socketio import ConnectionRefusedError, join_room
+from jwt.exceptions import PyJWTError
+from dotenv import load_dotenv
+from auth import check_if_token_revoked
+import mysql.connector
+import logging
+import os
+import time
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+logger = logging.getLogger(__name__)
+# Token claims of each connected socket by sid, checked once at connect
+connections = {}
+
+def get_db_connection():
+    return mysql.connector.connect(**CONFIG)
+
+def ride_room(ride_id):
+    return f"ride:{ride_id}"
+
+def user_room(user_id):
+    return f"user:{user_id}"
+
+def _emit(event, data, room):
+    # Blueprint tests run on a plain Flask app without SocketIO, nothing to emit to there
+    socketio = current_app.extensions.get('socketio')
+    if socketio is None:
+        return
+    try:
+        socketio.emit(event, data, to=room)
+    except Exception:
+        # A push is best effort, the change itself is already committed
+        logger.exception("Could not emit %s to %s", event, room)
+
+"""
+    Tells everyone in a ride's room that its status changed.
+    Event "ride_status": { ride_id, status: 'I' | 'A' | 'C', ...fields }
+"""
+def emit_ride_status(ride_id, status, **fields):
+    _emit('ride_status', {'ride_id': int(ride_id), 'status': status, **fields}, ride_room(ride_id))
+
+"""
+    Tells the payer, and the ride's room, that a paid booking was created.
+    Event "booking_confirmed": { ride_id, seats }. The payer's app then joins the ride's
+    room with "join_ride" to follow its status.
+"""
+def emit_booking_confirmed(user_id, ride_id, seats=1):
+    data = {'ride_id': int(ride_id), 'seats': int(seats)}
+    _emit('booking_confirmed', data, user_room(user_id))
+    _emit('booking_confirmed', data, ride_room(ride_id))
+
+"""
+    Claims of the connecting client's access token.
+    ---
+    Read from the JWT cookie (or Authorization header) of the Socket.IO handshake, or
+    from the handshake's auth payload { token } for clients that cannot send cookies.
+    Revoked tokens are refused like they are on HTTP routes.
+    Raises ConnectionRefusedError if there is no valid access token.
+"""
+def _authenticate(auth):
+    try:
+        token = auth.get('token') if isinstance(auth, dict) else None
+        if token:
+            claims = decode_token(token)
+            if claims.get('type') != 'access' or check_if_token_revoked(None, claims):
+                raise ConnectionRefusedError('unauthorized')
+            return claims
+        verify_jwt_in_request()
+        return get_jwt()
+    except (JWTExtendedException, PyJWTError):
+        raise ConnectionRefusedError('unauthorized')
+
+"""
+    Rides the client may follow: admins any, drivers the rides they operate, users the
+    rides they booked. With no ride_id, every ride of theirs that is not complete.
+"""
+def _allowed_rides(cursor, claims, ride_id=None):
+    identity = claims['sub']
+    if claims.get('is_admin') and not claims.get('is_driver'):
+        if ride_id is None:
+            return []
+        cursor.execute("SELECT ride_id FROM Rides WHERE ride_id = %s", (ride_id,))
+    elif claims.get('is_driver'):
+        query = "SELECT o.ride_id FROM Operates o JOIN Rides r ON r.ride_id = o.ride_id WHERE o.driver_id = %s"
+        params = [identity]
+        if ride_id is None:
+            query += " AND r.ride_status IN ('I', 'A')"
+        else:
+            query += " AND o.ride_id = %s"
+            params.append(ride_id)
+        cursor.execute(query, params)
+    else:
+        query = "SELECT DISTINCT b.ride_id FROM Bookings b JOIN Rides r ON r.ride_id = b.ride_id WHERE b.user_id = %s"
+        params = [identity]
+        if ride_id is None:
+            query += " AND r.ride_status IN ('I', 'A')"
+        else:
+            query += " AND b.ride_id = %s"
+            params.append(ride_id)
+        cursor.execute(query, params)
+    return [row[0] for row in cursor.fetchall()]
+
+"""
+    Registers the Socket.IO handlers for ride status pushes.
+    ---
+    connect: refused without a valid access token. The client joins its own user room
+             and the rooms of its rides that are not complete, so the app gets
+             "ride_status" events without asking.
+    join_ride { ride_id }: joins one more ride's room, only for a ride the client may
+             follow and while the token it connected with is unexpired.
+             Acknowledged with { ride_id, status } or { error }.
+"""
+def register_ride_events(socketio):
+    @socketio.on('connect')
+    def connect(auth=None):
+        claims = _authenticate(auth)
+        connections[request.sid] = claims
+        if not claims.get('is_driver') and not claims.get('is_admin'):
+            join_room(user_room(claims['sub']))
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            for ride_id in _allowed_rides(cursor, claims):
+                join_room(ride_room(ride_id))
+        except mysql.connector.Error as err:
+            # Still connected, the app can join its rides with join_ride
+            logger.error("Could not load rides for a socket connection: %s", err)
+        finally:
+            if cursor: cursor.close()
+            if conn: conn.close()
+
+    @socketio.on('disconnect')
+    def disconnect(reason=None):
+        connections.pop(request.sid, None)
+
+    @socketio.on('join_ride')
+    def join_ride(data):
+        claims = connections.get(request.sid)
+        if claims is None or claims['exp'] <= time.time():
+            return {'error': 'Unauthorized'}
+        ride_id = data.get('ride_id') if isinstance(data, dict) else None
+        if not str(ride_id).isdigit():
+            return {'error': 'Missing ride_id'}
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            if not _allowed_rides(cursor, claims, int(ride_id)):
+                return {'error': 'Ride not found'}
+            cursor.execute("SELECT ride_status FROM Rides WHERE ride_id = %s", (ride_id,))
+            status = cursor.fetchone()[0]
+        except mysql.connector.Error as err:
+            return {'error': 'Database error', 'details': str(err)}
+        finally:
+            if cursor: cursor.close()
+            if conn: conn.close()
+
+        join_room(ride_room(ride_id))
+        # The current status, so the app never needs to poll for it
+        return {'ride_id': int(ride_id), 'status': status}
@@ -10,6 +10,10 @@ load_dotenv()
 import heapq
 import boto3
 from custom_decorator import driver_only
+from principal import current_principal
+from directions import normalise_point
+from singleflight import SingleFlight
+from ride_events import emit_ride_status
 
 # Constants & Setups
 
@@ -22,6 +26,7 @@ CONFIG = {
 }
 
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
+TRAVEL_TIME_TIMEOUT = 10
 
 SET_PROFIT_CONSTANT = 30
 SET_COST_CONSTANT = 2
@@ -31,6 +36,8 @@ CARBON_PER_PER_MINUTE_CAR = 2.83
 
 route_op_bp = Blueprint('route_optimisation', __name__)
 bcrypt = Bcrypt()
+# Concurrent travel time lookups for the same pair of points, see get_travel_time
+travel_time_flights = SingleFlight()
 
 def get_db_connection():
     return mysql.connector.connect(**CONFIG)
@@ -39,6 +46,7 @@ def get_travel_time(origin, destination):
     """
     Calls the Google Maps Directions API to get the travel time (in minutes)
     from the origin to the destination.
+    Concurrent calls for the same pair wait for one API call instead of making their own.
     
     Parameters:
         origin (dict): Dictionary with keys "lat" and "lng" for the starting point.
@@ -47,12 +55,16 @@ def get_travel_time(origin, destination):
     Returns:
         float: Travel time in minutes, or None if not available.
     """
-    try:
-        if not origin or not destination:
-            return None
-        if not origin.get("lat") or not origin.get("lng") or not destination.get("lat") or not destination.get("lng"):
-            return None
+    if not origin or not destination:
+        return None
+    if not origin.get("lat") or not origin.get("lng") or not destination.get("lat") or not destination.get("lng"):
+        return None
+
+    key = (normalise_point(f"{origin['lat']},{origin['lng']}"), normalise_point(f"{destination['lat']},{destination['lng']}"))
+    return travel_time_flights.do(key, fetch_travel_time, origin, destination)
 
+def fetch_travel_time(origin, destination):
+    try:
         base_url = "https://maps.googleapis.com/maps/api/directions/json"
         params = {
             "origin": f"{origin['lat']},{origin['lng']}",
@@ -60,7 +72,8 @@ def get_travel_time(origin, destination):
             "key": GOOGLE_MAPS_API_KEY
         }
 
-        response = requests.get(base_url, params=params)
+        # Callers sharing this request all wait on it, so it must not hang
+        response = requests.get(base_url, params=params, timeout=TRAVEL_TIME_TIMEOUT)
         data = response.json()
         if data["status"] == "OK" and data["routes"]:
             duration_sec = data["routes"][0]["legs"][0]["duration"]["value"]
@@ -122,24 +135,16 @@ def startRoute():
             'error': 'Missing driver id'
         }), 400
 
+    # 401, driver not in db (the principal is loaded by @driver_only)
+    principal = current_principal()
+    if principal is None:
+        return jsonify({
+                'error': 'Driver not in dB'
+            }), 401
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        # 401, driver not in db
-
-        cursor.execute(
-            """
-            SELECT driver_id
-            FROM Drivers
-            WHERE driver_id = %s
-            """, (d_id,)
-        )
-
-        check_did = cursor.fetchone()
-        if check_did is None:
-            return jsonify({
-                    'error': 'Driver not in dB'
-                }), 401
 
         # 403, driver on route and cannot request to start another
         cursor.execute(
@@ -174,25 +179,23 @@ def startRoute():
     # 6) Make the chosen ride active and return the 
     # details of the ride and passengers
     try:
-        cursor.execute(
-            """
-            SELECT assigned_vehicle
-            FROM Drivers
-            WHERE driver_id = %s
-            """, (d_id, )
-        )
-
-        vid = cursor.fetchone()[0]
+        vid = principal.assigned_vehicle
 
+        # Candidate rides with their waiting passenger counts and both stops in one query.
+        # passenger_count is maintained on booking insert, so scoring never reads Bookings.
         cursor.execute(
             """
-            SELECT *
-            FROM Rides
-            WHERE ride_status = 'I'
+            SELECT r.ride_id, r.passenger_count,
+                   ls.x_coordinate, ls.y_coordinate, ls.location_name,
+                   le.x_coordinate, le.y_coordinate, le.location_name
+            FROM Rides r
+            JOIN Locations ls ON r.start_location = ls.location_id
+            JOIN Locations le ON r.end_location = le.location_id
+            WHERE r.ride_status = 'I'
             """
         )
 
-        potential_rides = list([i[0] for i in cursor.fetchall()])
+        potential_rides = cursor.fetchall()
 
         if not potential_rides:
             return jsonify({
@@ -201,64 +204,11 @@ def startRoute():
 
         ride_details = []
 
-        for rideid in potential_rides:
-            cursor.execute(
-                """
-                SELECT user_id
-                FROM Bookings
-                WHERE ride_id = %s
-                """, (rideid, )
-            )
-
-            # List of user_ids
-            passengers = list(cursor.fetchall())
-            head_count = len(passengers)
-
-            cursor.execute(
-                """
-                SELECT start_location, end_location
-                FROM Rides
-                WHERE ride_id = %s
-                """, (rideid,)
-            )
-
-            start_end_loc = cursor.fetchone()
-            start_loc = start_end_loc[0]
-            end_loc = start_end_loc[1]
-
-            cursor.execute(
-                """
-                SELECT x_coordinate, y_coordinate, location_name 
-                FROM Locations 
-                WHERE location_id = %s
-                """, (start_loc,)
-            )
-
-            start_coords = cursor.fetchone()
-
-            # 0th entry x coord, 1st entry y coord
-            start_loc_xcoord = start_coords[0]
-            start_loc_ycoord = start_coords[1]
-            start_name = start_coords[2]
-
-            cursor.execute(
-                """
-                SELECT x_coordinate, y_coordinate, location_name 
-                FROM Locations 
-                WHERE location_id = %s
-                """, (end_loc,)
-            )
-
-            end_coords = cursor.fetchone()
-
-            end_loc_xcoord = end_coords[0]
-            end_loc_ycoord = end_coords[1]
-            end_name = end_coords[2]
-            
+        for (rideid, head_count, start_loc_xcoord, start_loc_ycoord, start_name,
+             end_loc_xcoord, end_loc_ycoord, end_name) in potential_rides:
             ride_details.append({
                 "ride_id": rideid,
                 "num_passengers": head_count,
-                "passengers": passengers,
                 "start_name": start_name,
                 "start_x_coordinate": start_loc_xcoord,
                 "start_y_coordinate": start_loc_ycoord,
@@ -266,7 +216,6 @@ def startRoute():
                 "end_x_coordinate": end_loc_xcoord,
                 "end_y_coordinate": end_loc_ycoord
             })
-    
 
         vehicle_x_coord = float(driver_lat)
         vehicle_y_coord = float(driver_lng)
@@ -312,6 +261,16 @@ def startRoute():
         route_chosen[0] = -1 * route_chosen[0]
         route_chosen_profit = route_chosen[0]
         route_chosen_details = route_chosen[1]
+
+        # Only the chosen ride needs its passenger list (for the response and SMS)
+        cursor.execute(
+            """
+            SELECT user_id
+            FROM Bookings
+            WHERE ride_id = %s
+            """, (route_chosen_details.get("ride_id"), )
+        )
+        route_chosen_details["passengers"] = list(cursor.fetchall())
         cursor.execute(
             """
             UPDATE Rides
@@ -330,6 +289,10 @@ def startRoute():
             """, (d_id, route_chosen_details.get("ride_id"))
         )
         conn.commit()
+        # Riders following the ride learn it started without polling /booking/view
+        emit_ride_status(route_chosen_details.get("ride_id"), 'A',
+                         time_veh_arrive=route_chosen_details.get("time_veh_arrive"),
+                         time_start_end=route_chosen_details.get("time_start_end"))
 
         sendSMSToUsers(route_chosen[1]["passengers"], cursor, route_chosen[1]["start_name"],
                        route_chosen[1]["end_name"], route_chosen[1]["time_start_end"],
@@ -349,7 +312,7 @@ def startRoute():
 """
     The driver presses end route when he's at the last stop
     -------------------------------------------------------
-    Update the rides to complete in the DB
+    Update the rides to complete in the DB and push the new status to the ride's room
 
     Parameters:
         ride_id: the route that the driver is taking
@@ -372,6 +335,7 @@ def endRoute():
             ('C', rideId)
         )
         conn.commit()
+        emit_ride_status(rideId, 'C')
         return jsonify(), 200
 
     except Exception as err:
@@ -4,6 +4,8 @@ from flask_bcrypt import Bcrypt
 import mysql.connector
 from dotenv import load_dotenv
 import os
+from hashing import hash_password, register_busy_handler
+from profile_cache import get_profile, etag_response, invalidate_profile
 
 # Constants & Setups
 
@@ -22,6 +24,7 @@ CONFIG = {
 }
 
 settings_bp = Blueprint('settings', __name__)
+register_busy_handler(settings_bp)
 bcrypt = Bcrypt()
 
 def get_db_connection():
@@ -41,6 +44,7 @@ def get_db_connection():
         password_hash: str,
         email: str
     }
+    - 304 Not Modified: If-None-Match matches the current ETag
     - 401 Unauthorized: Not logged in
     - 500 Internal Server Error: Database error
 """
@@ -50,25 +54,16 @@ def getUserInfo():
     userId = get_jwt_identity()
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Users WHERE user_id=%s", (userId,))
-        userInfo = cursor.fetchone()
+        # Served from the profile cache (see profile_cache.py)
+        userInfo = get_profile(userId)
         if not userInfo:
             return jsonify({'error': 'User not found'}), 404
-        return jsonify({
+        return etag_response({
             "name": userInfo["name"],
             "email": userInfo["email"]
-        }), 200
+        })
     except mysql.connector.Error as err:
-        conn.rollback()
-
         return jsonify({'error': 'Database error', 'details': str(err)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 """
     Edit profile information
@@ -98,7 +93,7 @@ def edit_profile():
     # Only change password if provided
     hashed_password = None
     if password:
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
 
     # Update each of the fields
     try:
@@ -117,6 +112,7 @@ def edit_profile():
 
         cursor.execute(query, tuple(params))
         conn.commit()
+        invalidate_profile(user_id)
 
         # Update the new profile details
         cursor.execute("SELECT name, email, age, phone_number, disability FROM Users WHERE user_id = %s", (user_id,))
@@ -0,0 +1,121 @@
+import heapq
+import math
+import threading
+
+# Constants & Setups
+
+EARTH_RADIUS_M = 6371008.8
+# Points per leaf, small leaves mean more Python-level recursion, large ones more distance checks
+LEAF_SIZE = 16
+
+def to_unit_vector(lat, lng):
+    lat, lng = math.radians(lat), math.radians(lng)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat))
+
+"""
+    Great-circle distance in metres for a straight-line (chord) distance between two
+    points on the unit sphere. Same result as the haversine formula.
+"""
+def chord_to_metres(chord):
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, chord / 2))
+
+"""
+    Great-circle distance in metres between two (lat, lng) points, by haversine.
+"""
+def haversine_metres(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+"""
+    KD-tree over stop coordinates for k-nearest queries.
+    ---
+    Stops are placed on the unit sphere as 3D vectors. The straight-line distance
+    between two vectors grows with the great-circle distance between the stops, so
+    the nearest stops by chord are the nearest by great-circle distance. That holds
+    everywhere, with no distortion near the poles or the antimeridian, and the
+    returned distances are converted back to metres exactly.
+
+    Parameters:
+        stops (list): (payload, lat, lng) tuples, payload is returned with each match
+"""
+class StopIndex:
+    def __init__(self, stops):
+        self.payloads = [stop[0] for stop in stops]
+        self.vectors = [to_unit_vector(stop[1], stop[2]) for stop in stops]
+        self.root = self._build(list(range(len(stops)))) if stops else None
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def _build(self, indices):
+        if len(indices) <= LEAF_SIZE:
+            return indices
+        vectors = self.vectors
+        # Split on the axis with the widest spread, at the median
+        spreads = []
+        for axis in range(3):
+            values = [vectors[i][axis] for i in indices]
+            spreads.append(max(values) - min(values))
+        axis = spreads.index(max(spreads))
+        indices.sort(key=lambda i: vectors[i][axis])
+        middle = len(indices) // 2
+        split = vectors[indices[middle]][axis]
+        return (axis, split, self._build(indices[:middle]), self._build(indices[middle:]))
+
+    """
+        The k stops nearest to (lat, lng).
+        Returns:
+            list: (payload, distance in metres) tuples, nearest first
+    """
+    def nearest(self, lat, lng, k=5):
+        if self.root is None or k <= 0:
+            return []
+        query = to_unit_vector(lat, lng)
+        qx, qy, qz = query
+        vectors = self.vectors
+        heap = [] # max-heap on squared chord, as (-chord_sq, index)
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                for i in node:
+                    x, y, z = vectors[i]
+                    chord_sq = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-chord_sq, i))
+                    elif chord_sq < -heap[0][0]:
+                        heapq.heapreplace(heap, (-chord_sq, i))
+                continue
+
+            axis, split, left, right = node
+            gap = query[axis] - split
+            near, far = (left, right) if gap < 0 else (right, left)
+            # Visit the far side only if it could hold something closer than the current kth
+            if len(heap) < k or gap * gap < -heap[0][0]:
+                stack.append(far)
+            stack.append(near)
+
+        found = sorted((-neg, i) for neg, i in heap)
+        return [(self.payloads[i], chord_to_metres(math.sqrt(chord_sq))) for chord_sq, i in found]
+
+"""
+    Keeps a StopIndex in step with a versioned source of stops.
+    The index is rebuilt on the first query after the version changes.
+"""
+class VersionedStopIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.index = StopIndex([])
+
+    def get(self, version, load_stops):
+        if version == self.version:
+            return self.index
+        with self.lock:
+            if version != self.version:
+                self.index = StopIndex(load_stops())
+                self.version = version
+            return self.index
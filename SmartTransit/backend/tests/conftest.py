@@ -0,0 +1,118 @@
+import hashlib
+import hmac
+import json
+import time
+import pytest
+from flask import Flask
+from backend import payment
+from backend.processed_events import ProcessedEventCache
+
+WEBHOOK_SECRET = 'whsec_test'
+
+################## HELPER CLASSES #####################
+
+# Stands in for a mysql connection: records every statement, with its whitespace
+# collapsed, and answers each one with respond(query, params): rows for a query, a
+# rowcount for a write. respond may raise mysql.connector.Error to fail the statement
+class FakeConnection:
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda query, params: [])
+        self.statements = []
+        self.committed = False
+        self.rolled_back = False
+
+    @property
+    def queries(self):
+        return [query for query, _ in self.statements]
+
+    # Rows come back as respond() returns them, dicts for a dictionary cursor
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, params=()):
+        query = ' '.join(query.split())
+        self.conn.statements.append((query, params))
+        result = self.conn.respond(query, params)
+        if isinstance(result, int):
+            self.rows, self.rowcount = [], result
+        else:
+            self.rows = list(result or [])
+            self.rowcount = len(self.rows)
+
+    def executemany(self, query, seq_params):
+        query = ' '.join(query.split())
+        seq_params = list(seq_params)
+        self.conn.statements.append((query, seq_params))
+        self.conn.respond(query, seq_params)
+        self.rows = []
+        self.rowcount = len(seq_params)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+############### FIXTURES ###############
+
+# FakeConnection itself, call it with a respond function
+@pytest.fixture
+def fake_db():
+    return FakeConnection
+
+# The payment blueprint with a known webhook secret and an empty processed events cache.
+# Tests patch payment.get_db_connection for what the webhook may do with MySQL
+@pytest.fixture
+def webhook_client(monkeypatch):
+    monkeypatch.setattr(payment, 'stripe_webhook_secret', WEBHOOK_SECRET)
+    monkeypatch.setattr(payment, 'processed_events', ProcessedEventCache())
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(payment.payment_bp)
+    return app.test_client()
+
+# Posts an event to /payment/webhook signed the way Stripe does
+@pytest.fixture
+def deliver_webhook():
+    def deliver(client, event):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+        return client.post('/payment/webhook', data=payload, content_type='application/json',
+                           headers={'Stripe-Signature': f"t={timestamp},v1={signature}"})
+    return deliver
+
+# Builds a Stripe event for a PaymentIntent booking ride 1 for user 2
+@pytest.fixture
+def payment_event():
+    def make(event_id, event_type='payment_intent.succeeded', **metadata):
+        return {
+            'id': event_id, 'object': 'event', 'type': event_type,
+            'data': {'object': {'id': 'pi_1', 'object': 'payment_intent',
+                                'metadata': {'ride_id': '1', 'user_id': '2', **metadata}}},
+        }
+    return make
@@ -321,4 +321,30 @@ def test_list_routes_success(client):
     response = client.get('/auth/admin/all_vehicles', headers=headers)
     assert response.status_code == 200
     assert isinstance(response.json['vehicles'], list)
-    assert any(v['licence_number'] == '87654321' for v in response.json['vehicles'])
\ No newline at end of file
+    assert any(v['licence_number'] == '87654321' for v in response.json['vehicles'])
+
+def test_list_drivers_paginated(client):
+    register_user(client, "admin", "user1@email.com", "password123")
+    headers = get_auth_headers(client, "user1@email.com", "password123")
+
+    for i in range(3):
+        client.post('/auth/admin/register_driver', headers=headers, json={
+            'name': f'Driver {i}',
+            'email': f'pagedriver{i}@example.com',
+            'password': 'Pass1234',
+            'age': 25,
+            'employee_type': 'C'
+        })
+
+    first = client.get('/auth/admin/all_drivers?limit=2', headers=headers)
+    assert first.status_code == 200
+    assert len(first.json['drivers']) == 2
+    assert first.json['next_cursor'] is not None
+
+    second = client.get(f"/auth/admin/all_drivers?limit=2&after={first.json['next_cursor']}", headers=headers)
+    assert second.status_code == 200
+    first_ids = {d['driver_id'] for d in first.json['drivers']}
+    assert all(d['driver_id'] not in first_ids for d in second.json['drivers'])
+
+    bad = client.get('/auth/admin/all_drivers?after=not-a-cursor', headers=headers)
+    assert bad.status_code == 400
@@ -5,6 +5,8 @@ from flask import Flask
 from flask_jwt_extended import JWTManager
 import mysql.connector
 from backend.auth import auth_bp, bcrypt, register_jwt_blocklist_loader, close_db_connection
+from backend import purge
+from backend.purge import purge_expired_rows
 
 try:
     # Assumes .env.test is in the parent directory of the 'tests' directory
@@ -158,6 +160,24 @@ def test_logout_success_and_token_revoked(client):
     # Check for the specific message that shows revocation
     assert 'Token has been revoked' in status_response.json.get('msg', status_response.json.get('message', ''))
 
+def test_refresh_rotates_tokens(client):
+    register_user(client, email='refresh@example.com', password='Password123')
+    login_res = login_user(client, email='refresh@example.com', password='Password123')
+    refresh_token = login_res.json['refresh_token']
+
+    # A refresh token issues a new pair without the password
+    response = client.post('/auth/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+    assert response.status_code == 200
+    new_headers = {'Authorization': f"Bearer {response.json['access_token']}"}
+    assert client.get('/auth/status', headers=new_headers).status_code == 200
+
+    # The old refresh token has been used up
+    reuse = client.post('/auth/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+    assert reuse.status_code == 401
+
+    # Access tokens cannot be used to refresh
+    assert client.post('/auth/refresh', headers=new_headers).status_code == 422
+
 def test_get_profile_success(client):
     register_user(client, name="Profile Tester", email="profile@example.com", password="TestPassword123")
     headers = get_auth_headers(client, email="profile@example.com", password="TestPassword123")
@@ -191,3 +211,37 @@ def test_verify_password(client):
     missing_response = client.post('/auth/verify_password', json={}, headers=headers)
     assert missing_response.status_code == 400
     assert "Password is required" in missing_response.json["error"]
+
+def test_purge_expired_rows():
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO RevokedTokens (jti, expires_at) VALUES ('expired-jti', NOW() - INTERVAL 1 HOUR)")
+        cursor.execute("INSERT INTO RevokedTokens (jti, expires_at) VALUES ('live-jti', NOW() + INTERVAL 1 HOUR)")
+        cursor.execute("INSERT INTO SmsTokens (email, token, expires_at) VALUES ('purge@example.com', '123456', NOW() - INTERVAL 1 HOUR)")
+        conn.commit()
+
+        stats = purge_expired_rows()
+        assert stats['RevokedTokens'] >= 1
+        assert stats['SmsTokens'] >= 1
+
+        cursor.execute("SELECT jti FROM RevokedTokens WHERE jti IN ('expired-jti', 'live-jti')")
+        assert cursor.fetchall() == [('live-jti',)]
+        cursor.execute("SELECT COUNT(*) FROM SmsTokens WHERE expires_at < NOW()")
+        assert cursor.fetchone()[0] == 0
+    finally:
+        cursor.close()
+        conn.close()
+
+def test_purge_moves_on_after_a_failing_table(fake_db, monkeypatch):
+    def respond(query, params):
+        if "FROM SmsTokens" in query:
+            raise mysql.connector.Error(msg='Lock wait timeout exceeded', errno=1205)
+        return 2
+    conn = fake_db(respond)
+    monkeypatch.setattr(purge, 'get_db_connection', lambda: conn)
+
+    stats = purge_expired_rows()
+    assert stats['failed'] == ['SmsTokens']
+    assert stats['RevokedTokens'] == stats['LocationChanges'] == 2
+    assert conn.rolled_back
@@ -4,7 +4,8 @@ from flask_jwt_extended import JWTManager
 import mysql.connector
 import os
 from backend.auth import auth_bp, bcrypt
-from backend.booking import booking_bp
+from backend.booking import booking_bp, open_ride
+import threading
 from datetime import datetime
 import json
 TEST_CONFIG = {
@@ -240,6 +241,43 @@ def test_booking_view_after_initiation(client):
     assert isinstance(response.json["bookings"], list)
     assert len(response.json["bookings"]) >= 1
 
+def test_booking_view_pages_every_seat_once(client):
+    register_user(client)
+    headers = get_auth_headers(client)
+    create_locations()
+    start_id, end_id = get_location_ids()
+
+    # A group booking of three seats and a single seat on another ride
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO Rides (start_location, end_location, ride_duration, ride_status) VALUES (%s, %s, 10, 'I')", (start_id, end_id))
+        group_ride = cursor.lastrowid
+        cursor.execute("INSERT INTO Rides (start_location, end_location, ride_duration, ride_status) VALUES (%s, %s, 10, 'C')", (start_id, end_id))
+        single_ride = cursor.lastrowid
+        booking_time = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.executemany("INSERT INTO Bookings (ride_id, user_id, ride_date) VALUES (%s, %s, %s)",
+                           [(group_ride, 2, booking_time)] * 3 + [(single_ride, 2, booking_time)])
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    seen = []
+    after = None
+    while True:
+        url = '/booking/view?limit=2' + (f'&after={after}' if after else '')
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        seen.extend(response.json["bookings"])
+        after = response.json["next_cursor"]
+        if after is None:
+            break
+
+    assert len(seen) == 4
+    assert len({booking["booking_id"] for booking in seen}) == 4
+    assert sorted(booking["ride_id"] for booking in seen) == sorted([group_ride] * 3 + [single_ride])
+
 def test_booking_initiate_unauthenticated(client):
     create_locations()
     start_id, end_id = get_location_ids()
@@ -252,3 +290,62 @@ def test_booking_initiate_unauthenticated(client):
     assert response.status_code == 401
     assert "error" in response.json or "msg" in response.json
 
+
+def test_booking_initiate_reuses_open_ride(client):
+    register_user(client)
+    headers = get_auth_headers(client)
+    create_locations()
+    start_id, end_id = get_location_ids()
+
+    # An open ride for the pair already exists, so no estimate is needed
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO Rides (start_location, end_location, ride_duration, ride_status) VALUES (%s, %s, 12.5, 'I')",
+            (start_id, end_id)
+        )
+        ride_id = cursor.lastrowid
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    response = client.post('/booking/initiate', json={
+        "start_location": start_id,
+        "end_location": end_id
+    }, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json["ride_id"] == ride_id
+    assert response.json["estimated_duration"] == 12.5
+
+def test_open_ride_is_shared_under_concurrency(client):
+    create_locations()
+    start_id, end_id = get_location_ids()
+
+    ride_ids = []
+    def book():
+        conn = mysql.connector.connect(**TEST_CONFIG)
+        try:
+            ride_ids.append(open_ride(conn, start_id, end_id, 10.0)[0])
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=book) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every request joined the same ride and only one is open for the pair
+    assert len(ride_ids) == 10 and len(set(ride_ids)) == 1
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM Rides WHERE start_location = %s AND end_location = %s AND ride_status = 'I'",
+                       (start_id, end_id))
+        assert cursor.fetchone()[0] == 1
+    finally:
+        cursor.close()
+        conn.close()
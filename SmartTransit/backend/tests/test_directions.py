@@ -0,0 +1,116 @@
+import threading
+import time
+import pytest
+from backend import directions
+from backend.directions import DirectionsCache, normalise_point
+from backend.singleflight import SingleFlight
+from backend import polylines
+import json
+
+################## HELPER CLASSES #####################
+
+# Stands in for the pooled requests.Session, counting upstream calls
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.content = body
+        self.status_code = status_code
+
+class FakeSession:
+    def __init__(self, body=b'{"status": "OK", "routes": []}', delay=0):
+        self.body = body
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return FakeResponse(self.body)
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setattr(directions, 'cache', DirectionsCache())
+    monkeypatch.setattr(directions, 'compact_cache', DirectionsCache())
+    monkeypatch.setattr(directions, 'flights', SingleFlight())
+    fake = FakeSession()
+    monkeypatch.setattr(directions, 'session', fake)
+    return fake
+
+def test_normalise_point():
+    assert normalise_point(' -33.868820123, 151.20929 ') == '-33.86882,151.20929'
+    assert normalise_point('Sydney   Opera House ') == 'sydney opera house'
+
+def test_repeated_requests_are_cached(upstream):
+    first = directions.get_directions('-33.8688,151.2093', 'Bondi Beach')
+    second = directions.get_directions('-33.868800001, 151.2093', ' bondi  beach')
+    assert first == second == (200, upstream.body)
+    assert upstream.calls == 1
+
+def test_errors_are_not_cached(upstream):
+    upstream.body = b'{"status": "OVER_QUERY_LIMIT"}'
+    directions.get_directions('A', 'B')
+    directions.get_directions('A', 'B')
+    assert upstream.calls == 2
+
+def test_concurrent_requests_collapse(upstream):
+    upstream.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(directions.get_directions('A', 'B'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8
+    assert upstream.calls == 1
+
+def test_polyline_round_trip():
+    # Example from Google's encoded polyline documentation
+    encoded = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    points = polylines.decode(encoded)
+    assert points == [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert polylines.encode(points) == encoded
+
+@pytest.mark.parametrize('encoded', ['_p~iF~ps|U_', '_p~iF', '_p~iF~ps|U\x01'])
+def test_polyline_decode_rejects_malformed_input(encoded):
+    with pytest.raises(ValueError):
+        polylines.decode(encoded)
+
+def test_simplify_keeps_shape_within_tolerance():
+    # A straight line with a single 50 m detour in the middle
+    points = [(-33.86, 151.20 + i * 0.0001) for i in range(100)]
+    points[50] = (-33.86 + 0.00045, points[50][1])
+    simplified = polylines.simplify(points, 5)
+    assert simplified[0] == points[0] and simplified[-1] == points[-1]
+    assert points[50] in simplified
+    assert len(simplified) < 10
+
+def test_compact_mode_keeps_rendered_fields(upstream):
+    line = [(-33.86 + i * 0.00001, 151.20 + i * 0.00001) for i in range(500)]
+    upstream.body = json.dumps({
+        'status': 'OK',
+        'routes': [{
+            'summary': 'M4',
+            'bounds': {},
+            'overview_polyline': {'points': polylines.encode(line[::10])},
+            'legs': [{
+                'distance': {'value': 1000}, 'duration': {'value': 120},
+                'steps': [{'html_instructions': 'Head <b>north</b>', 'polyline': {'points': polylines.encode(line)}}],
+            }],
+        }],
+    }).encode('utf-8')
+
+    status_code, body = directions.get_compact_directions('A', 'B', 14)
+    data = json.loads(body)
+    assert status_code == 200
+    assert len(body) < len(upstream.body)
+    assert data['routes'][0]['legs'] == [{'distance': {'value': 1000}, 'duration': {'value': 120}}]
+    # A straight line collapses to its end points
+    assert len(polylines.decode(data['routes'][0]['overview_polyline']['points'])) == 2
+
+def test_compact_mode_passes_malformed_polylines_through(upstream):
+    upstream.body = json.dumps({
+        'status': 'OK',
+        'routes': [{'overview_polyline': {'points': '_p~iF~ps|U_'}, 'legs': []}],
+    }).encode('utf-8')
+    assert directions.get_compact_directions('A', 'B', 14) == (200, upstream.body)
@@ -0,0 +1,56 @@
+from backend import fares
+from backend.fares import FareQuotes, bucket_for_hour, build_quotes, load_durations_from
+from backend.payment import calculate_ride_price
+
+# Rides from start 1 as (end_location, hour of the first booking, average minutes, rides)
+HISTORY = [
+    (2, 7, 30.0, 1),     # morning peak
+    (2, 8, 40.0, 3),     # morning peak
+    (2, None, 20.0, 1),  # open ride, no bookings yet
+    (5, None, 15.0, 2),
+]
+
+def test_bucket_for_hour():
+    assert [bucket_for_hour(hour) for hour in (0, 5, 6, 9, 10, 15, 18, 19, 23)] == [0, 0, 1, 1, 2, 3, 3, 4, 4]
+
+def test_durations_are_averaged_per_bucket_and_pair(fake_db):
+    cursor = fake_db(lambda query, params: HISTORY).cursor()
+    durations = load_durations_from(cursor, 1)
+    assert durations[2] == (34.0, {1: 37.5})
+    assert durations[5] == (15.0, {})
+
+def test_quotes_fill_buckets_without_rides_from_the_pair_average():
+    quotes = build_quotes({2: (34.0, {1: 37.5}), 5: (15.0, {})})
+    assert quotes[2][1] == calculate_ride_price(37.5)
+    assert quotes[2][0] == quotes[2][4] == calculate_ride_price(34.0)
+    assert quotes[5] == [calculate_ride_price(15.0)] * len(fares.FARE_BUCKETS)
+
+def test_rows_are_memoized_per_start(fake_db, monkeypatch):
+    connections = []
+    def connect():
+        connections.append(fake_db(lambda query, params: HISTORY))
+        return connections[-1]
+    monkeypatch.setattr(fares, 'get_db_connection', connect)
+    quotes = FareQuotes(ttl=60, size=1)
+
+    assert sorted(quotes.quotes_from(1)) == [2, 5]
+    quotes.quotes_from(1)
+    assert len(connections) == 1
+    # Only one row fits, reading start 3 evicts start 1
+    quotes.quotes_from(3)
+    quotes.quotes_from(1)
+    assert len(connections) == 3
+
+def test_pair_without_history_is_estimated_once(fake_db, monkeypatch):
+    monkeypatch.setattr(fares, 'get_db_connection', lambda: fake_db(lambda query, params: HISTORY))
+    estimates = []
+    def estimate(start, end):
+        estimates.append((start, end))
+        return 12.0
+    monkeypatch.setattr(fares, 'get_estimated_time', estimate)
+    quotes = FareQuotes(ttl=60)
+
+    assert quotes.quote(1, 2)[1] == calculate_ride_price(37.5)
+    assert quotes.quote(1, 9) == [calculate_ride_price(12.0)] * len(fares.FARE_BUCKETS)
+    quotes.quote(1, 9)
+    assert estimates == [(1, 9)]
@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from flask_bcrypt import Bcrypt
+from backend import hashing
+from backend.hashing import hash_password, check_password, HashPoolBusy
+
+def test_hash_and_check_round_trip():
+    pw_hash = hash_password('Password123', rounds=4)
+    assert check_password(pw_hash, 'Password123')
+    assert not check_password(pw_hash, 'WrongPass1')
+
+def test_hashes_compatible_with_flask_bcrypt():
+    # Existing rows were written by Flask-Bcrypt and must still verify
+    legacy = Bcrypt().generate_password_hash('Password123').decode('utf-8')
+    assert check_password(legacy, 'Password123')
+    assert Bcrypt().check_password_hash(hash_password('Password123', rounds=4), 'Password123')
+
+def test_malformed_hash_is_rejected():
+    assert not check_password('not-a-bcrypt-hash', 'Password123')
+
+def test_full_queue_raises_busy(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(hashing, '_slots', slots)
+    monkeypatch.setattr(hashing, 'HASH_POOL_SIZE', 1)
+    with pytest.raises(HashPoolBusy):
+        check_password('$2b$04$abcdefghijklmnopqrstuu', 'Password123')
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(monkeypatch):
+    # A thread pool stands in for the process pool so the job can be held open
+    release = threading.Event()
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(hashing, '_slots', slots)
+    monkeypatch.setattr(hashing, 'HASH_POOL_SIZE', 1)
+    monkeypatch.setattr(hashing, 'HASH_TIMEOUT', 0.05)
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hashing, '_pool', pool)
+
+    with pytest.raises(HashPoolBusy):
+        hashing._run(release.wait)
+    # Still running, so the next request is turned away instead of queueing behind it
+    with pytest.raises(HashPoolBusy):
+        hashing._run(release.wait)
+
+    release.set()
+    pool.shutdown(wait=True)
+    assert slots.acquire(blocking=False)
@@ -6,6 +6,8 @@ from flask_jwt_extended import JWTManager
 import mysql.connector
 from backend.auth import auth_bp, bcrypt
 from backend.location import location_bp
+from backend import location as location_module
+from backend import location_catalogue
 import json
 # Determine the path to .env.test
 env_path = os.path.join('..', '.env.test')
@@ -137,6 +139,44 @@ def test_location_delete(client):
     )
     assert response.status_code == 200
 
+def test_location_delete_cascades_in_batches(client, monkeypatch):
+    monkeypatch.setattr(location_module, 'LOCATION_DELETE_BATCH', 2)
+
+    # Register the admin and a rider
+    client.post('/auth/register', json={
+        'name': 'Admin User',
+        'email': 'admin@cascade.com',
+        'password': 'ValidPass123',
+        'phone_number': '+61400000004'
+    })
+    access_token = client.post('/auth/login', json={
+        'email': 'admin@cascade.com',
+        'password': 'ValidPass123'
+    }).json['access_token']
+
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("SELECT user_id FROM Users WHERE email = 'admin@cascade.com'")
+    user_id = cursor.fetchone()[0]
+    cursor.execute("INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES ('Busy Stop', 1.0, 1.0)")
+    busy_stop = cursor.lastrowid
+    cursor.execute("INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES ('Quiet Stop', 2.0, 2.0)")
+    quiet_stop = cursor.lastrowid
+    # Five rides through the busy stop with one booking each, one ride elsewhere
+    for start, end in [(busy_stop, quiet_stop)] * 3 + [(quiet_stop, busy_stop)] * 2 + [(quiet_stop, quiet_stop)]:
+        cursor.execute("INSERT INTO Rides (start_location, end_location, ride_status) VALUES (%s, %s, 'C')", (start, end))
+        cursor.execute("INSERT INTO Bookings (ride_id, user_id, ride_date) VALUES (%s, %s, NOW())", (cursor.lastrowid, user_id))
+    conn.commit()
+
+    response = client.delete(f'/location/{busy_stop}', headers={'Authorization': f'Bearer {access_token}'})
+    assert response.status_code == 200
+    assert response.json['deleted'] == {'locations': 1, 'rides': 5, 'bookings': 5, 'operates': 0}
+
+    cursor.execute("SELECT COUNT(*) FROM Rides WHERE start_location = %s OR end_location = %s", (quiet_stop, quiet_stop))
+    assert cursor.fetchone()[0] == 1
+    cursor.close()
+    conn.close()
+
 def test_location_add(client):
     conn = mysql.connector.connect(**TEST_CONFIG)
     cursor = conn.cursor(buffered=True)
@@ -224,6 +264,136 @@ def test_location_admin_only_access(client):
     )
     assert response.status_code == 200
 
+def test_location_catalogue_etag_and_delta(client):
+    # First user registered is the admin
+    client.post('/auth/register', json={
+        'name': 'Admin User',
+        'email': 'admin@catalogue.com',
+        'password': 'ValidPass123',
+        'phone_number': '+61400000002'
+    })
+    token = client.post('/auth/login', json={
+        'email': 'admin@catalogue.com',
+        'password': 'ValidPass123'
+    }).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/location', headers=headers)
+    assert first.status_code == 200
+    version = first.json['version']
+
+    # Unchanged catalogue: 304 with no body
+    cached = client.get('/location', headers={**headers, 'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+
+    created = client.post('/location/create', json={
+        'location_name': 'Catalogue Stop',
+        'x_coordinate': '1.5',
+        'y_coordinate': '2.5'
+    }, headers=headers)
+    location_id = int(created.json['location_id'])
+
+    # The new stop invalidates the ETag and shows up in the delta
+    assert client.get('/location', headers={**headers, 'If-None-Match': first.headers['ETag']}).status_code == 200
+    delta = client.get(f'/location?since={version}', headers=headers).json
+    # Stops changed just before `version` may be sent again, see catalogue_changes
+    assert location_id in [location['location_id'] for location in delta['locations']]
+    assert delta['deleted'] == []
+
+    client.delete(f'/location/{location_id}', headers=headers)
+    delta = client.get(f'/location?since={delta["version"]}', headers=headers).json
+    assert delta['locations'] == []
+    assert delta['deleted'] == [location_id]
+
+    assert client.get('/location?since=abc', headers=headers).status_code == 400
+
+# LocationChanges as (change_seq, location_id, seconds before the newest change), with
+# Locations holding every location id below 100
+def changes_db(fake_db, log):
+    def respond(query, params):
+        seqs = [seq for seq, _, _ in log]
+        if query.startswith("SELECT COALESCE(MAX(change_seq), 0), MIN(change_seq)"):
+            return [(max(seqs), min(seqs))]
+        if query.startswith("SELECT MIN(c.change_seq)"):
+            overlap, since = params
+            at = [ago for seq, _, ago in log if seq == since]
+            if not at:
+                return [(None,)]
+            return [(min(seq for seq, _, ago in log if seq <= since and ago <= at[0] + overlap),)]
+        if query.startswith("SELECT DISTINCT location_id"):
+            return sorted({(location_id,) for seq, location_id, _ in log if params[0] < seq <= params[1]})
+        if "FROM Locations" in query:
+            return [(location_id, f"Stop {location_id}", 1.0, 2.0) for location_id in params if location_id < 100]
+        return []
+    return fake_db(respond)
+
+def test_location_delta_includes_changes_committed_below_since(fake_db, monkeypatch):
+    # Version 3 was served while change 2 (stop 20) was still uncommitted, change 1 is old
+    log = [(1, 10, 600), (2, 20, 5), (3, 30, 0)]
+    monkeypatch.setattr(location_catalogue, 'get_db_connection', lambda: changes_db(fake_db, log))
+    changes = location_catalogue.catalogue_changes(3)
+    assert changes['version'] == 3
+    assert [location['location_id'] for location in changes['locations']] == [20, 30]
+    assert changes['deleted'] == []
+
+def test_location_delta_needs_full_list_when_log_was_purged(fake_db, monkeypatch):
+    log = [(5, 10, 0), (6, 120, 0)]
+    monkeypatch.setattr(location_catalogue, 'get_db_connection', lambda: changes_db(fake_db, log))
+    assert location_catalogue.catalogue_changes(4)['deleted'] == [120]
+    assert location_catalogue.catalogue_changes(3) is None
+    assert location_catalogue.catalogue_changes(7) is None
+
+def test_location_bulk_import(client):
+    client.post('/auth/register', json={
+        'name': 'Admin User',
+        'email': 'admin@import.com',
+        'password': 'ValidPass123',
+        'phone_number': '+61400000003'
+    })
+    token = client.post('/auth/login', json={
+        'email': 'admin@import.com',
+        'password': 'ValidPass123'
+    }).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.post('/location/import', headers=headers, json={'locations': [
+        {'location_name': 'Central Station', 'x_coordinate': -33.88, 'y_coordinate': 151.20},
+        {'location_name': 'Town Hall', 'x_coordinate': -33.87, 'y_coordinate': 151.21},
+        {'location_name': ' central station ', 'x_coordinate': -33.88, 'y_coordinate': 151.20},
+        {'location_name': 'No Coordinates'},
+    ]})
+    assert response.status_code == 200
+    assert response.json['created'] == 2
+    assert response.json['duplicates'] == 1
+    assert response.json['invalid'] == 1
+    assert [result['status'] for result in response.json['results']] == ['created', 'created', 'duplicate', 'invalid']
+
+    # CSV import of an existing name reports the existing id
+    csv_body = "location_name,x_coordinate,y_coordinate\nTOWN HALL,-33.87,151.21\nWynyard,-33.86,151.20\n"
+    response = client.post('/location/import', headers=headers, data=csv_body, content_type='text/csv')
+    assert response.status_code == 200
+    results = response.json['results']
+    assert results[0]['status'] == 'duplicate'
+    assert results[1]['status'] == 'created'
+
+    # Single creates share the same unique name index
+    response = client.post('/location/create', json={
+        'location_name': 'Wynyard ',
+        'x_coordinate': '-33.86',
+        'y_coordinate': '151.20'
+    }, headers=headers)
+    assert response.status_code == 400
+    assert response.json == {'error': 'Duplicated Location Name'}
+
+    # Python's strip() drops a no-break space, MySQL's trim() keeps it in name_key,
+    # the new stop still comes back with its id
+    response = client.post('/location/import', headers=headers, json=[
+        {'location_name': '\u00a0Circular Quay', 'x_coordinate': -33.86, 'y_coordinate': 151.21},
+    ])
+    assert response.status_code == 200
+    assert response.json['results'][0]['status'] == 'created'
+    assert isinstance(response.json['results'][0]['location_id'], int)
+
 def test_location_delete_not_found(client):
     client.post('/auth/register', json={
         'name': 'Admin User',
@@ -253,3 +423,33 @@ def test_location_get_directions_valid(client):
     assert response.status_code == 200
 
 
+
+def test_location_nearest(client):
+    # First user registered is the admin
+    client.post('/auth/register', json={
+        'name': 'Admin User',
+        'email': 'admin@nearest.com',
+        'password': 'ValidPass123',
+        'phone_number': '+61400000005'
+    })
+    token = client.post('/auth/login', json={
+        'email': 'admin@nearest.com',
+        'password': 'ValidPass123'
+    }).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    for name, lat, lng in [('Nearest Town Hall', '-33.8732', '151.2063'),
+                           ('Nearest Central', '-33.8832', '151.2070'),
+                           ('Nearest Parramatta', '-33.8170', '151.0030')]:
+        client.post('/location/create', json={'location_name': name, 'x_coordinate': lat, 'y_coordinate': lng},
+                    headers=headers)
+
+    response = client.get('/location/nearest?lat=-33.8740&lng=151.2065&k=2', headers=headers)
+    assert response.status_code == 200
+    locations = response.json['locations']
+    assert [location['location_name'] for location in locations] == ['Nearest Town Hall', 'Nearest Central']
+    assert locations[0]['distance_m'] < locations[1]['distance_m']
+
+    assert client.get('/location/nearest?lat=abc&lng=151', headers=headers).status_code == 400
+    assert client.get('/location/nearest?lat=-95&lng=151', headers=headers).status_code == 400
+    assert client.get('/location/nearest?lat=-33&lng=151&k=0', headers=headers).status_code == 400
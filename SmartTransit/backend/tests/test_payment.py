@@ -0,0 +1,176 @@
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+import mysql.connector
+import os
+from types import SimpleNamespace
+from backend import payment
+from backend.payment import payment_bp, calculate_ride_price
+
+TEST_CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+@pytest.fixture
+def app(monkeypatch):
+    # Create test Flask app
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+    JWTManager(app)
+    app.register_blueprint(payment_bp)
+
+    # Stripe is never called, created intents are recorded instead
+    intents = []
+    def create_intent(**kwargs):
+        intents.append(kwargs)
+        return SimpleNamespace(client_secret='pi_test_secret')
+    monkeypatch.setattr(payment.stripe.PaymentIntent, 'create', create_intent)
+    app.intents = intents
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def db():
+    clear_test_data()
+    yield
+    clear_test_data()
+
+def clear_test_data():
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM Operates")
+        cursor.execute("DELETE FROM Bookings")
+        cursor.execute("DELETE FROM Rides")
+        cursor.execute("DELETE FROM Users")
+        cursor.execute("DELETE FROM Drivers")
+        cursor.execute("DELETE FROM Vehicles")
+        cursor.execute("DELETE FROM Locations")
+        conn.commit()
+    except mysql.connector.Error as err:
+        print(f"Error cleaning test data: {err}")
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+############### HELPER FUNCTIONS ###############
+
+def get_auth_headers(app, user_id):
+    with app.app_context():
+        token = create_access_token(identity=str(user_id), additional_claims={'is_admin': False, 'is_driver': False})
+    return {'Authorization': f'Bearer {token}'}
+
+"""
+    A rider, a ride of 20 minutes with `booked` seats taken by other riders, and one
+    vehicle of `capacity` seats. Returns (user_id, ride_id)
+"""
+def create_ride(capacity=4, booked=0, status='I'):
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO Users (name, email) VALUES ('Payer', 'payer@example.com')")
+        user_id = cursor.lastrowid
+        cursor.execute("INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES ('A', -33.86, 151.21)")
+        start_id = cursor.lastrowid
+        cursor.execute("INSERT INTO Locations (location_name, x_coordinate, y_coordinate) VALUES ('B', -33.87, 151.22)")
+        end_id = cursor.lastrowid
+        cursor.execute(
+            "INSERT INTO Rides (start_location, end_location, ride_duration, ride_status, passenger_count) "
+            "VALUES (%s, %s, 20, %s, %s)", (start_id, end_id, status, booked)
+        )
+        ride_id = cursor.lastrowid
+        cursor.execute("INSERT INTO Vehicles (capacity, disability_seats) VALUES (%s, 0)", (capacity,))
+        conn.commit()
+        return user_id, ride_id
+    finally:
+        cursor.close()
+        conn.close()
+
+def book(user_id, ride_id):
+    conn = mysql.connector.connect(**TEST_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO Bookings (ride_id, user_id, ride_date) VALUES (%s, %s, NOW())", (ride_id, user_id))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+############### TEST CASES ###############
+
+@pytest.mark.parametrize('body', [
+    {'seats': 2},                      # No ride_id
+    {'ride_id': 1},                    # No seats
+    {'ride_id': 1, 'seats': 0},
+    {'ride_id': 1, 'seats': -1},
+    {'ride_id': 1, 'seats': '2'},
+    {'ride_id': 1, 'seats': True},
+])
+def test_group_intent_validates_input(app, client, body):
+    response = client.post('/payment/create-group-intent', json=body, headers=get_auth_headers(app, 1))
+    assert response.status_code == 400
+    assert app.intents == []
+
+def test_group_intent_unknown_ride(app, client, db):
+    user_id, ride_id = create_ride()
+    response = client.post('/payment/create-group-intent', json={'ride_id': ride_id + 1, 'seats': 2},
+                           headers=get_auth_headers(app, user_id))
+    assert response.status_code == 404
+
+def test_group_intent_charges_every_seat(app, client, db):
+    user_id, ride_id = create_ride(capacity=4, booked=1)
+    response = client.post('/payment/create-group-intent', json={'ride_id': ride_id, 'seats': 3},
+                           headers=get_auth_headers(app, user_id))
+    assert response.status_code == 200
+    assert response.json == {'clientSecret': 'pi_test_secret', 'seats': 3, 'amount_cents': calculate_ride_price(20) * 3}
+
+    [intent] = app.intents
+    assert intent['amount'] == calculate_ride_price(20) * 3
+    assert intent['metadata'] == {'ride_id': ride_id, 'user_id': str(user_id), 'seats': 3}
+
+def test_group_intent_not_enough_seats(app, client, db):
+    user_id, ride_id = create_ride(capacity=4, booked=2)
+    response = client.post('/payment/create-group-intent', json={'ride_id': ride_id, 'seats': 3},
+                           headers=get_auth_headers(app, user_id))
+    assert response.status_code == 409
+    assert response.json['seats_left'] == 2
+    assert app.intents == []
+
+def test_group_intent_ride_not_open(app, client, db):
+    user_id, ride_id = create_ride(status='A')
+    response = client.post('/payment/create-group-intent', json={'ride_id': ride_id, 'seats': 2},
+                           headers=get_auth_headers(app, user_id))
+    assert response.status_code == 409
+    assert app.intents == []
+
+def test_group_intent_already_booked(app, client, db):
+    user_id, ride_id = create_ride()
+    book(user_id, ride_id)
+    response = client.post('/payment/create-group-intent', json={'ride_id': ride_id, 'seats': 2},
+                           headers=get_auth_headers(app, user_id))
+    assert response.status_code == 409
+    assert app.intents == []
+
+def test_single_intent_charges_one_seat(app, client, db):
+    user_id, ride_id = create_ride(capacity=4, booked=3)
+    response = client.post('/payment/create-intent', json={'ride_id': ride_id}, headers=get_auth_headers(app, user_id))
+    assert response.status_code == 200
+    [intent] = app.intents
+    assert intent['amount'] == calculate_ride_price(20)
+
+def test_single_intent_full_ride(app, client, db):
+    # Charging here would only end in a refund when the webhook is applied
+    user_id, ride_id = create_ride(capacity=4, booked=4)
+    response = client.post('/payment/create-intent', json={'ride_id': ride_id}, headers=get_auth_headers(app, user_id))
+    assert response.status_code == 409
+    assert response.json['seats_left'] == 0
+    assert app.intents == []
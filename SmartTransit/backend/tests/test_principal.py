@@ -0,0 +1,70 @@
+import pytest
+from flask import Flask, g
+from backend import principal as principal_module
+from backend.ttl_cache import TTLCache
+from backend.principal import Principal, load_principal, current_principal, invalidate_driver
+
+DRIVER_CLAIMS = {"is_admin": False, "is_driver": True}
+
+@pytest.fixture
+def lookups(monkeypatch):
+    # Stands in for the Drivers table, counting how often it is read
+    drivers = {'1': 7}
+    calls = []
+    def load_driver(driver_id):
+        calls.append(driver_id)
+        if driver_id not in drivers:
+            return None
+        return Principal(driver_id, False, True, drivers[driver_id])
+    monkeypatch.setattr(principal_module, '_load_driver', load_driver)
+    monkeypatch.setattr(principal_module, 'driver_principals', TTLCache(30))
+    return drivers, calls
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+def test_driver_principal_is_cached(app, lookups):
+    drivers, calls = lookups
+    for _ in range(5):
+        with app.test_request_context():
+            load_principal('1', DRIVER_CLAIMS)
+            assert current_principal().assigned_vehicle == 7
+    assert calls == ['1']
+
+def test_invalidate_reloads_driver(app, lookups):
+    drivers, calls = lookups
+    with app.test_request_context():
+        load_principal('1', DRIVER_CLAIMS)
+
+    drivers['1'] = None # Vehicle unassigned
+    invalidate_driver(1)
+    with app.test_request_context():
+        assert load_principal('1', DRIVER_CLAIMS).assigned_vehicle is None
+    assert len(calls) == 2
+
+def test_missing_driver_is_not_cached(app, lookups):
+    drivers, calls = lookups
+    with app.test_request_context():
+        assert load_principal('2', DRIVER_CLAIMS) is None
+        assert current_principal() is None
+
+    drivers['2'] = 3 # Registered afterwards
+    with app.test_request_context():
+        assert load_principal('2', DRIVER_CLAIMS).assigned_vehicle == 3
+
+def test_users_need_no_lookup(app, lookups):
+    drivers, calls = lookups
+    with app.test_request_context():
+        principal = load_principal('5', {"is_admin": True, "is_driver": False})
+        assert principal.is_admin and not principal.is_driver
+    assert calls == []
+
+def test_driver_lookup_uses_the_request_connection(app, fake_db, monkeypatch):
+    monkeypatch.setattr(principal_module, 'driver_principals', TTLCache(30))
+    conn = fake_db(lambda query, params: [(7,)])
+    with app.test_request_context():
+        g.db = conn
+        assert load_principal('1', DRIVER_CLAIMS).assigned_vehicle == 7
+        assert g.db is conn
+    assert conn.queries == ["SELECT assigned_vehicle FROM Drivers WHERE driver_id = %s"]
@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import mysql.connector
+import pytest
+from backend import payment
+from backend.processed_events import ProcessedEventCache, claim_event
+
+TEST_CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+CLAIM_EVENT_ID = 'evt_claim_test'
+
+@pytest.fixture
+def client(webhook_client, monkeypatch):
+    # Any DB access fails the test, these deliveries must be answered without it
+    monkeypatch.setattr(payment, 'get_db_connection', lambda: pytest.fail('webhook used the database'))
+    return webhook_client
+
+def test_cache_evicts_least_recently_used():
+    cache = ProcessedEventCache(max_entries=2)
+    cache.add('evt_1')
+    cache.add('evt_2')
+    assert 'evt_1' in cache # Now the most recent
+    cache.add('evt_3')
+    assert 'evt_1' in cache and 'evt_3' in cache
+    assert 'evt_2' not in cache
+
+def test_known_event_is_acknowledged_from_memory(client, deliver_webhook, payment_event):
+    payment.processed_events.add('evt_seen')
+    response = deliver_webhook(client, payment_event('evt_seen'))
+    assert response.status_code == 200
+    assert response.json == {'received': True, 'duplicate': True}
+
+def test_other_event_types_skip_the_database(client, deliver_webhook, payment_event):
+    response = deliver_webhook(client, payment_event('evt_failed', 'payment_intent.payment_failed'))
+    assert response.status_code == 200
+    assert response.json == {'received': True}
+
+def test_bad_signature_is_rejected(client, payment_event):
+    response = client.post('/payment/webhook', data=json.dumps(payment_event('evt_1')),
+                           headers={'Stripe-Signature': 't=1,v1=00'})
+    assert response.status_code == 400
+
+############### CLAIMS (needs the test database) ###############
+
+@pytest.fixture
+def connections():
+    conns = [mysql.connector.connect(**TEST_CONFIG) for _ in range(2)]
+    cursor = conns[0].cursor()
+    cursor.execute("DELETE FROM ProcessedEvents WHERE event_id = %s", (CLAIM_EVENT_ID,))
+    conns[0].commit()
+    yield conns
+    for conn in conns:
+        conn.rollback()
+    cursor.execute("DELETE FROM ProcessedEvents WHERE event_id = %s", (CLAIM_EVENT_ID,))
+    conns[0].commit()
+    cursor.close()
+    for conn in conns:
+        conn.close()
+
+# Claims the event on `conn` in a thread, which blocks while another transaction holds the claim
+def claim_in_thread(conn, results):
+    def claim():
+        cursor = conn.cursor()
+        results.append(claim_event(cursor, CLAIM_EVENT_ID, 'payment_intent.succeeded'))
+        conn.commit()
+        cursor.close()
+    thread = threading.Thread(target=claim)
+    thread.start()
+    return thread
+
+def test_concurrent_claim_waits_and_sees_the_committed_claim(connections):
+    first, second = connections
+    assert claim_event(first.cursor(), CLAIM_EVENT_ID, 'payment_intent.succeeded')
+    results = []
+    thread = claim_in_thread(second, results)
+    thread.join(0.5)
+    assert thread.is_alive() # Waiting on the first delivery's key
+
+    first.commit()
+    thread.join(10)
+    assert results == [False]
+
+def test_concurrent_claim_takes_over_a_rolled_back_claim(connections):
+    first, second = connections
+    assert claim_event(first.cursor(), CLAIM_EVENT_ID, 'payment_intent.succeeded')
+    results = []
+    thread = claim_in_thread(second, results)
+    thread.join(0.5)
+
+    first.rollback() # e.g. the booking insert failed
+    thread.join(10)
+    assert results == [True]
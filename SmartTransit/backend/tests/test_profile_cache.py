@@ -0,0 +1,18 @@
+from flask import Flask, g
+from backend import profile_cache
+from backend.profile_cache import get_profile
+from backend.ttl_cache import TTLCache
+
+PROFILE = {"user_id": 1, "name": "Rider", "email": "rider@example.com", "age": 30,
+           "phone_number": None, "disability": 0}
+
+def test_profile_lookup_uses_the_request_connection(fake_db, monkeypatch):
+    monkeypatch.setattr(profile_cache, 'profiles', TTLCache(30))
+    conn = fake_db(lambda query, params: [PROFILE])
+    with Flask(__name__).test_request_context():
+        g.db = conn
+        assert get_profile(1) == PROFILE
+        assert get_profile(1) == PROFILE
+        assert g.db is conn
+    # The second read is served from the cache
+    assert len(conn.queries) == 1
@@ -0,0 +1,100 @@
+import pytest
+from flask import Flask, jsonify
+from backend import rate_limit
+from backend.rate_limit import MemoryBucketStore, MySQLBucketStore, rate_limited, parse_limit
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'bucket_store', MemoryBucketStore())
+    monkeypatch.setitem(rate_limit.RATE_LIMITS, 'login', {
+        'ip': parse_limit('5/60'),
+        'account': parse_limit('2/60'),
+    })
+
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['RATE_LIMIT_ENABLED'] = True
+
+    @app.route('/login', methods=['POST'])
+    @rate_limited('login')
+    def login():
+        return jsonify({'message': 'ok'}), 200
+
+    return app.test_client()
+
+def test_bucket_refills_over_time(monkeypatch):
+    store = MemoryBucketStore()
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+
+    assert store.take('k', 2, 1)[0]
+    assert store.take('k', 2, 1)[0]
+    allowed, retry_after = store.take('k', 2, 1)
+    assert not allowed and retry_after == pytest.approx(1)
+
+    now[0] += 1
+    assert store.take('k', 2, 1)[0]
+
+def test_wait_spaces_calls_at_the_rate(monkeypatch):
+    store = MemoryBucketStore()
+    now = [1000.0]
+    sleeps = []
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    monkeypatch.setattr(rate_limit.time, 'sleep', sleep)
+
+    for _ in range(3):
+        store.wait('directions', 1, 4)
+    assert sleeps == [pytest.approx(0.25)] * 2
+
+# The shared store's bucket row as (tokens, microseconds since updated_at)
+def shared_store(fake_db, monkeypatch, tokens, elapsed):
+    conn = fake_db(lambda query, params: [(tokens, elapsed)] if query.startswith("SELECT tokens") else 1)
+    store = MySQLBucketStore()
+    monkeypatch.setattr(store, '_connection', lambda: conn)
+    return store, conn
+
+def test_shared_store_takes_under_the_row_lock(fake_db, monkeypatch):
+    store, conn = shared_store(fake_db, monkeypatch, 0.25, 1000000)
+    assert store.take('k', 2, 1) == (True, 0)
+    assert "FOR UPDATE" in conn.queries[1]
+    assert conn.statements[2][1] == (pytest.approx(0.25), 'k')
+    assert conn.committed
+
+def test_shared_store_rejection_takes_nothing(fake_db, monkeypatch):
+    store, conn = shared_store(fake_db, monkeypatch, 0.0, 500000)
+    allowed, retry_after = store.take('k', 2, 1)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    assert conn.statements[2][1] == (pytest.approx(0.5), 'k')
+
+def test_account_limit_returns_429(client):
+    for _ in range(2):
+        assert client.post('/login', json={'email': 'Rider@example.com'}).status_code == 200
+
+    # Same account, different casing
+    response = client.post('/login', json={'email': 'rider@example.com '})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+    # Other accounts from the same IP are still allowed
+    assert client.post('/login', json={'email': 'other@example.com'}).status_code == 200
+
+def test_ip_limit_returns_429(client):
+    for i in range(5):
+        assert client.post('/login', json={'email': f'user{i}@example.com'}).status_code == 200
+    assert client.post('/login', json={'email': 'new@example.com'}).status_code == 429
+
+def test_disabled_for_testing_apps_by_default(client):
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+
+    @app.route('/login', methods=['POST'])
+    @rate_limited('login')
+    def login():
+        return jsonify({'message': 'ok'}), 200
+
+    test_client = app.test_client()
+    for _ in range(10):
+        assert test_client.post('/login', json={'email': 'rider@example.com'}).status_code == 200
@@ -0,0 +1,140 @@
+import time
+from datetime import datetime, timedelta
+from backend import revocation
+from backend.revocation import BloomFilter, RevokedTokenCache, LocalBroadcaster
+
+################## HELPER FUNCTIONS #####################
+
+# RevokedTokens behind a fake connection. rows are (jti, expires_at) committed in
+# revoked_seq order, or (jti, expires_at, revoked_seq), tests append to conn.rows
+def revocations_db(fake_db, rows):
+    def committed():
+        return [row if len(row) == 3 else (*row, seq) for seq, row in enumerate(rows, 1)]
+
+    def respond(query, params):
+        if "MAX(revoked_seq)" in query:
+            return [(max((seq for _, _, seq in committed()), default=0),)]
+        if "revoked_seq IN" in query:
+            return [row for row in committed() if row[2] in params]
+        if "revoked_seq >" in query:
+            newer = sorted((row for row in committed() if row[2] > params[0]), key=lambda row: row[2])
+            return newer[:params[1]]
+        if "WHERE jti" in query:
+            return [(exp,) for jti, exp, _ in committed() if jti == params[0]]
+        return committed()
+
+    conn = fake_db(respond)
+    conn.rows = rows
+    return conn
+
+def future(minutes=15):
+    return datetime.now() + timedelta(minutes=minutes)
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    items = [f"jti-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_cache_skips_db_for_unrevoked_tokens(fake_db):
+    conn = revocations_db(fake_db, [("revoked-jti", future())])
+    cache = RevokedTokenCache(capacity=1000)
+
+    assert cache.is_revoked("revoked-jti", lambda: conn)
+    queries_after_load = len(conn.queries)
+    for i in range(100):
+        cache.is_revoked(f"fresh-{i}", lambda: conn)
+
+    # Only Bloom filter false positives may reach the DB
+    assert len(conn.queries) - queries_after_load < 10
+
+def test_cache_add_and_expiry(fake_db):
+    conn = revocations_db(fake_db, [])
+    cache = RevokedTokenCache(capacity=1000)
+    assert not cache.is_revoked("logged-out", lambda: conn)
+
+    cache.add("logged-out", future())
+    assert cache.is_revoked("logged-out", lambda: conn)
+
+    cache.add("already-expired", time.time() - 1)
+    assert "already-expired" not in cache.expiries
+
+def test_cache_confirms_false_positive_against_db(fake_db):
+    # Revoked by another process: not cached locally but present in MySQL
+    conn = revocations_db(fake_db, [("elsewhere", future())])
+    cache = RevokedTokenCache(capacity=1000)
+    cache.loaded = True
+    cache.bloom.add("elsewhere")
+
+    assert cache.is_revoked("elsewhere", lambda: conn)
+    assert "elsewhere" in cache.expiries
+
+def test_poll_applies_revocations_from_other_workers(fake_db):
+    conn = revocations_db(fake_db, [("first", future())])
+    cache = RevokedTokenCache(capacity=1000)
+    cache.poll(conn)
+    assert cache.high_water == 1
+
+    # Another worker logs out two tokens
+    conn.rows.append(("second", future()))
+    conn.rows.append(("third", future()))
+    assert cache.poll(conn) == 2
+    assert cache.high_water == 3
+    assert "third" in cache.expiries
+
+    queries_before = len(conn.queries)
+    assert cache.is_revoked("second", lambda: conn)
+    assert len(conn.queries) == queries_before
+
+def test_poll_applies_revocations_committed_out_of_order(fake_db):
+    conn = revocations_db(fake_db, [("first", future(), 1)])
+    cache = RevokedTokenCache(capacity=1000)
+    cache.poll(conn)
+
+    # Two concurrent logouts get seqs 2 and 3, the one with seq 3 commits first
+    conn.rows.append(("later", future(), 3))
+    assert cache.poll(conn) == 1
+    assert cache.high_water == 3
+    assert 2 in cache.gaps
+
+    conn.rows.append(("earlier", future(), 2))
+    assert cache.poll(conn) == 1
+    assert "earlier" in cache.expiries
+    assert not cache.gaps
+
+def test_poll_forgets_gaps_that_never_fill(fake_db, monkeypatch):
+    conn = revocations_db(fake_db, [("first", future(), 1), ("third", future(), 3)])
+    cache = RevokedTokenCache(capacity=1000)
+    cache.poll(conn)
+    assert 2 in cache.gaps
+
+    # Seq 2 was rolled back, it stops being looked up after REVOCATION_GAP_SECONDS
+    monkeypatch.setattr(revocation, 'REVOCATION_GAP_SECONDS', 0)
+    cache.poll(conn)
+    assert not cache.gaps
+
+def test_local_broadcaster_delivers_to_subscribers():
+    cache = RevokedTokenCache(capacity=1000)
+    cache.loaded = True
+    local = LocalBroadcaster()
+    local.start(cache, None)
+
+    local.publish("shared", future())
+    assert "shared" in cache.expiries
+
+def test_poll_after_an_empty_load_tracks_no_gaps_below_the_first_seq(fake_db):
+    # purge.py emptied the table, AUTO_INCREMENT kept counting
+    conn = revocations_db(fake_db, [])
+    cache = RevokedTokenCache(capacity=1000)
+    cache.poll(conn)
+    assert cache.high_water == 0
+
+    conn.rows.append(("after-purge", future(), 100000))
+    assert cache.poll(conn) == 1
+    assert cache.high_water == 100000
+    assert cache.gaps == {}
+    assert not [query for query in conn.queries if "revoked_seq IN" in query]
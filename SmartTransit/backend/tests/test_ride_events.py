@@ -0,0 +1,75 @@
+import os
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from flask_socketio import SocketIO
+from backend import ride_events
+
+@pytest.fixture
+def server(monkeypatch, fake_db):
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+    JWTManager(app)
+    socketio = SocketIO(app)
+    ride_events.register_ride_events(socketio)
+
+    # Whose rides the fake database returns, user 1 booked ride 7. Every query returns
+    # the user's ride ids, then the ride's status
+    current_user = ['1']
+    rides = {'1': [7], '2': []}
+    def respond(query, params):
+        if query.startswith("SELECT ride_status"):
+            return [('A',)]
+        return [(ride_id,) for ride_id in rides[current_user[0]]]
+    monkeypatch.setattr(ride_events, 'check_if_token_revoked', lambda header, claims: False)
+    monkeypatch.setattr(ride_events, 'get_db_connection', lambda: fake_db(respond))
+    return app, socketio, current_user
+
+def connect(app, socketio, user_id):
+    with app.app_context():
+        token = create_access_token(identity=user_id, additional_claims={'is_admin': False, 'is_driver': False})
+    return socketio.test_client(app, auth={'token': token})
+
+############### TEST CASES ###############
+
+def test_connect_requires_token(server):
+    app, socketio, _ = server
+    assert not socketio.test_client(app).is_connected()
+    assert not socketio.test_client(app, auth={'token': 'not-a-jwt'}).is_connected()
+
+def test_ride_status_reaches_ride_room_only(server):
+    app, socketio, current_user = server
+    rider = connect(app, socketio, '1')
+    current_user[0] = '2'
+    other = connect(app, socketio, '2')
+    assert rider.is_connected() and other.is_connected()
+
+    with app.app_context():
+        ride_events.emit_ride_status(7, 'A')
+        ride_events.emit_booking_confirmed('2', 9, seats=3)
+
+    assert [(event['name'], event['args'][0]) for event in rider.get_received()] == [
+        ('ride_status', {'ride_id': 7, 'status': 'A'})
+    ]
+    assert [(event['name'], event['args'][0]) for event in other.get_received()] == [
+        ('booking_confirmed', {'ride_id': 9, 'seats': 3})
+    ]
+
+def test_join_ride_checks_access(server):
+    app, socketio, current_user = server
+    current_user[0] = '2'
+    client = connect(app, socketio, '2')
+    # User 2 has no rides
+    assert client.emit('join_ride', {'ride_id': 7}, callback=True) == {'error': 'Ride not found'}
+
+    current_user[0] = '1'
+    assert client.emit('join_ride', {'ride_id': 7}, callback=True) == {'ride_id': 7, 'status': 'A'}
+    with app.app_context():
+        ride_events.emit_ride_status(7, 'C')
+    assert client.get_received()[-1]['args'][0] == {'ride_id': 7, 'status': 'C'}
+
+def test_emit_without_socketio_is_a_no_op():
+    app = Flask(__name__)
+    with app.app_context():
+        ride_events.emit_ride_status(1, 'A')
@@ -4,6 +4,7 @@ from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
 from backend.route_optimisation import route_op_bp
 from backend.driver import driver_bp, bcrypt, driver_register, add_vehicle
+from backend.ride_counts import repair_passenger_counts
 import mysql.connector
 import os
 import json
@@ -137,6 +138,9 @@ def init_db(request):
         cursor.execute("INSERT INTO Bookings (ride_id, user_id) VALUES (5, 9)")
 
         conn.commit()
+
+        # Bookings were seeded directly, so bring Rides.passenger_count in line
+        repair_passenger_counts(conn)
     except mysql.connector.Error as err:
         print(f"Error cleaning test data: {err}")
         conn.rollback()
@@ -137,3 +137,28 @@ def test_settings_edit_profile_partial_update(client):
     data = response.json
     assert data["name"] == "Partial Update"
     assert data["disability"] is False
+
+def test_settings_profile_etag(client):
+    register_user(client, email="etag@example.com")
+    headers = get_auth_headers(client, email="etag@example.com")
+
+    first = client.get('/settings/profile', headers=headers)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    # Unchanged profile: 304 with no body
+    cached = client.get('/settings/profile', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    # An edit invalidates the cached row and changes the ETag
+    client.patch('/settings/profile/edit', headers=headers, json={
+        "name": "Renamed User",
+        "email": "etag@example.com",
+        "age": 30,
+        "phone_number": "+61412345678",
+        "disability": 0
+    })
+    changed = client.get('/settings/profile', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.json["name"] == "Renamed User"
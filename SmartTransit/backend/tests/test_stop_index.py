@@ -0,0 +1,43 @@
+import random
+from backend.stop_index import StopIndex, VersionedStopIndex, haversine_metres
+
+def brute_force(stops, lat, lng, k):
+    distances = sorted((haversine_metres(lat, lng, s_lat, s_lng), stop_id) for stop_id, s_lat, s_lng in stops)
+    return distances[:k]
+
+def test_nearest_matches_brute_force():
+    random.seed(3)
+    stops = [(i, random.uniform(-34.1, -33.6), random.uniform(150.7, 151.4)) for i in range(2000)]
+    index = StopIndex(stops)
+    for _ in range(50):
+        lat, lng = random.uniform(-34.2, -33.5), random.uniform(150.6, 151.5)
+        found = index.nearest(lat, lng, 7)
+        expected = brute_force(stops, lat, lng, 7)
+        assert [stop_id for stop_id, _ in found] == [stop_id for _, stop_id in expected]
+        for (_, distance), (expected_distance, _) in zip(found, expected):
+            assert abs(distance - expected_distance) < 0.01
+
+def test_nearest_across_antimeridian_and_pole():
+    stops = [('fiji', -17.7, 179.9), ('samoa', -13.8, -171.8), ('sydney', -33.87, 151.21), ('pole', 89.9, 0)]
+    index = StopIndex(stops)
+    # 179.9 and -179.9 are ~21 km apart, not half the planet
+    (name, distance), = index.nearest(-17.7, -179.9, 1)
+    assert name == 'fiji' and distance < 25000
+    assert index.nearest(90, 123, 1)[0][0] == 'pole'
+
+def test_small_and_empty_indexes():
+    assert StopIndex([]).nearest(0, 0, 5) == []
+    index = StopIndex([('a', 0, 0), ('b', 0, 1)])
+    assert [name for name, _ in index.nearest(0, 0.9, 5)] == ['b', 'a']
+    assert index.nearest(0, 0, 0) == []
+
+def test_versioned_index_rebuilds_on_change():
+    builds = []
+    def load():
+        builds.append(1)
+        return [('a', 0, 0)]
+    versioned = VersionedStopIndex()
+    first = versioned.get(1, load)
+    assert versioned.get(1, load) is first
+    assert versioned.get(2, load) is not first
+    assert len(builds) == 2
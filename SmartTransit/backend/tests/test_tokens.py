@@ -0,0 +1,35 @@
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from backend.tokens import token_response, clear_refresh_cookies
+
+def cookie_paths(response, name):
+    return sorted(
+        header.split('Path=')[1].split(';')[0]
+        for header in response.headers.getlist('Set-Cookie') if header.startswith(f"{name}=")
+    )
+
+def make_app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-that-is-long-enough'
+    app.config['JWT_TOKEN_LOCATION'] = ['cookies', 'headers']
+    app.config['JWT_REFRESH_COOKIE_PATH'] = '/auth/refresh'
+    app.config['JWT_REFRESH_CSRF_COOKIE_PATH'] = '/auth/refresh'
+    JWTManager(app)
+    return app
+
+def test_refresh_cookie_only_goes_to_refresh_and_logout():
+    with make_app().test_request_context():
+        response = token_response(1, False, True)
+        assert cookie_paths(response, 'refresh_token_cookie') == [
+            '/auth/driver/logout', '/auth/logout', '/auth/refresh'
+        ]
+        assert cookie_paths(response, 'csrf_refresh_token') == ['/auth/refresh']
+
+def test_logout_clears_every_copy():
+    with make_app().test_request_context():
+        response = clear_refresh_cookies(token_response(1, False, False))
+        cleared = [
+            header for header in response.headers.getlist('Set-Cookie')
+            if header.startswith('refresh_token_cookie=;')
+        ]
+        assert len(cleared) == 3
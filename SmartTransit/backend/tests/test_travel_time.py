@@ -0,0 +1,62 @@
+import threading
+import time
+from backend import booking, route_optimisation
+from backend.singleflight import SingleFlight
+
+################## HELPER FUNCTIONS #####################
+
+# Stands in for the Google call, counting how often it is made
+class SlowLookup:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, origin, destination):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return self.result
+
+class FakeCatalogue:
+    def get_location(self, location_id):
+        return {1: {"x_coordinate": -33.86, "y_coordinate": 151.21},
+                2: {"x_coordinate": -33.87, "y_coordinate": 151.22}}.get(int(location_id))
+
+def run_concurrently(fn, count=8):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+############### TEST CASES ###############
+
+def test_estimated_time_lookups_collapse(monkeypatch):
+    lookup = SlowLookup((12.5, "OK"))
+    monkeypatch.setattr(booking, 'catalogue', FakeCatalogue())
+    monkeypatch.setattr(booking, 'estimate_flights', SingleFlight())
+    monkeypatch.setattr(booking, 'fetch_travel_minutes', lookup)
+
+    # Ids as sent by different clients, as ints and strings
+    results = run_concurrently(lambda: booking.get_estimated_time(1, '2'))
+    assert results == [12.5] * 8
+    assert lookup.calls == 1
+    assert booking.get_estimated_time(1, 99) is None
+
+def test_travel_time_lookups_collapse(monkeypatch):
+    lookup = SlowLookup(7.0)
+    monkeypatch.setattr(route_optimisation, 'travel_time_flights', SingleFlight())
+    monkeypatch.setattr(route_optimisation, 'fetch_travel_time', lookup)
+
+    origin = {"lat": -33.86, "lng": 151.21}
+    destination = {"lat": -33.87, "lng": 151.22}
+    results = run_concurrently(lambda: route_optimisation.get_travel_time(origin, destination))
+    assert results == [7.0] * 8
+    assert lookup.calls == 1
+
+    # A different pair is its own lookup
+    route_optimisation.get_travel_time(destination, origin)
+    assert lookup.calls == 2
@@ -0,0 +1,112 @@
+import json
+import logging
+import mysql.connector
+import pytest
+from flask import Flask
+from backend import payment, webhook_inbox
+from backend.processed_events import ProcessedEventCache
+from backend.webhook_inbox import apply_inbox_batch, plan_batch
+
+BOOKED_AT = '2025-01-01 08:00:00'
+
+def stored(event_id, ride_id, user_id, seats=None):
+    metadata = {'ride_id': str(ride_id), 'user_id': str(user_id)}
+    if seats:
+        metadata['seats'] = str(seats)
+    payload = {'data': {'object': {'id': f"pi_{event_id}", 'metadata': metadata}}}
+    return (event_id, 'payment_intent.succeeded', json.dumps(payload))
+
+# An inbox whose events for ride 99 break the Bookings foreign key. Rides have
+# `seats_left` free seats each when given
+def inbox_db(fake_db, rows, attempts=0, seats_left=None):
+    def respond(query, params):
+        if "FROM Rides r" in query and "FOR UPDATE" in query:
+            return [] if seats_left is None else [(ride_id, 10 - seats_left, 10) for ride_id in params]
+        if "WHERE status = 'P' ORDER BY inbox_id" in query:
+            return rows
+        if "WHERE inbox_id = %s AND status = 'P'" in query:
+            return [(*row, attempts) for row in rows if row[0] == params[0]]
+        if query.startswith("INSERT IGNORE INTO ProcessedEvents"):
+            return 1
+        if query.startswith("INSERT INTO Bookings") and any(row[0] == 99 for row in params):
+            raise mysql.connector.IntegrityError(msg='Cannot add or update a child row', errno=1452)
+        return []
+    return fake_db(respond)
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(webhook_inbox, 'processed_events', ProcessedEventCache())
+    # booking_confirmed is pushed from an app context, as in app.py
+    with Flask(__name__).app_context():
+        yield
+
+def test_webhook_stores_the_event_and_acknowledges(webhook_client, deliver_webhook, payment_event,
+                                                  fake_db, monkeypatch):
+    conn = fake_db()
+    monkeypatch.setattr(payment, 'get_db_connection', lambda: conn)
+    response = deliver_webhook(webhook_client, payment_event('evt_new'))
+    assert response.status_code == 200
+    assert response.json == {'received': True}
+    # Only the inbox insert, no booking is made before the acknowledgement
+    [(query, params)] = conn.statements
+    assert query.startswith('INSERT IGNORE INTO WebhookInbox')
+    assert params[:2] == ('evt_new', 'payment_intent.succeeded')
+    assert json.loads(params[2])['id'] == 'evt_new'
+    assert conn.committed
+    assert 'evt_new' in payment.processed_events
+
+def test_plan_books_every_seat_in_one_insert():
+    plan = plan_batch([stored('evt_1', 1, 10), stored('evt_2', 1, 11, seats=3), stored('evt_3', 2, 10)],
+                      {'evt_1', 'evt_2', 'evt_3'}, set(), BOOKED_AT)
+    assert plan['bookings'] == [(1, 10, BOOKED_AT)] + [(1, 11, BOOKED_AT)] * 3 + [(2, 10, BOOKED_AT)]
+    assert plan['seats'] == {1: 4, 2: 1}
+    assert plan['confirmed'] == [(10, 1, 1), (11, 1, 3), (10, 2, 1)]
+
+def test_plan_skips_applied_events_and_existing_bookings():
+    events = [stored('evt_1', 1, 10), stored('evt_2', 1, 11), stored('evt_3', 1, 12), stored('evt_4', 1, 12)]
+    # evt_1 was applied before, ride 1 already has user 11, evt_4 pays again for user 12
+    plan = plan_batch(events, {'evt_2', 'evt_3', 'evt_4'}, {(1, 11)}, BOOKED_AT)
+    assert plan['bookings'] == [(1, 12, BOOKED_AT)]
+    assert plan['seats'] == {1: 1}
+
+def test_plan_skips_events_without_metadata():
+    plan = plan_batch([('evt_1', 'payment_intent.succeeded', '{}')], {'evt_1'}, set(), BOOKED_AT)
+    assert plan['bookings'] == [] and plan['confirmed'] == []
+
+def test_failed_batch_is_applied_one_by_one(fake_db, worker):
+    rows = [(1, *stored('evt_ok', 1, 10)), (2, *stored('evt_bad', 99, 11))]
+    conn = inbox_db(fake_db, rows)
+    assert apply_inbox_batch(conn) == (2, 1, 1)
+
+    bookings = [params for query, params in conn.statements if query.startswith("INSERT INTO Bookings")]
+    # The whole batch first, then each event on its own
+    assert [[row[:2] for row in rows] for rows in bookings] == [[(1, 10), (99, 11)], [(1, 10)], [(99, 11)]]
+    [failure] = [params for query, params in conn.statements if query.startswith("UPDATE WebhookInbox")]
+    assert failure[0] == 1 and failure[2] == 'P' and failure[3] == 2
+    assert 'child row' in failure[1]
+    assert 'evt_ok' in webhook_inbox.processed_events
+    assert 'evt_bad' not in webhook_inbox.processed_events
+
+def test_event_is_dead_lettered_after_max_attempts(fake_db, worker, caplog):
+    conn = inbox_db(fake_db, [(2, *stored('evt_bad', 99, 11))], attempts=webhook_inbox.WEBHOOK_INBOX_MAX_ATTEMPTS - 1)
+    with caplog.at_level(logging.ERROR):
+        assert apply_inbox_batch(conn) == (1, 0, 1)
+    [failure] = [params for query, params in conn.statements if query.startswith("UPDATE WebhookInbox")]
+    assert failure[0] == webhook_inbox.WEBHOOK_INBOX_MAX_ATTEMPTS and failure[2] == 'D'
+    assert 'evt_bad dead-lettered' in caplog.text
+
+def test_plan_leaves_out_seats_that_are_gone():
+    events = [stored('evt_1', 1, 10, seats=3), stored('evt_2', 1, 11, seats=2), stored('evt_3', 1, 12)]
+    plan = plan_batch(events, {'evt_1', 'evt_2', 'evt_3'}, set(), BOOKED_AT, {1: 4})
+    assert plan['confirmed'] == [(10, 1, 3), (12, 1, 1)]
+    assert plan['overbooked'] == [('evt_2', 1, 11, 2)]
+    assert plan['seats'] == {1: 4}
+
+def test_overbooked_payment_is_refunded(fake_db, worker, monkeypatch):
+    refunds = []
+    monkeypatch.setattr(webhook_inbox.stripe.Refund, 'create', lambda **kwargs: refunds.append(kwargs))
+    conn = inbox_db(fake_db, [(1, *stored('evt_group', 1, 10, seats=3))], seats_left=2)
+    assert apply_inbox_batch(conn) == (1, 0, 0)
+
+    assert not [query for query in conn.queries if query.startswith("INSERT INTO Bookings")]
+    assert refunds == [{'payment_intent': 'pi_evt_group', 'idempotency_key': 'overbooked-evt_group'}]
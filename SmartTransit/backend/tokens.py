@@ -0,0 +1,97 @@
+from flask import current_app, jsonify, request
+from flask_jwt_extended import (
+    create_access_token, create_refresh_token, decode_token, get_jwt_identity,
+    set_refresh_cookies, unset_refresh_cookies
+)
+from flask_jwt_extended.config import config
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import InvalidTokenError
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Constants & Setups
+
+jwt_access_expires = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 15)))
+# Refresh tokens are single use: /auth/refresh revokes the one presented and issues a new pair
+jwt_refresh_expires = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES_DAYS', 30)))
+# The refresh cookie's path is /auth/refresh (JWT_REFRESH_COOKIE_PATH, see app.py). The
+# logout routes get their own copy of it, so they can revoke it too
+REFRESH_LOGOUT_PATHS = ['/auth/logout', '/auth/driver/logout']
+
+"""
+    Issues an access token and a refresh token carrying the same role claims.
+    ---
+    The refresh token is set as an HttpOnly cookie (with its CSRF cookie) for
+    /auth/refresh and for each of REFRESH_LOGOUT_PATHS. It is also returned in the body
+    for clients that cannot keep cookies, which send it as a Bearer token to
+    /auth/refresh instead.
+
+    Returns:
+        Response: { access_token: JWT, refresh_token: JWT }
+"""
+def token_response(identity, is_admin, is_driver):
+    claims = {"is_admin": is_admin, "is_driver": is_driver}
+    access_token = create_access_token(
+        identity=str(identity),
+        expires_delta=jwt_access_expires,
+        additional_claims=claims
+    )
+    refresh_token = create_refresh_token(
+        identity=str(identity),
+        expires_delta=jwt_refresh_expires,
+        additional_claims=claims
+    )
+    response = jsonify(access_token=access_token, refresh_token=refresh_token)
+    set_refresh_cookies(response, refresh_token)
+    for path in REFRESH_LOGOUT_PATHS:
+        response.set_cookie(
+            config.refresh_cookie_name,
+            value=refresh_token,
+            max_age=config.cookie_max_age,
+            secure=config.cookie_secure,
+            httponly=True,
+            domain=config.cookie_domain,
+            path=path,
+            samesite=config.cookie_samesite,
+        )
+    return response
+
+"""
+    The caller's refresh token sent alongside a logout, from the refresh cookie or the
+    JSON body's refresh_token, so it can be revoked with the access token.
+
+    Returns:
+        (jti, expires_at) or None if no valid refresh token for this identity was sent
+"""
+def refresh_token_to_revoke():
+    token = request.cookies.get(current_app.config['JWT_REFRESH_COOKIE_NAME'])
+    if not token:
+        token = (request.get_json(silent=True) or {}).get('refresh_token')
+    if not token:
+        return None
+    try:
+        data = decode_token(token)
+    except (InvalidTokenError, JWTExtendedException):
+        return None
+    if data.get('type') != 'refresh' or data['sub'] != get_jwt_identity():
+        return None
+    return data['jti'], datetime.fromtimestamp(data['exp'])
+
+"""
+    Clears the refresh cookies on a logout response, the logout paths' copies included.
+"""
+def clear_refresh_cookies(response):
+    unset_refresh_cookies(response)
+    for path in REFRESH_LOGOUT_PATHS:
+        response.delete_cookie(
+            config.refresh_cookie_name,
+            secure=config.cookie_secure,
+            httponly=True,
+            domain=config.cookie_domain,
+            path=path,
+            samesite=config.cookie_samesite,
+        )
+    return response
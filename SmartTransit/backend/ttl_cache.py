@@ -0,0 +1,36 @@
+import threading
+import time
+
+"""
+    Thread-safe in-process cache whose entries expire `ttl` seconds after they are set.
+    ---
+    Each worker process holds its own copy. invalidate() only reaches this process, so
+    another worker can keep serving an entry it already holds for up to `ttl` seconds
+    after the row behind it changes. A ttl of 0 or less disables caching.
+"""
+class TTLCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
@@ -0,0 +1,371 @@
+import mysql.connector
+import stripe
+import stripe.error
+from dotenv import load_dotenv
+from datetime import datetime
+from ride_counts import increment_passenger_count
+from ride_events import emit_booking_confirmed
+from processed_events import processed_events, claim_events
+import json
+import logging
+import os, sys, time
+
+load_dotenv()
+
+# Constants & Setups
+
+CONFIG = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT')),
+    'database': os.getenv('DB_NAME')
+}
+
+# Refunds for rides that filled up before a payment was applied
+stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+
+# How often each backend worker looks for new events (seconds), see app.py
+WEBHOOK_INBOX_POLL_SECONDS = float(os.getenv('WEBHOOK_INBOX_POLL_SECONDS', 1))
+# Events applied per transaction
+WEBHOOK_INBOX_BATCH = int(os.getenv('WEBHOOK_INBOX_BATCH', 200))
+# Failed attempts, one per run, before an event is dead-lettered and left for a person
+WEBHOOK_INBOX_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_INBOX_MAX_ATTEMPTS', 5))
+
+logger = logging.getLogger(__name__)
+
+def get_db_connection():
+    return mysql.connector.connect(**CONFIG)
+
+"""
+    Stores a verified webhook event in the inbox, called by /payment/webhook before it
+    acknowledges Stripe. A redelivery of an event still in the inbox is ignored by the
+    unique event_id. Does not commit.
+"""
+def enqueue_event(cursor, event_id, event_type, payload):
+    cursor.execute(
+        "INSERT IGNORE INTO WebhookInbox (event_id, event_type, payload) VALUES (%s, %s, %s)",
+        (event_id, event_type, payload)
+    )
+
+# The PaymentIntent id of a stored payload, or None
+def payment_intent_id(payload):
+    try:
+        return json.loads(payload)['data']['object']['id']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+# (ride_id, user_id, seats) from a stored payment_intent.succeeded payload, or None
+def booking_metadata(payload):
+    try:
+        metadata = json.loads(payload)['data']['object']['metadata']
+        # seats is set by /payment/create-group-intent, single bookings have none
+        return int(metadata['ride_id']), int(metadata['user_id']), int(metadata.get('seats') or 1)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+"""
+    Works out what a batch of inbox events does, without touching the database.
+    ---
+    Parameters:
+        events (list): (event_id, event_type, payload) of the batch, oldest first
+        claimed (set): ids of the events this transaction claimed, the others were applied before
+        booked (set): (ride_id, user_id) pairs that already have Bookings rows
+        booking_time (str): ride_date of the new rows
+        seats_left (dict): { ride_id: seats still free }, rides missing from it are not checked
+    Returns:
+        dict: {
+            bookings: [(ride_id, user_id, ride_date)] rows to insert, one per seat,
+            seats: { ride_id: seats added },
+            confirmed: [(user_id, ride_id, seats)] to push once committed,
+            overbooked: [(event_id, ride_id, user_id, seats)] paid for seats that are gone
+        }
+"""
+def plan_batch(events, claimed, booked, booking_time, seats_left=None):
+    plan = {'bookings': [], 'seats': {}, 'confirmed': [], 'overbooked': []}
+    booked = set(booked)
+    seats_left = dict(seats_left or {})
+    for event_id, event_type, payload in events:
+        if event_id not in claimed or event_type != 'payment_intent.succeeded':
+            continue
+        booking = booking_metadata(payload)
+        if booking is None:
+            logger.error("Webhook inbox: event %s has no usable booking metadata, skipped", event_id)
+            continue
+        ride_id, user_id, seats = booking
+        # A second payment for a ride the user already booked does not book it twice
+        if (ride_id, user_id) in booked:
+            logger.info(f"Webhook: Booking for ride {ride_id}, user {user_id} already exists.")
+            continue
+        # The capacity was checked when the intent was created, but two groups can both
+        # pass that check before either is booked
+        if ride_id in seats_left:
+            if seats > seats_left[ride_id]:
+                plan['overbooked'].append((event_id, ride_id, user_id, seats))
+                continue
+            seats_left[ride_id] -= seats
+        booked.add((ride_id, user_id))
+        plan['bookings'].extend([(ride_id, user_id, booking_time)] * seats)
+        plan['seats'][ride_id] = plan['seats'].get(ride_id, 0) + seats
+        plan['confirmed'].append((user_id, ride_id, seats))
+    return plan
+
+"""
+    Applies locked inbox rows (inbox_id, event_id, event_type, payload) in the caller's
+    transaction: claims the events, locks their rides and re-checks the seats left,
+    inserts the Bookings rows of all of them as one multi-row INSERT, updates the
+    rides' passenger counts and removes the rows from the inbox. Does not commit.
+    Returns:
+        dict: the plan applied, see plan_batch
+"""
+def _apply_rows(cursor, rows):
+    events = [(event_id, event_type, payload) for _, event_id, event_type, payload in rows]
+    claimed = claim_events(cursor, [(event_id, event_type) for event_id, event_type, _ in events])
+
+    # Riders of the batch who already hold a booking for the ride they paid for
+    pairs = set()
+    for event_id, _, payload in events:
+        booking = booking_metadata(payload)
+        if event_id in claimed and booking is not None:
+            pairs.add(booking[:2])
+    booked = set()
+    if pairs:
+        pair_placeholders = ', '.join(['(%s, %s)'] * len(pairs))
+        cursor.execute(
+            f"SELECT DISTINCT ride_id, user_id FROM Bookings WHERE (ride_id, user_id) IN ({pair_placeholders})",
+            [value for pair in pairs for value in pair]
+        )
+        booked = set(cursor.fetchall())
+
+    plan = plan_batch(events, claimed, booked, datetime.today().strftime('%Y-%m-%d %H:%M:%S'),
+                      _lock_seats_left(cursor, {ride_id for ride_id, _ in pairs}))
+    if plan['bookings']:
+        # executemany sends the whole batch as one multi-row INSERT
+        cursor.executemany(
+            "INSERT INTO Bookings (ride_id, user_id, ride_date) VALUES (%s, %s, %s)",
+            plan['bookings']
+        )
+    # Keep the rides' denormalised counters in the same transaction
+    for ride_id, seats in plan['seats'].items():
+        increment_passenger_count(cursor, ride_id, seats)
+    inbox_ids = [row[0] for row in rows]
+    placeholders = ', '.join(['%s'] * len(inbox_ids))
+    cursor.execute(f"DELETE FROM WebhookInbox WHERE inbox_id IN ({placeholders})", inbox_ids)
+    return plan
+
+"""
+    Seats still free on each ride, read with the rides locked FOR UPDATE so no other
+    transaction books them until this one commits. Capacity is the largest vehicle's,
+    as in /payment/create-group-intent, rides are not checked while there are no vehicles.
+"""
+def _lock_seats_left(cursor, ride_ids):
+    if not ride_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(ride_ids))
+    cursor.execute(
+        f"""
+        SELECT r.ride_id, r.passenger_count, (SELECT MAX(capacity) FROM Vehicles)
+        FROM Rides r
+        WHERE r.ride_id IN ({placeholders})
+        FOR UPDATE
+        """, sorted(ride_ids)
+    )
+    return {
+        ride_id: max(capacity - passenger_count, 0)
+        for ride_id, passenger_count, capacity in cursor.fetchall()
+        if capacity is not None
+    }
+
+"""
+    Refunds a payment whose seats were taken in the meantime. The idempotency key keeps
+    a retried event from refunding twice. A refund that fails is logged as an error for
+    someone to refund by hand.
+"""
+def refund_overbooked(event_id, intent_id, ride_id, user_id, seats):
+    logger.warning("Webhook inbox: ride %s is full, refunding %s seat(s) paid by user %s (event %s)",
+                   ride_id, seats, user_id, event_id)
+    try:
+        stripe.Refund.create(payment_intent=intent_id, idempotency_key=f"overbooked-{event_id}")
+    except stripe.error.StripeError as err:
+        logger.error("Webhook inbox: refund of %s for full ride %s failed, refund it by hand: %s",
+                     intent_id, ride_id, err)
+
+# Pushes the bookings of a committed plan, refunds what did not fit and remembers its events
+def _after_commit(rows, plan):
+    payloads = {row[1]: row[3] for row in rows}
+    for row in rows:
+        processed_events.add(row[1])
+    for user_id, ride_id, seats in plan['confirmed']:
+        emit_booking_confirmed(user_id, ride_id, seats)
+    for event_id, ride_id, user_id, seats in plan['overbooked']:
+        refund_overbooked(event_id, payment_intent_id(payloads[event_id]), ride_id, user_id, seats)
+
+"""
+    Applies up to WEBHOOK_INBOX_BATCH pending inbox events in one transaction.
+    ---
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so every backend worker can run this
+    at once without two of them applying the same event. If the batch fails, e.g. one
+    event names a ride that no longer exists, it is rolled back and its events are
+    applied one by one instead, so a bad event only holds up itself.
+
+    Returns:
+        (int, int, int): events taken from the inbox, bookings confirmed, events that failed
+    Raises:
+        mysql.connector.Error: when the inbox itself cannot be read or updated
+"""
+def apply_inbox_batch(conn):
+    rows = []
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT inbox_id, event_id, event_type, payload
+            FROM WebhookInbox
+            WHERE status = 'P'
+            ORDER BY inbox_id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            """, (WEBHOOK_INBOX_BATCH,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            conn.rollback()
+            return 0, 0, 0
+        plan = _apply_rows(cursor, rows)
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        if not rows:
+            raise
+        logger.warning("Webhook inbox batch of %s events failed, applying them one by one: %s", len(rows), err)
+        plan = None
+    finally:
+        cursor.close()
+
+    if plan is not None:
+        _after_commit(rows, plan)
+        return len(rows), len(plan['confirmed']), 0
+
+    bookings = failed = 0
+    for row in rows:
+        plan = apply_inbox_event(conn, row[0])
+        if plan is None:
+            failed += 1
+        else:
+            bookings += len(plan['confirmed'])
+    return len(rows), bookings, failed
+
+"""
+    Applies one pending inbox event in its own transaction.
+    ---
+    On failure the event stays in the inbox with its attempt count and error. After
+    WEBHOOK_INBOX_MAX_ATTEMPTS it is dead-lettered (status 'D') and logged as an error:
+    the payment went through but the booking was not made, someone has to look at it.
+    Fix the cause and requeue it with `python webhook_inbox.py --requeue-dead`.
+
+    Returns:
+        dict | None: the plan applied, see plan_batch, or None if the event failed or
+                     another worker holds it
+"""
+def apply_inbox_event(conn, inbox_id):
+    row = None
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT inbox_id, event_id, event_type, payload, attempts
+            FROM WebhookInbox
+            WHERE inbox_id = %s AND status = 'P'
+            FOR UPDATE SKIP LOCKED
+            """, (inbox_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+        plan = _apply_rows(cursor, [row[:4]])
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        if row is None:
+            raise
+        _record_failure(conn, cursor, row, err)
+        return None
+    finally:
+        cursor.close()
+
+    _after_commit([row], plan)
+    return plan
+
+def _record_failure(conn, cursor, row, err):
+    inbox_id, event_id, _, _, attempts = row
+    attempts += 1
+    dead = attempts >= WEBHOOK_INBOX_MAX_ATTEMPTS
+    cursor.execute(
+        "UPDATE WebhookInbox SET attempts = %s, last_error = %s, status = %s WHERE inbox_id = %s",
+        (attempts, str(err)[:500], 'D' if dead else 'P', inbox_id)
+    )
+    conn.commit()
+    if dead:
+        logger.error("Webhook inbox: event %s dead-lettered after %s attempts, its booking was not made: %s",
+                     event_id, attempts, err)
+    else:
+        logger.warning("Webhook inbox: event %s failed (attempt %s of %s): %s",
+                       event_id, attempts, WEBHOOK_INBOX_MAX_ATTEMPTS, err)
+
+"""
+    Process Webhook Inbox
+    ---
+    Applies inbox events batch by batch until the inbox is empty, or until a batch has
+    failed events, which wait for the next run. Run every WEBHOOK_INBOX_POLL_SECONDS
+    from app.py, inside an app context so bookings can be pushed over Socket.IO.
+
+    Returns:
+        dict: events applied, bookings confirmed, failed events, batches and elapsed seconds
+"""
+def process_webhook_inbox():
+    started = time.perf_counter()
+    stats = {'events': 0, 'bookings': 0, 'failed': 0, 'batches': 0}
+    conn = None
+    try:
+        conn = get_db_connection()
+        while True:
+            events, bookings, failed = apply_inbox_batch(conn)
+            if events == 0:
+                break
+            stats['events'] += events - failed
+            stats['bookings'] += bookings
+            stats['failed'] += failed
+            stats['batches'] += 1
+            if failed or events < WEBHOOK_INBOX_BATCH:
+                break
+    except mysql.connector.Error as err:
+        logger.error("Webhook inbox batch failed, retrying on the next run: %s", err)
+    finally:
+        if conn: conn.close()
+
+    stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+"""
+    Puts dead-lettered events back in the inbox, once whatever made them fail is fixed.
+    Returns:
+        int: events requeued
+"""
+def requeue_dead_events():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE WebhookInbox SET status = 'P', attempts = 0 WHERE status = 'D'")
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+# CLI: python webhook_inbox.py applies the inbox once and prints the stats,
+# --requeue-dead first puts dead-lettered events back
+if __name__ == '__main__':
+    if '--requeue-dead' in sys.argv:
+        print(f"Requeued {requeue_dead_events()} events")
+    print(process_webhook_inbox())
@@ -191,6 +191,14 @@ def insert_bookings(cursor):
             )
     print("All Bookings inserted!")
 
+def sync_passenger_counts(cursor):
+    # Rides.passenger_count mirrors the Bookings inserted above
+    cursor.execute("""
+        UPDATE Rides r
+        SET r.passenger_count = (SELECT COUNT(*) FROM Bookings b WHERE b.ride_id = r.ride_id)
+    """)
+    print("Ride passenger counts synced!")
+
              
 
 def get_db_connection():
@@ -218,6 +226,7 @@ def main():
         insert_users(cursor)
         insert_rides(cursor)
         insert_bookings(cursor)
+        sync_passenger_counts(cursor)
         conn.commit()
     except mysql.connector.Error as err:
         print(f"Failed to insert tuples: {err}")
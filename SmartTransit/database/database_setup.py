@@ -14,6 +14,9 @@ create table if not exists Locations (
     location_name   varchar(80),
     x_coordinate    decimal(15,12),
     y_coordinate    decimal(15,12),
+    -- Names are unique ignoring case and surrounding spaces
+    name_key        varchar(80) collate utf8mb4_bin as (lower(trim(location_name))) stored,
+    unique key locations_name_key (name_key),
     primary key (location_id)
 );
 """
@@ -43,6 +46,11 @@ create table if not exists Rides (
     ride_status     char(1),
     profit          float,
     environmental   float,
+    passenger_count integer not null default 0, -- Mirrors count(*) of Bookings, see backend/ride_counts.py
+    -- "<start>-<end>" while the ride is open ('I'), NULL otherwise, so each pair has at most one open ride
+    open_slot       varchar(41) as (if(ride_status = 'I', concat(start_location, '-', end_location), null)) stored,
+    index rides_pair_status (start_location, end_location, ride_status), -- Open ride lookup in /booking/initiate
+    unique key rides_open_slot (open_slot),
     primary key (ride_id),
     foreign key (start_location) references Locations(location_id),
     foreign key (end_location) references Locations(location_id),
@@ -78,11 +86,13 @@ create table if not exists Drivers (
 
 create_table_bookings = """
 create table if not exists Bookings (
+    booking_id      bigint not null auto_increment, -- One row per seat, key for /booking/view pages
     ride_id         bigint,
     user_id         bigint,
     ride_date       datetime not null,
     foreign key (ride_id) references Rides(ride_id),
-    foreign key (user_id) references Users(user_id)
+    foreign key (user_id) references Users(user_id),
+    primary key (booking_id)
 );
 """
 
@@ -102,7 +112,9 @@ create_revoked_tokens_query = """
 create table if not exists RevokedTokens (
     jti         varchar(36),
     expires_at  datetime not null,
+    revoked_seq bigint not null auto_increment, -- High-water mark polled by every backend worker
     index (expires_at),
+    unique key (revoked_seq),
     primary key (jti)
 );
 """
@@ -112,11 +124,94 @@ CREATE TABLE IF NOT EXISTS SmsTokens (
     email           varchar(250),
     token           varchar(8),
     expires_at  datetime not null,
-    active          boolean
+    active          boolean,
+    index sms_expires_at (expires_at),      -- Used by the expired token purge
+    index sms_email_token (email, token)    -- Used by /auth/reset_password
 )
 
 """
 
+create_rate_limit_buckets = """
+CREATE TABLE IF NOT EXISTS RateLimitBuckets (
+    bucket_key  varchar(300) not null,     -- "<scope>:<ip|email|user>:<value>"
+    tokens      double not null,
+    updated_at  datetime(6) not null,
+    index (updated_at),                     -- Used by the idle bucket purge
+    primary key (bucket_key)
+);
+"""
+
+# Stripe webhook events already applied, see backend/webhook_inbox.py
+create_processed_events = """
+CREATE TABLE IF NOT EXISTS ProcessedEvents (
+    event_id        varchar(255) not null,  -- Stripe event id (evt_...)
+    event_type      varchar(100),
+    processed_at    datetime not null default current_timestamp,
+    index (processed_at),                   -- Used by the purge
+    primary key (event_id)
+);
+"""
+
+# Verified Stripe webhook events waiting to be applied, see backend/webhook_inbox.py.
+# Rows are deleted once applied, their ids stay in ProcessedEvents
+create_webhook_inbox = """
+CREATE TABLE IF NOT EXISTS WebhookInbox (
+    inbox_id    bigint not null auto_increment,
+    event_id    varchar(255) not null,      -- Stripe event id (evt_...)
+    event_type  varchar(100) not null,
+    payload     mediumtext not null,        -- The event as Stripe sent it
+    received_at datetime not null default current_timestamp,
+    status      char(1) not null default 'P',
+    attempts    integer not null default 0, -- Failed attempts to apply the event
+    last_error  varchar(500),
+    unique key webhook_inbox_event (event_id),  -- Redeliveries are stored once
+    index webhook_inbox_pending (status, inbox_id), -- The worker's batch scan
+    primary key (inbox_id),
+    check (status in ('P', 'D'))            -- Pending, Dead-lettered
+);
+"""
+
+# Every write to Locations is logged here by the triggers below. The last change_seq is
+# the catalogue version served by /location (see backend/location_catalogue.py)
+create_location_changes = """
+CREATE TABLE IF NOT EXISTS LocationChanges (
+    change_seq  bigint not null auto_increment,
+    location_id bigint not null,
+    changed_at  datetime not null default current_timestamp,
+    primary key (change_seq),
+    index location_changes_changed_at (changed_at)
+);
+"""
+
+create_location_triggers = [
+    """
+    CREATE TRIGGER IF NOT EXISTS locations_after_insert AFTER INSERT ON Locations
+    FOR EACH ROW INSERT INTO LocationChanges (location_id) VALUES (NEW.location_id)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS locations_after_update AFTER UPDATE ON Locations
+    FOR EACH ROW INSERT INTO LocationChanges (location_id) VALUES (NEW.location_id)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS locations_after_delete AFTER DELETE ON Locations
+    FOR EACH ROW INSERT INTO LocationChanges (location_id) VALUES (OLD.location_id)
+    """,
+]
+
+# Columns and indexes added after the first release, for databases created before them.
+# Each is skipped if the column or index already exists (MySQL errors 1060 and 1061)
+upgrade_queries = [
+    "alter table Rides add column passenger_count integer not null default 0",
+    "alter table RevokedTokens add column revoked_seq bigint not null auto_increment, add unique key (revoked_seq)",
+    "alter table SmsTokens add index sms_expires_at (expires_at)",
+    "alter table SmsTokens add index sms_email_token (email, token)",
+    # Fails with a duplicate entry error if two existing stops share a name, rename one and rerun
+    "alter table Locations add column name_key varchar(80) collate utf8mb4_bin as (lower(trim(location_name))) stored, add unique key locations_name_key (name_key)",
+    "alter table Rides add index rides_pair_status (start_location, end_location, ride_status)",
+    # Fails with a duplicate entry error if a pair has several open rides, merge their bookings into one and rerun
+    "alter table Rides add column open_slot varchar(41) as (if(ride_status = 'I', concat(start_location, '-', end_location), null)) stored, add unique key rides_open_slot (open_slot)",
+    "alter table Bookings add column booking_id bigint not null auto_increment primary key first",
+]
 
 config = {
     'user': os.getenv('DB_USER'),
@@ -142,12 +237,23 @@ def main():
         create_revoked_tokens_query,
         create_table_drivers,
         create_table_operates,
-        create_SMS_tokens
+        create_SMS_tokens,
+        create_rate_limit_buckets,
+        create_processed_events,
+        create_webhook_inbox,
+        create_location_changes,
+        *create_location_triggers
     ]
     
     try:
         for query in queries:
             cursor.execute(query)
+        for query in upgrade_queries:
+            try:
+                cursor.execute(query)
+            except mysql.connector.Error as err:
+                if err.errno not in (1060, 1061): # Duplicate column or key name
+                    raise
         conn.commit()
         print("Tables created successfully.")
     except mysql.connector.Error as err:
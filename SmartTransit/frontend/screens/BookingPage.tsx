@@ -119,7 +119,7 @@ const BookingPage: React.FC<{ navigation: NativeStackNavigationProp<RootStackPar
 
     try {
       const response = await axios.get(
-        `${config.apiUrl}/directions?origin=${origin}&destination=${destination}&t=${Date.now()}`,
+        `${config.apiUrl}/directions?origin=${origin}&destination=${destination}&compact=1&zoom=14&t=${Date.now()}`,
         {
           timeout: 10000,
           maxContentLength: Infinity,
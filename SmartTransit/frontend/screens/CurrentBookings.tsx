@@ -41,10 +41,23 @@ const CurrentBookings: React.FC<CurrentBookingsProps> = ({ navigation }) => {
   const [socket, setSocket] = useState<any>(null);
 
   useEffect(() => {
-    // Initialize socket connection
-    const socketInstance = io(config.socketUrl);
+    // Initialize socket connection, the server puts it in the rooms of our rides
+    const socketInstance = io(config.socketUrl, { auth: { token: accessToken } });
     setSocket(socketInstance);
 
+    // Ride status changes are pushed, no need to poll /booking/view
+    socketInstance.on("ride_status", (data: { ride_id: number; status: string }) => {
+      setBookings(prev => prev.map(booking =>
+        booking.ride_id === data.ride_id ? { ...booking, ride_status: data.status } : booking
+      ));
+    });
+
+    // A new paid booking: follow its ride and show it
+    socketInstance.on("booking_confirmed", (data: { ride_id: number }) => {
+      socketInstance.emit("join_ride", { ride_id: data.ride_id });
+      fetchBookings();
+    });
+
     // Listen for driver location updates
     socketInstance.on("driver_location_update", (data: DriverLocation) => {
       setDriverLocations(prev => ({
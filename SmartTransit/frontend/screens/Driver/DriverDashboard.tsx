@@ -51,7 +51,7 @@ const DriverDashboard: React.FC<DriverDashboardProps> = ({ navigation }) => {
     setupLocationTracking();
 
     // Initialize socket connection
-    const socketInstance = io(config.socketUrl);
+    const socketInstance = io(config.socketUrl, { auth: { token: accessToken } });
     setSocket(socketInstance);
 
     return () => {